@@ -7,7 +7,11 @@ A comprehensive tool for extracting math problems from PDF files and converting
 to properly formatted JSON with clean mathematical notation and consistent formatting.
 
 Usage:
-    python3 pdf_to_json_pipeline.py input.pdf output.json [--start-problem N] [--existing existing.json]
+    python3 pdf_to_json_pipeline.py [extract] input.pdf output.json [--start-problem N | --problems N-M] [--existing existing.json] [--workers N] [--figures [DIR]] [--katex] [--watch]
+    python3 pdf_to_json_pipeline.py reformat problems.json [--output FILE]
+    python3 pdf_to_json_pipeline.py merge existing.json new.json [--output FILE] [--on-conflict POLICY]
+    python3 pdf_to_json_pipeline.py validate problems.json
+    python3 pdf_to_json_pipeline.py sample problems.json N [--output FILE]
 
 Features:
 - Extracts text from PDF files using pdfplumber
@@ -25,15 +29,37 @@ Date: 2024
 import re
 import json
 import argparse
+import logging
+import os
 import sys
+import time
+from itertools import chain, islice
 from pathlib import Path
 
+from pipeline_classifier import KeywordClassifier
+from pipeline_index import ProblemIndex, parse_problem_range, problem_starts, slice_problems
+from pipeline_logging import ProgressMeter, configure_logging, logger
+from pipeline_math import wrap_math_spans
+from pipeline_merge import CONFLICT_POLICIES, merge_problem_sets
+from pipeline_model import ProblemRecord
+from pipeline_replacements import ReplacementTable
+from pipeline_rules import NORMALIZE_WHITESPACE, Rule, RuleSet
+from pipeline_writer import OUTPUT_FORMATS, detect_format, iter_problems, write_problems
+
+# Only the stages that need them import pdfplumber, multiprocessing, the
+# figure renderer, the profilers, KaTeX, the watcher and the windowed page
+# reader, so the JSON-only
+# commands (reformat, merge, validate, sample, dedup, index) start without them.
+# The on-disk caches (sqlite3), the search index and dedup are likewise only
+# imported by the commands that use them.
+
 # Import configuration
 try:
     from pipeline_config import (
         SYMBOL_REPLACEMENTS, CATEGORY_KEYWORDS, COMPLEXITY_INDICATORS,
-        PDF_ARTIFACT_PATTERNS, UNICODE_ARTIFACTS, EXPORT_SETTINGS,
-        get_difficulty_for_problem_number, validate_problem
+        PDF_ARTIFACT_PATTERNS, UNICODE_ARTIFACTS, NOTATION_FIXES, EXPORT_SETTINGS,
+        PDF_EXTRACT_SETTINGS, LOW_MEMORY_SETTINGS, CACHE_SETTINGS, FIGURE_SETTINGS, MERGE_SETTINGS, OUTPUT_SETTINGS, LOGGING_CONFIG,
+        DEDUP_SETTINGS, SEARCH_SETTINGS, get_difficulty_for_problem_number, validate_problem
     )
 except ImportError:
     print("Warning: pipeline_config.py not found. Using default settings.")
@@ -43,7 +69,20 @@ except ImportError:
     COMPLEXITY_INDICATORS = {"Hard": ['theorem'], "Medium": ['integral'], "Easy": ['find']}
     PDF_ARTIFACT_PATTERNS = [r'GRE.*?Page.*?\d+']
     UNICODE_ARTIFACTS = []
+    NOTATION_FIXES = {'sin p': '\\sin \\pi', '£': '\\leq', '³': '\\geq'}
     EXPORT_SETTINGS = {'indent': 2, 'ensure_ascii': False}
+    PDF_EXTRACT_SETTINGS = {}
+    LOW_MEMORY_SETTINGS = {'window_pages': 16, 'max_rss_mb': 512}
+    CACHE_SETTINGS = {'enabled': True, 'directory': '.pipeline_cache', 'max_size_mb': 256,
+                      'write_batch_pages': 32, 'format_max_size_mb': 64}
+    FIGURE_SETTINGS = {'directory': 'src/assets/images/figures', 'resolution': 150, 'min_resolution': 72,
+                       'max_kb': 150, 'max_colors': 256, 'min_size': 36, 'gap': 12, 'padding': 6}
+    MERGE_SETTINGS = {'policy': 'keep-existing', 'preserve_fields': ['correctAnswer', 'choices']}
+    OUTPUT_SETTINGS = {'format': 'json', 'shard_max_kb': 512}
+    DEDUP_SETTINGS = {'shingle_size': 5, 'num_perm': 120, 'bands': 20, 'threshold': 0.8, 'max_bucket': 64}
+    SEARCH_SETTINGS = {'enabled': True, 'fields': ['problem', 'category'], 'min_length': 2,
+                       'stopwords': ['the', 'of', 'and', 'a', 'is'], 'ignored_commands': ['left', 'right', 'text']}
+    LOGGING_CONFIG = {'level': 'INFO', 'format': '%(message)s', 'show_progress': True, 'progress_interval': 2.0}
     
     def get_difficulty_for_problem_number(n):
         return "Medium"
@@ -51,88 +90,592 @@ except ImportError:
     def validate_problem(p):
         return []
 
-# Check for required dependencies
-try:
-    import pdfplumber
-except ImportError:
-    print("Error: pdfplumber is required. Install with: pip install pdfplumber")
-    sys.exit(1)
+# Imported by load_pdfplumber on first use
+pdfplumber = None
+
+# Spaces the final validation fixes put between a word and a dollar sign.
+# They only insert spaces, so none can create a match for another and the
+# gate over their union rules them all out at once
+MATH_SPACING_FIXES = [
+    (r'then\$', 'then $'),
+    (r'will\$', 'will $'),
+    (r'on\$', 'on $'),
+    (r'to\$', 'to $'),
+    (r'Let\$', 'Let $'),
+    (r'\$denote', '$ denote'),
+    (r'\$and\$', '$ and $'),
+]
+MATH_SPACING_GATE = re.compile('|'.join(f'(?:{pattern})' for pattern, _ in MATH_SPACING_FIXES))
+
+
+def load_pdfplumber():
+    """The pdfplumber module, imported on first use; exits if it is not installed"""
+    global pdfplumber
+    if pdfplumber is None:
+        try:
+            import pdfplumber as module
+        except ImportError:
+            print("Error: pdfplumber is required. Install with: pip install pdfplumber")
+            sys.exit(1)
+        pdfplumber = module
+    return pdfplumber
+
+
+def extract_page_range(pdf_path, start, end, settings=None, low_memory=None):
+    """Extract the text of pages [start, end) from a PDF.
+
+    Runs inside worker processes, so each call opens its own handle on the PDF.
+    With low_memory (LOW_MEMORY_SETTINGS) the pages are read in windows.
+    """
+    if low_memory:
+        from pipeline_memory import iter_page_windows
+        
+        return [page_text for _, page_text in iter_page_windows(
+            load_pdfplumber(), pdf_path, range(start, end), settings or {},
+            low_memory['window_pages'], low_memory['max_rss_mb'])]
+    with load_pdfplumber().open(pdf_path) as pdf:
+        return [page.extract_text(**(settings or {})) for page in pdf.pages[start:end]]
+
+
+def split_page_range(page_count, chunks):
+    """Split page indices into at most `chunks` contiguous (start, end) ranges"""
+    chunks = max(1, min(chunks, page_count))
+    size, extra = divmod(page_count, chunks)
+    ranges = []
+    start = 0
+    for i in range(chunks):
+        end = start + size + (1 if i < extra else 0)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def split_page_indices(indices, chunks):
+    """Split sorted page indices into contiguous (start, end) ranges, in about `chunks` even parts
+
+    A part that spans a gap in the indices (a cached page) becomes several ranges.
+    """
+    ranges = []
+    for start, end in split_page_range(len(indices), chunks) if indices else ():
+        run_start = previous = indices[start]
+        for index in indices[start + 1:end]:
+            if index != previous + 1:
+                ranges.append((run_start, previous + 1))
+                run_start = index
+            previous = index
+        ranges.append((run_start, previous + 1))
+    return ranges
+
+
+def source_namespaces(pdf_paths, root):
+    """Map each PDF to a short source name used to namespace its problem IDs
+
+    One PDF per course folder is the norm, so the folder path relative to root
+    is used (e.g. 'gre_subject'); PDFs sharing a folder also get their stem.
+    """
+    root = Path(root)
+    folders = {}
+    for pdf_path in pdf_paths:
+        folder = Path(pdf_path).parent.relative_to(root).as_posix()
+        folders.setdefault(folder, []).append(pdf_path)
+    
+    namespaces = {}
+    for folder, paths in folders.items():
+        for pdf_path in paths:
+            name = folder if folder != '.' else ''
+            if len(paths) > 1 or not name:
+                name = f"{name}/{Path(pdf_path).stem}" if name else Path(pdf_path).stem
+            namespaces[pdf_path] = name.replace('/', '-')
+    return namespaces
+
+
+def process_pdf_source(pdf_path, args, start_problem=1, workers=1, use_cache=True, low_memory=None):
+    """Run extraction, parsing and post-processing for one PDF of a batch
+
+    Runs inside worker processes, with the extractor built from the extract
+    command's options `args` like any other run. Never raises: failures are
+    reported in the returned summary, with their traceback, so one bad PDF
+    cannot stop the rest of the batch.
+    """
+    started = time.perf_counter()
+    result = {'pdf': str(pdf_path), 'problems': [], 'error': None, 'traceback': None}
+    page_cache = format_cache = None
+    try:
+        if use_cache:
+            from pipeline_cache import FormatCache, PageTextCache
+            
+            page_cache = PageTextCache(CACHE_SETTINGS['directory'], CACHE_SETTINGS['max_size_mb'] * 1024 * 1024)
+            format_cache = FormatCache(CACHE_SETTINGS['directory'], CACHE_SETTINGS['format_max_size_mb'] * 1024 * 1024)
+        extractor = build_extractor(args, page_cache, format_cache, low_memory=low_memory)
+        
+        # Not extract_text_from_pdf, which would log and swallow the exception
+        text = ''.join(extractor.iter_text_chunks(pdf_path, workers))
+        if not text:
+            result['error'] = "Could not extract text from PDF"
+        else:
+            problems = extractor.parse_problems_from_text(text, start_problem)
+            result['problems'] = extractor.export_problems(extractor.post_process_validation(problems))
+            if not problems:
+                result['error'] = "No problems found in PDF"
+    except Exception as e:
+        import traceback
+        
+        result['error'] = f"{type(e).__name__}: {e}"
+        result['traceback'] = traceback.format_exc()
+    finally:
+        for cache in (page_cache, format_cache):
+            if cache is not None:
+                cache.close()
+    
+    result['seconds'] = round(time.perf_counter() - started, 3)
+    return result
+
 
 class PDFMathProblemExtractor:
     """Main class for extracting and formatting math problems from PDFs"""
     
-    def __init__(self):
+    def __init__(self, page_cache=None, format_cache=None, output_format=None, shard_max_kb=None,
+                 figure_dir=None, katex_renderer=None):
         self.problems = []
+        self.page_cache = page_cache
+        self.format_cache = format_cache
+        self.output_format = output_format or OUTPUT_SETTINGS['format']
+        self.shard_max_bytes = (shard_max_kb or OUTPUT_SETTINGS['shard_max_kb']) * 1024
         
-    def extract_text_from_pdf(self, pdf_path):
-        """Extract text from PDF file"""
-        try:
-            with pdfplumber.open(pdf_path) as pdf:
-                print(f"Processing PDF with {len(pdf.pages)} pages...")
-                
-                all_text = ''
+        # Rendered figure paths by problem number, filled by extract_figures
+        self.figure_dir = figure_dir
+        self.figures = {}
+        
+        # Pre-renders the problems' math before they are written (--katex)
+        self.katex_renderer = katex_renderer
+        
+        # The first sample_size problems written, kept for the sample file (--sample)
+        self.sample_size = 0
+        self.sample_problems = []
+        
+        # Write a keyword search index next to the output (see pipeline_search.py)
+        self.search_index = SEARCH_SETTINGS['enabled']
+        
+        # LOW_MEMORY_SETTINGS when pages are read in bounded windows (--low-memory)
+        self.low_memory = None
+        
+        # Compile the literal replacement tables once; each applies in one
+        # gated sweep with the same result as a str.replace per entry
+        self.unicode_artifact_table = ReplacementTable((artifact, '') for artifact in UNICODE_ARTIFACTS)
+        self.notation_fix_table = ReplacementTable(NOTATION_FIXES)
+        self.symbol_table = ReplacementTable(SYMBOL_REPLACEMENTS)
+        # Text no artifact pattern matches is left unchanged by all of them
+        self.artifact_gate = re.compile('|'.join(f'(?:{pattern})' for pattern in PDF_ARTIFACT_PATTERNS),
+                                        re.MULTILINE | re.IGNORECASE)
+        
+        # The formatting fixes of one segment of raw PDF text, in order; each
+        # rule is skipped when its guard shows it cannot match (see pipeline_rules.py)
+        self.format_rules = RuleSet([
+            Rule('pdf-artifacts', [(pattern, '') for pattern in PDF_ARTIFACT_PATTERNS],
+                 guard=self.artifact_gate, flags=re.MULTILINE | re.IGNORECASE),
+            Rule('unicode-artifacts', self.unicode_artifact_table),
+            Rule('notation-fixes', self.notation_fix_table),
+            Rule('integral-bounds', [(r'\\int\s*\\infty', r'\\int_0^{\\infty}'),
+                                     (r'\\int\s*(\d+)', r'\\int_0^{\1}')], guard='\\int'),
+            Rule('leq-chains', [(r'(\d+)\s*£\s*(\w+)\s*£\s*(\d+)', r'\1 \\leq \2 \\leq \3'),
+                                (r'£\s*(\w+)\s*£', r'\\leq \1 \\leq')], guard='£'),
+            Rule('double-backslashes', [(r'\\\\(frac|sum|int|lim|log|ln|sqrt)', r'\\\1')], guard='\\\\'),
+            Rule('symbols', self.symbol_table),
+            # No whitespace next to a dollar sign; the final fixes add back the spaces that belong there
+            Rule('dollar-spacing', [(r'\s*\$\s*', '$')], guard='$'),
+            # Looked up on each call so the profiler's wrapper of this stage is used
+            Rule('wrap-math', lambda text: self.wrap_math_expressions(text)),
+            NORMALIZE_WHITESPACE,
+        ])
+        
+        # The final validation fixes, run on formatted segments and by `reformat`
+        self.final_rules = RuleSet([
+            Rule('duplicate-choices-label', [(r'Choices:\s*Choices:\s*', 'Choices: ')], guard='Choices:'),
+            Rule('math-spacing', MATH_SPACING_FIXES, guard=MATH_SPACING_GATE),
+            NORMALIZE_WHITESPACE,
+        ])
+        
+        # Score-based keyword classifiers for category and difficulty
+        self.category_classifier = KeywordClassifier(CATEGORY_KEYWORDS)
+        self.difficulty_classifier = KeywordClassifier(COMPLEXITY_INDICATORS)
+        
+        # Formatting output depends on the literal tables, the regex patterns and
+        # this code; see RuleFingerprint for how table edits are scoped
+        from pipeline_cache import RuleFingerprint, file_sha256
+        
+        self.rule_fingerprint = RuleFingerprint(
+            [
+                ('UNICODE_ARTIFACTS', [(artifact, '') for artifact in UNICODE_ARTIFACTS]),
+                ('NOTATION_FIXES', list(NOTATION_FIXES.items())),
+                ('SYMBOL_REPLACEMENTS', list(SYMBOL_REPLACEMENTS.items())),
+            ],
+            {
+                'PDF_ARTIFACT_PATTERNS': PDF_ARTIFACT_PATTERNS,
+                'code': [file_sha256(Path(__file__).with_name(name))
+                         for name in ('pdf_to_json_pipeline.py', 'pipeline_math.py', 'pipeline_model.py',
+                                      'pipeline_replacements.py', 'pipeline_rules.py')],
+            }
+        )
+        
+    def page_cache_key(self, pdf_path):
+        """(content hash, extraction settings fingerprint) identifying a PDF's pages in the page cache"""
+        from pipeline_cache import file_sha256, settings_fingerprint
+        
+        return file_sha256(pdf_path), settings_fingerprint({
+            'pdfplumber': getattr(load_pdfplumber(), '__version__', None),
+            'extract_text': PDF_EXTRACT_SETTINGS,
+        })
+    
+    def iter_page_texts(self, pdf_path, workers=1):
+        """Yield the raw text of each PDF page in page order (None for empty pages)
+
+        Pages already in the page cache are served from it; a fully cached
+        PDF is never opened with pdfplumber. The PDF's problem index is built
+        on the way and stored with the pages if it is not cached yet.
+        """
+        if self.page_cache is None:
+            yield from self.extract_page_texts(pdf_path, workers)
+            return
+        
+        from pipeline_cache import CachedPages
+        
+        pdf_hash, settings = self.page_cache_key(pdf_path)
+        # Cached pages are read a batch at a time rather than all up front
+        cached = CachedPages(self.page_cache, pdf_hash, settings, CACHE_SETTINGS['write_batch_pages'])
+        page_count = self.page_cache.get_page_count(pdf_hash, settings)
+        index = None if self.page_cache.get_problem_index(pdf_hash, settings) else ProblemIndex()
+        
+        if page_count is not None and len(cached) >= page_count:
+            logger.info("Loaded %d pages from cache", page_count)
+            self.page_cache.hits += page_count
+            for i in range(page_count):
+                if index is not None:
+                    index.add_page(i, cached[i])
+                yield cached[i]
+            if index is not None:
+                self.page_cache.put_problem_index(pdf_hash, settings, index)
+            return
+        
+        # Store newly extracted pages in batches so streaming stays bounded; evict
+        # only at the end, so no cached page of this PDF is dropped before it is read
+        extracted = {}
+        page_count = 0
+        for i, page_text in enumerate(self.extract_page_texts(pdf_path, workers, cached)):
+            if i in cached:
+                self.page_cache.hits += 1
+            else:
+                self.page_cache.misses += 1
+                extracted[i] = page_text
+                if len(extracted) >= CACHE_SETTINGS['write_batch_pages']:
+                    self.page_cache.put_pages(pdf_hash, settings, extracted, evict=False)
+                    extracted = {}
+            if index is not None:
+                index.add_page(i, page_text)
+            page_count = i + 1
+            yield page_text
+        
+        self.page_cache.put_pages(pdf_hash, settings, extracted, page_count)
+        if index is not None:
+            self.page_cache.put_problem_index(pdf_hash, settings, index)
+    
+    def load_page_range(self, pdf_path, pdf_hash, settings, first, last):
+        """Texts of pages first..last, from the page cache or by extracting only those pages"""
+        pages = self.page_cache.get_pages(pdf_hash, settings, first, last)
+        self.page_cache.hits += len(pages)
+        missing = [i for i in range(first, last + 1) if i not in pages]
+        if missing:
+            extracted = extract_page_range(pdf_path, missing[0], missing[-1] + 1, PDF_EXTRACT_SETTINGS,
+                                           self.low_memory)
+            extracted = {i: page_text for i, page_text in enumerate(extracted, missing[0]) if i not in pages}
+            self.page_cache.misses += len(extracted)
+            self.page_cache.put_pages(pdf_hash, settings, extracted)
+            pages.update(extracted)
+        return [pages[i] for i in range(first, last + 1)]
+    
+    def iter_selected_problem_texts(self, pdf_path, start_problem=1, end_problem=None, workers=1):
+        """Yield (problem_num, problem_text) for problems start_problem..end_problem
+
+        When the PDF's problem index is cached, only the pages from the first
+        selected problem to the end of the last one are loaded. Otherwise
+        every page is read, which also builds the index for the next run.
+        Either way the pairs are the ones parse_problems_from_text finds in
+        the whole text, limited to problems up to end_problem.
+        """
+        if self.page_cache is not None and (start_problem > 1 or end_problem is not None):
+            pdf_hash, settings = self.page_cache_key(pdf_path)
+            index = self.page_cache.get_problem_index(pdf_hash, settings)
+            if index is not None:
+                pages = index.page_range(start_problem, end_problem)
+                if pages is None:
+                    logger.info("Problem index: no problems in the selected range")
+                    return
+                first, last = pages
+                logger.info("Problem index: reading pages %d-%d of %d", first + 1, last + 1, index.page_count)
+                page_texts = self.load_page_range(pdf_path, pdf_hash, settings, first, last)
+                yield from index.slice_pages(page_texts, first, start_problem, end_problem)
+                return
+        
+        for problem_num, problem_text in self.iter_problem_texts(self.iter_text_chunks(pdf_path, workers),
+                                                                 start_problem):
+            if end_problem is None or problem_num <= end_problem:
+                yield problem_num, problem_text
+    
+    def extract_page_texts(self, pdf_path, workers=1, cached=None):
+        """Extract the raw text of each PDF page with pdfplumber, in page order
+
+        With workers > 1 the uncached pages are split across worker processes;
+        pages are still yielded in order. Pages found in `cached` are served
+        from it and never extracted. With low_memory set, pages are read in
+        windows that release their layout objects (see pipeline_memory.py).
+        """
+        cached = cached or {}
+        with load_pdfplumber().open(pdf_path) as pdf:
+            page_count = len(pdf.pages)
+            logger.info("Processing PDF with %d pages...", page_count)
+            
+            if (workers <= 1 or page_count <= 1) and not self.low_memory:
                 for i, page in enumerate(pdf.pages):
-                    page_text = page.extract_text()
-                    if page_text:
-                        all_text += page_text + '\n\n'
-                        print(f"Extracted text from page {i+1}")
-                
-                return all_text
+                    if i in cached:
+                        yield cached[i]
+                    else:
+                        yield page.extract_text(**PDF_EXTRACT_SETTINGS)
+                return
+        
+        if workers <= 1 or page_count <= 1:
+            from pipeline_memory import iter_page_windows
+            
+            # Only the uncached pages are read, a window at a time
+            logger.info("Reading pages in windows of %d (ceiling %d MB)...",
+                        self.low_memory['window_pages'], self.low_memory['max_rss_mb'])
+            uncached = [i for i in range(page_count) if i not in cached]
+            extracted = iter_page_windows(load_pdfplumber(), pdf_path, uncached, PDF_EXTRACT_SETTINGS,
+                                          self.low_memory['window_pages'], self.low_memory['max_rss_mb'])
+            for i in range(page_count):
+                yield cached[i] if i in cached else next(extracted)[1]
+            return
+        
+        from concurrent.futures import ProcessPoolExecutor
+        
+        # Only the uncached pages are sent to the workers
+        page_ranges = split_page_indices([i for i in range(page_count) if i not in cached], workers)
+        if not page_ranges:
+            for i in range(page_count):
+                yield cached[i]
+            return
+        processes = min(workers, len(page_ranges))
+        logger.info("Extracting %d uncached pages with %d worker processes...",
+                    sum(end - start for start, end in page_ranges), processes)
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            starts, ends = zip(*page_ranges)
+            extracted = chain.from_iterable(pool.map(extract_page_range, [pdf_path] * len(page_ranges), starts,
+                                                     ends, [PDF_EXTRACT_SETTINGS] * len(page_ranges),
+                                                     [self.low_memory] * len(page_ranges)))
+            for i in range(page_count):
+                yield cached[i] if i in cached else next(extracted)
+    
+    def iter_text_chunks(self, pdf_path, workers=1):
+        """Yield page text chunks exactly as they are concatenated by extract_text_from_pdf"""
+        progress = self.progress("Extracting", unit='pages')
+        for i, page_text in enumerate(self.iter_page_texts(pdf_path, workers)):
+            progress.update()
+            if page_text:
+                logger.debug("Extracted text from page %d", i + 1)
+                yield page_text + '\n\n'
+        progress.finish()
+    
+    def extract_text_from_pdf(self, pdf_path, workers=1):
+        """Extract text from PDF file
+
+        With workers > 1 the page range is split across worker processes; the
+        merged text is identical to a serial run.
+        """
+        try:
+            return ''.join(self.iter_text_chunks(pdf_path, workers))
         except Exception as e:
-            print(f"Error reading PDF: {e}")
+            logger.error("Error reading PDF: %s", e)
             return None
     
-    def parse_problems_from_text(self, text, start_problem=1):
-        """Extract individual problems from the PDF text"""
-        problems = []
+    def extract_figures(self, pdf_path, start_problem=1, end_problem=None, workers=1):
+        """Detect and render the figures of the selected problems into figure_dir
+
+        Pages are scanned in worker processes; with a cached problem index
+        only the pages of the selected problems are. Images already rendered
+        by an earlier run are reused. Sets self.figures to
+        {problem number: [image path, ...]}; a failure is logged and leaves
+        the problems without figures.
+        """
+        from concurrent.futures import ProcessPoolExecutor
+        from pipeline_figures import assign_figures, figure_url, render_page_figures
         
-        # Split text into lines for easier processing
-        lines = text.split('\n')
+        try:
+            directory = Path(self.figure_dir)
+            directory.mkdir(parents=True, exist_ok=True)
+            with load_pdfplumber().open(pdf_path) as pdf:
+                first, last = 0, len(pdf.pages) - 1
+            if self.page_cache is not None and (start_problem > 1 or end_problem is not None):
+                index = self.page_cache.get_problem_index(*self.page_cache_key(pdf_path))
+                pages = index.page_range(start_problem, end_problem) if index is not None else (first, last)
+                if pages is None:
+                    return
+                first, last = pages
+            
+            # Smaller ranges than workers balance the figure-heavy pages; with
+            # low_memory no range is longer than a window, since each opens the PDF
+            chunks = max(1, workers) * 4
+            if self.low_memory:
+                chunks = max(chunks, -(-(last + 1 - first) // self.low_memory['window_pages']))
+            page_ranges = [(first + start, first + end)
+                           for start, end in split_page_range(last + 1 - first, chunks)]
+            from pipeline_cache import file_sha256
+            
+            pdf_hash = file_sha256(pdf_path)
+            arguments = [(pdf_path, pdf_hash, start, end, directory, FIGURE_SETTINGS, start_problem, end_problem)
+                         for start, end in page_ranges]
+            if workers <= 1:
+                results = [render_page_figures(*args) for args in arguments]
+            else:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    results = list(pool.map(render_page_figures, *zip(*arguments)))
+            figures = assign_figures(chain.from_iterable(results), start_problem, end_problem)
+        except Exception as e:
+            logger.error("Error rendering figures: %s", e)
+            return
+        
+        self.figures = {number: [figure_url(figure.path) for figure in problem_figures]
+                        for number, problem_figures in figures.items()}
+        images = [figure for problem_figures in figures.values() for figure in problem_figures]
+        logger.info("🖼️  Figures (%s): %d images for %d problems, %d rendered, %d reused, %.0f KB",
+                    directory, len(images), len(figures), sum(not figure.cached for figure in images),
+                    sum(figure.cached for figure in images), sum(figure.bytes for figure in images) / 1024)
+    
+    def extract_problem_texts(self, pdf_path, start_problem=1, end_problem=None, workers=1):
+        """(problem_num, problem_text) pairs of the selected problems, or None if the PDF cannot be read"""
+        try:
+            problem_texts = list(self.iter_selected_problem_texts(pdf_path, start_problem, end_problem, workers))
+        except Exception as e:
+            logger.error("Error reading PDF: %s", e)
+            return None
         
-        # Find all problem numbers and their line positions
-        problem_positions = []
-        for i, line in enumerate(lines):
+        logger.info("Found %d problems starting from problem %d", len(problem_texts), start_problem)
+        return problem_texts
+    
+    def iter_problem_texts(self, chunks, start_problem=1):
+        """Yield (problem_num, problem_text) pairs from a stream of text chunks
+
+        Problem boundaries are found across chunk (page) seams, and only the
+        lines of the problem currently being read are buffered. The pairs are
+        the same ones parse_problems_from_text finds in the concatenated text.
+        """
+        problem_num = None
+        problem_lines = []
+        
+        def lines_of(chunks):
+            partial = ''
+            for chunk in chunks:
+                lines = (partial + chunk).split('\n')
+                partial = lines.pop()
+                yield from lines
+            yield partial
+        
+        for line in lines_of(chunks):
             match = re.match(r'^\s*(\d+)\.\s*', line)
-            if match:
+            if match and int(match.group(1)) >= start_problem:
+                if problem_num is not None:
+                    yield problem_num, '\n'.join(problem_lines)
                 problem_num = int(match.group(1))
-                if problem_num >= start_problem:
-                    problem_positions.append((problem_num, i))
+                problem_lines = [line]
+            elif problem_num is not None:
+                problem_lines.append(line)
         
-        print(f"Found {len(problem_positions)} problems starting from problem {start_problem}")
+        if problem_num is not None:
+            yield problem_num, '\n'.join(problem_lines)
+    
+    def parse_problems_from_text(self, text, start_problem=1):
+        """Extract individual problems from the PDF text"""
         
-        # Extract each problem
-        for i, (problem_num, start_line) in enumerate(problem_positions):
-            # Determine where this problem ends (next problem starts)
-            if i + 1 < len(problem_positions):
-                end_line = problem_positions[i + 1][1]
-            else:
-                end_line = len(lines)
-            
-            # Extract problem text
-            problem_lines = lines[start_line:end_line]
-            problem_text = '\n'.join(problem_lines)
-            
-            # Clean and parse the problem
-            parsed_problem = self.parse_single_problem(problem_num, problem_text)
-            if parsed_problem:
-                # Validate the problem
-                validation_errors = validate_problem(parsed_problem)
-                if validation_errors:
-                    print(f"Warning: Problem {problem_num} has validation issues: {validation_errors}")
-                
-                problems.append(parsed_problem)
-                print(f"Parsed problem {problem_num}")
+        # Find every problem-starting line in one pass and cut the text at them
+        problem_texts = slice_problems(text, problem_starts(text), start_problem)
+        
+        logger.info("Found %d problems starting from problem %d", len(problem_texts), start_problem)
+        return self.parse_problem_texts(problem_texts)
+    
+    def parse_problem_texts(self, problem_texts):
+        """Build problem records from (problem_num, raw problem text) pairs"""
+        problems = []
+        problem_nums = [problem_num for problem_num, _ in problem_texts]
+        texts = [self.normalize_problem_text(problem_text) for _, problem_text in problem_texts]
+        
+        # Classify all problems in one batch
+        classifications = self.classify_problems(problem_nums, texts)
+        
+        # Clean and parse each problem
+        progress = self.progress("Formatting", total=len(problem_nums))
+        for problem_num, text, (category, difficulty, _, _) in zip(problem_nums, texts, classifications):
+            problems.append(self.build_problem(problem_num, text, category, difficulty))
+            logger.debug("Parsed problem %s", problem_num)
+            progress.update()
+        progress.finish()
         
         return problems
     
-    def parse_single_problem(self, problem_num, text):
-        """Parse a single problem from its text"""
+    def reformat_problems(self, problems):
+        """Run post-processing again over exported problems, without their PDF
+
+        Each problem's text is split into its stem and choices and the final
+        validation fixes of the current config are applied (memoized like
+        extraction). The earlier formatting fixes expect raw PDF text and are
+        not rerun: on exported text they would, for example, strip the spaces
+        after `$`. A problem the fixes leave unchanged is returned as is, so
+        hand-formatted text is kept; every other field is always kept.
+        """
+        records = []
+        for problem in problems:
+            text = re.sub(r'\s+', ' ', str(problem.get('problem', ''))).strip()
+            record = ProblemRecord.parse(problem.get('id'), text, problem.get('category'), problem.get('difficulty'))
+            record.fields = {key: value for key, value in problem.items()
+                             if key not in ('id', 'category', 'difficulty', 'problem')} or None
+            records.append(record)
+        
+        original_segments = [record.encode_segments() for record in records]
+        self.post_process_validation(records)
+        return [problem if record.encode_segments() == segments else self.export_problem(record)
+                for problem, record, segments in zip(problems, records, original_segments)]
+    
+    def export_problem(self, record):
+        """Render a record into its exported dict and log any validation issues"""
+        problem = record.to_dict()
+        images = self.figures.get(record.id)
+        if images:
+            problem['image'] = images[0]
+            if len(images) > 1:
+                problem['images'] = images
+        if logger.isEnabledFor(logging.WARNING):
+            validation_errors = validate_problem(problem)
+            if validation_errors:
+                logger.warning("Problem %s has validation issues: %s", record.id, validation_errors)
+        return problem
+    
+    def export_problems(self, records):
+        """Render records into exported dicts; the only place problem text is built"""
+        return [self.export_problem(record) for record in records]
+    
+    def progress(self, label, total=None, unit='problems'):
+        """Rate-limited progress line configured by LOGGING_CONFIG"""
+        return ProgressMeter(label, total, unit, LOGGING_CONFIG.get('progress_interval', 2.0),
+                             LOGGING_CONFIG.get('show_progress', True))
+    
+    def normalize_problem_text(self, text):
+        """Collapse whitespace and strip the leading problem number"""
         
         # Clean up the text
         text = re.sub(r'\s+', ' ', text).strip()
         
         # Remove the problem number from the beginning
-        text = re.sub(r'^\s*\d+\.\s*', '', text)
+        return re.sub(r'^\s*\d+\.\s*', '', text)
+    
+    def parse_single_problem(self, problem_num, text):
+        """Parse a single problem from its text"""
+        text = self.normalize_problem_text(text)
         
         # Determine category based on content analysis
         category = self.determine_category(text)
@@ -140,54 +683,32 @@ class PDFMathProblemExtractor:
         # Determine difficulty based on problem number and content
         difficulty = self.determine_difficulty(problem_num, text)
         
-        # Look for multiple choice options
-        choices_match = re.findall(r'\([A-E]\)[^(]*?(?=\([A-E]\)|$)', text)
-        
-        # If we found choices, format them properly
-        if choices_match:
-            # Split problem text from choices
-            first_choice_pos = text.find('(A)')
-            if first_choice_pos > 0:
-                problem_text = text[:first_choice_pos].strip()
-                choices_text = text[first_choice_pos:].strip()
-                
-                # Format choices
-                formatted_choices = []
-                for choice in ['A', 'B', 'C', 'D', 'E']:
-                    pattern = rf'\({choice}\)([^(]*?)(?=\([A-E]\)|$)'
-                    match = re.search(pattern, choices_text)
-                    if match:
-                        choice_text = match.group(1).strip()
-                        if choice_text:  # Only add non-empty choices
-                            formatted_choices.append(f"({choice}) {choice_text}")
-                
-                if formatted_choices:
-                    problem_text += "\n\nChoices:\n" + "\n".join(formatted_choices)
-            else:
-                problem_text = text
-        else:
-            problem_text = text
+        return self.build_problem(problem_num, text, category, difficulty)
+    
+    def build_problem(self, problem_num, text, category, difficulty):
+        """Build the problem record from normalized text and its classification"""
         
-        # Apply comprehensive formatting fixes
-        problem_text = self.apply_formatting_fixes(problem_text)
+        # Split out the choices and format every segment (memoized across runs)
+        if self.format_cache is not None:
+            record = ProblemRecord(problem_num, '', (), category, difficulty)
+            return record.set_segments(self.format_cache.memoize(
+                'record', text, self.rule_fingerprint.for_text(text), self.format_segments
+            ))
         
-        return {
-            "id": problem_num,
-            "category": category,
-            "difficulty": difficulty,
-            "problem": problem_text
-        }
+        return self.format_record(ProblemRecord.parse(problem_num, text, category, difficulty))
+    
+    def format_record(self, record):
+        """Apply all formatting fixes to the stem and each choice of a record"""
+        record.map_segments(self.apply_formatting_fixes)
+        return record
+    
+    def format_segments(self, text):
+        """Formatted segments of normalized problem text, encoded for the format cache"""
+        return self.format_record(ProblemRecord.parse(None, text)).encode_segments()
     
     def determine_category(self, text):
         """Determine the category of a problem based on its content"""
-        text_lower = text.lower()
-        
-        # Use configured category keywords
-        for category, keywords in CATEGORY_KEYWORDS.items():
-            if any(word in text_lower for word in keywords):
-                return category
-        
-        return "Mathematics"  # Default category
+        return self.category_classifier.classify([text], ["Mathematics"])[0][0]
     
     def determine_difficulty(self, problem_num, text):
         """Determine difficulty based on problem number and complexity indicators"""
@@ -195,46 +716,32 @@ class PDFMathProblemExtractor:
         base_difficulty = get_difficulty_for_problem_number(problem_num)
         
         # Adjust based on content complexity using configured indicators
-        text_lower = text.lower()
-        for difficulty, indicators in COMPLEXITY_INDICATORS.items():
-            if any(indicator in text_lower for indicator in indicators):
-                return difficulty
-        
-        return base_difficulty
+        return self.difficulty_classifier.classify([text], [base_difficulty])[0][0]
     
-    def apply_formatting_fixes(self, problem_text):
-        """Apply comprehensive formatting fixes to problem text"""
-        
-        # Remove PDF artifacts using configured patterns
-        text = problem_text
-        for pattern in PDF_ARTIFACT_PATTERNS:
-            text = re.sub(pattern, '', text, flags=re.MULTILINE | re.IGNORECASE)
-        
-        # Remove Unicode artifacts
-        for artifact in UNICODE_ARTIFACTS:
-            text = text.replace(artifact, '')
-        
-        # Enhanced mathematical notation fixes
-        text = self.fix_mathematical_notation(text)
-        
-        # Fix mathematical symbols using configured replacements
-        for symbol, replacement in SYMBOL_REPLACEMENTS.items():
-            text = text.replace(symbol, replacement)
-        
-        # Enhanced choice formatting
-        text = self.fix_choice_formatting(text)
-        
-        # Fix spacing around mathematical expressions
-        text = self.fix_mathematical_spacing(text)
-        
-        # Wrap mathematical expressions in dollar signs for KaTeX
-        text = self.wrap_math_expressions(text)
-        
-        # Final cleanup
-        text = re.sub(r'\s+', ' ', text)  # Multiple spaces to single space
-        text = re.sub(r'\n\s*\n\s*\n+', '\n\n', text)  # Multiple newlines to double
-        
-        return text.strip()
+    def classify_problems(self, problem_nums, texts):
+        """Classify many problems at once
+
+        Returns (category, difficulty, category_confidence, difficulty_confidence)
+        for each problem. Problems without any keyword hit fall back to the
+        "Mathematics" category and the difficulty for their problem number,
+        with confidence 0.0.
+        """
+        categories = self.category_classifier.classify(texts, ["Mathematics"] * len(texts))
+        difficulties = self.difficulty_classifier.classify(
+            texts, [get_difficulty_for_problem_number(num) for num in problem_nums]
+        )
+        return [(category, difficulty, category_confidence, difficulty_confidence)
+                for (category, category_confidence), (difficulty, difficulty_confidence)
+                in zip(categories, difficulties)]
+    
+    def apply_formatting_fixes(self, text):
+        """Apply comprehensive formatting fixes to one segment (stem or choice) of a problem
+
+        PDF and Unicode artifact removal, notation and symbol fixes, dollar
+        sign spacing, KaTeX math wrapping and whitespace cleanup, as the
+        rules of self.format_rules.
+        """
+        return self.format_rules.apply(text)
     
     def wrap_math_expressions(self, text):
         """Wrap mathematical expressions in dollar signs for proper KaTeX rendering"""
@@ -242,281 +749,205 @@ class PDFMathProblemExtractor:
         # If already has dollar signs, clean up malformed ones first
         if '$' in text:
             # Fix malformed expressions like $\\sqrt{$\\pi$}$
-            text = re.sub(r'\$\\sqrt\{\$\\pi\$\}\$', r'$\\sqrt{\\pi}$', text)
-            text = re.sub(r'\$\\frac\{\$\\sqrt\{\$\\pi\$\}\$\}\{([^}]+)\}\$', r'$\\frac{\\sqrt{\\pi}}{\\1}$', text)
-            text = re.sub(r'\$\\int_\$\{([^}]*)\}\^\{\$\\in\$fty\}', r'$\\int_0^{\\infty}$', text)
-            text = re.sub(r'\$\\int_\$\{-\$\\in\$fty\}\^\{\$\\in\$fty\}', r'$\\int_{-\\infty}^{\\infty}$', text)
-            text = re.sub(r'\$\\frac\{\$\\pi\$\}\{([^}]+)\}\$', r'$\\frac{\\pi}{\\1}$', text)
-            text = re.sub(r'2\$\\sqrt\{\$\\pi\$\}\$', r'$2\\sqrt{\\pi}$', text)
-            text = re.sub(r'4\$\\sqrt\{\$\\pi\$\}\$', r'$4\\sqrt{\\pi}$', text)
-            text = re.sub(r'\$\\cos\$\^3', r'$\\cos^3$', text)
-            text = re.sub(r'\$\\sin\$\^3', r'$\\sin^3$', text)
+            if '$\\' in text:
+                text = re.sub(r'\$\\sqrt\{\$\\pi\$\}\$', r'$\\sqrt{\\pi}$', text)
+                text = re.sub(r'\$\\frac\{\$\\sqrt\{\$\\pi\$\}\$\}\{([^}]+)\}\$', r'$\\frac{\\sqrt{\\pi}}{\\1}$', text)
+                text = re.sub(r'\$\\int_\$\{([^}]*)\}\^\{\$\\in\$fty\}', r'$\\int_0^{\\infty}$', text)
+                text = re.sub(r'\$\\int_\$\{-\$\\in\$fty\}\^\{\$\\in\$fty\}', r'$\\int_{-\\infty}^{\\infty}$', text)
+                text = re.sub(r'\$\\frac\{\$\\pi\$\}\{([^}]+)\}\$', r'$\\frac{\\pi}{\\1}$', text)
+                text = re.sub(r'2\$\\sqrt\{\$\\pi\$\}\$', r'$2\\sqrt{\\pi}$', text)
+                text = re.sub(r'4\$\\sqrt\{\$\\pi\$\}\$', r'$4\\sqrt{\\pi}$', text)
+                text = re.sub(r'\$\\cos\$\^3', r'$\\cos^3$', text)
+                text = re.sub(r'\$\\sin\$\^3', r'$\\sin^3$', text)
             
             # Fix nested dollar signs
-            text = re.sub(r'\$([^$]*)\$([^$]*)\$([^$]*)\$', r'$\1\2\3$', text)
-            text = re.sub(r'\$\$+', '$', text)
+            if text.count('$') >= 4:
+                text = re.sub(r'\$([^$]*)\$([^$]*)\$([^$]*)\$', r'$\1\2\3$', text)
+            if '$$' in text:
+                text = re.sub(r'\$\$+', '$', text)
             
             return text
         
-        # If no dollar signs, proceed with wrapping complete expressions
-        
-        # Pattern for complete mathematical expressions
-        math_patterns = [
-            # Complete fractions
-            r'\\frac\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}',
-            # Complete square roots  
-            r'\\sqrt\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}',
-            # Integrals with bounds
-            r'\\int_[^\\s]*\^[^\\s]*\s*[^\\s]*\s*dx',
-            r'\\int_[^\\s]*\s*[^\\s]*\s*dx',
-            r'\\int\s*[^\\s]*\s*dx',
-            # Complete trig expressions
-            r'\\(?:sin|cos|tan)(?:\^[0-9]+)?\s*[a-zA-Z]*',
-            # Greek letters
-            r'\\(?:pi|alpha|beta|gamma|delta|theta|lambda|mu|sigma|phi|omega)',
-            # Operators
-            r'\\(?:leq|geq|neq|approx|equiv|in|subset|cup|cap|infty)',
-            # Number sets
-            r'\\mathbb\{[RQNCZH]\}',
-        ]
-        
-        # Find all mathematical expressions
-        for pattern in math_patterns:
-            matches = list(re.finditer(pattern, text))
-            for match in reversed(matches):
-                start, end = match.span()
-                expression = match.group()
-                
-                # Check if already wrapped
-                if (start > 0 and text[start-1] == '$') or (end < len(text) and text[end] == '$'):
-                    continue
-                
-                # Wrap the complete expression
-                text = text[:start] + f'${expression}$' + text[end:]
-        
-        # Handle some specific cases for complete expressions
-        text = re.sub(r'\\frac\{\\sqrt\{\\pi\}\}\{2\}', r'$\\frac{\\sqrt{\\pi}}{2}$', text)
-        text = re.sub(r'\\frac\{\\sqrt\{\\pi\}\}\{4\}', r'$\\frac{\\sqrt{\\pi}}{4}$', text)
-        text = re.sub(r'2\\sqrt\{\\pi\}', r'$2\\sqrt{\\pi}$', text)
-        text = re.sub(r'4\\sqrt\{\\pi\}', r'$4\\sqrt{\\pi}$', text)
-        text = re.sub(r'\\sqrt\{\\pi\}', r'$\\sqrt{\\pi}$', text)
-        
-        return text
-    
-    def fix_mathematical_notation(self, text):
-        """Fix corrupted mathematical notation and LaTeX expressions"""
-        
-        # Enhanced symbol fixes from our recent work
-        enhanced_fixes = {
-            # Integral and math symbols
-            '\\int \\$1': '\\int_0^1',
-            '\\int \\$': '\\int_',
-            'sin p': '\\sin \\pi',
-            'cos p': '\\cos \\pi',
-            'tan p': '\\tan \\pi',
-            'si p': '\\sin \\pi',
-            'co p': '\\cos \\pi',
-            'lo ': '\\log ',
-            'ln ': '\\ln ',
-            
-            # Greek letters and special symbols
-            ' p ': ' \\pi ',
-            ' p$': ' \\pi',
-            '$p': '\\pi',
-            'p$': '\\pi',
-            'p)': '\\pi)',
-            '(p': '(\\pi',
-            
-            # Fractions and expressions
-            'frac{': '\\frac{',
-            'sqrt{': '\\sqrt{',
-            'sum_{': '\\sum_{',
-            'prod_{': '\\prod_{',
-            'lim_{': '\\lim_{',
-            
-            # Comparison operators
-            ' £ ': ' \\leq ',
-            ' ³ ': ' \\geq ',
-            ' ¢ ': ' \\neq ',
-            '£': '\\leq',
-            '³': '\\geq',
-            '¢': '\\neq',
-            
-            # Common corrupted expressions
-            'Æ\\mathbb{R}': '\\to \\mathbb{R}',
-            'ı': 'i',
-            '\\p': ' \\neq 0',
-            
-            # Specific fixes for problem content
-            'cid:11': '',
-            'cid:12': '',
-            'cid:32': ' = ',
-            'cid:94': '',
-            'cid:96': '',
-            'cid:135': '',
-            'cid:149': '\\geq',
-            'cid:144': '',
-            'cid:199': '',
-            'cid:14': '+',
-        }
-        
-        # Apply enhanced fixes
-        for old, new in enhanced_fixes.items():
-            text = text.replace(old, new)
-        
-        # Fix specific mathematical expressions with regex
-        text = re.sub(r'\\int\s*\\infty', r'\\int_0^{\\infty}', text)
-        text = re.sub(r'\\int\s*(\d+)', r'\\int_0^{\1}', text)
-        text = re.sub(r'(\d+)\s*£\s*(\w+)\s*£\s*(\d+)', r'\1 \\leq \2 \\leq \3', text)
-        text = re.sub(r'£\s*(\w+)\s*£', r'\\leq \1 \\leq', text)
-        
-        # Fix double backslashes in LaTeX
-        text = re.sub(r'\\\\(frac|sum|int|lim|log|ln|sqrt)', r'\\\1', text)
-        
-        return text
-    
-    def fix_choice_formatting(self, problem_text):
-        """Enhanced choice formatting to ensure proper line breaks"""
-        
-        # Remove duplicate "Choices:" labels first
-        text = re.sub(r'Choices:\s*Choices:\s*', 'Choices:\n', problem_text)
-        
-        # If there's already a "Choices:" section, fix its formatting
-        if 'Choices:' in text:
-            parts = text.split('Choices:', 1)
-            if len(parts) == 2:
-                problem_part = parts[0].strip()
-                choices_part = parts[1].strip()
-                
-                # Format choices properly - ensure each choice is on a new line
-                choices_part = re.sub(r'\s*\(([A-E])\)\s*', r'\n(\1) ', choices_part)
-                choices_part = re.sub(r'\s*([A-E])\)\s*', r'\n(\1) ', choices_part)
-                
-                # Clean up multiple newlines
-                choices_part = re.sub(r'\n\s*\n', '\n', choices_part)
-                choices_part = choices_part.strip()
-                
-                return f"{problem_part}\n\nChoices:\n{choices_part}"
-        
-        # If choices are mixed in without "Choices:" label, try to extract them
-        choice_pattern = r'(\([A-E]\)[^(]*?)(?=\([A-E]\)|$)'
-        choices = re.findall(choice_pattern, text)
-        
-        if len(choices) >= 2:  # At least 2 choices found
-            # Find where choices start
-            first_choice_match = re.search(r'\([A-E]\)', text)
-            if first_choice_match:
-                choice_start = first_choice_match.start()
-                problem_part = text[:choice_start].strip()
-                
-                # Format choices
-                formatted_choices = []
-                for choice in choices:
-                    choice = choice.strip()
-                    if choice:
-                        # Extract letter and text
-                        match = re.match(r'\(([A-E])\)\s*(.*)', choice)
-                        if match:
-                            letter, text_part = match.groups()
-                            formatted_choices.append(f"({letter}) {text_part.strip()}")
-                
-                if formatted_choices:
-                    choices_text = '\n'.join(formatted_choices)
-                    return f"{problem_part}\n\nChoices:\n{choices_text}"
-        
-        return text
-    
-    def fix_mathematical_spacing(self, text):
-        """Fix spacing around mathematical expressions"""
-        
-        # Fix spacing around $ signs
-        spacing_fixes = [
-            (r'Let\$', 'Let $'),
-            (r'\$denote', '$ denote'),
-            (r'\$and\$', '$ and $'),
-            (r'\$be', '$ be'),
-            (r'\$satisfies', '$ satisfies'),
-            (r'\$for\$', '$ for $'),
-            (r'\$is', '$ is'),
-            (r'\$are', '$ are'),
-            (r'then\$', 'then $'),
-            (r'will\$', 'will $'),
-            (r'on\$', 'on $'),
-            (r'to\$', 'to $'),
-        ]
-        
-        for pattern, replacement in spacing_fixes:
-            text = re.sub(pattern, replacement, text)
-        
-        # Fix spacing around math
-        text = re.sub(r'\$\s+', '$', text)
-        text = re.sub(r'\s+\$', '$', text)
-        
-        return text
-    
-    def merge_with_existing(self, new_problems, existing_file=None):
-        """Merge new problems with existing problem set"""
+        # If no dollar signs, wrap complete expressions in one tokenizer pass
+        return wrap_math_spans(text)
+    
+    @staticmethod
+    def merge_with_existing(new_problems, existing_file=None, policy=None):
+        """Merge new problems with existing problem set, resolving id conflicts by policy"""
         if existing_file and Path(existing_file).exists():
             try:
-                with open(existing_file, 'r') as f:
-                    existing_problems = json.load(f)
+                existing_problems = list(iter_problems(existing_file))
                 
-                print(f"Loaded {len(existing_problems)} existing problems")
-                
-                # Combine and sort by ID
-                all_problems = existing_problems + new_problems
-                all_problems.sort(key=lambda x: x['id'])
-                
-                return all_problems
+                logger.info("Loaded %d existing problems", len(existing_problems))
             except Exception as e:
-                print(f"Error loading existing file: {e}")
+                logger.error("Error loading existing file: %s", e)
                 return new_problems
+            
+            policy = policy or MERGE_SETTINGS['policy']
+            all_problems, stats = merge_problem_sets(
+                existing_problems, new_problems, policy, MERGE_SETTINGS['preserve_fields']
+            )
+            
+            logger.info("🔀 Merge (%s): %d inserted, %d updated, %d unchanged, %d conflicting ids",
+                        policy, stats.inserted, stats.updated, stats.unchanged, stats.conflicts)
+            for old_id, new_id in stats.renumbered:
+                logger.info("   Renumbered new problem %s -> %s", old_id, new_id)
+            
+            return all_problems
         else:
             return new_problems
     
     def save_to_json(self, problems, output_file):
-        """Save problems to JSON file with proper formatting"""
+        """Save problems in the configured output format, rewriting only changed files"""
         try:
-            with open(output_file, 'w') as f:
-                json.dump(problems, f, **EXPORT_SETTINGS)
+            if self.katex_renderer is not None:
+                self.prerender_katex(problems)
+            self.sample_problems = problems[:self.sample_size]
+            search_index = new_search_index(self.search_index)
+            if search_index is not None:
+                problems = search_index.iter_added(problems)
+            result = write_problems(problems, output_file, EXPORT_SETTINGS,
+                                    self.output_format, self.shard_max_bytes)
             
-            print(f"Successfully saved {len(problems)} problems to {output_file}")
+            logger.info("Successfully saved %d problems to %s", result.problems, output_file)
+            logger.info("💾 Output (%s): %s", self.output_format, result.describe())
+            if search_index is not None:
+                save_search_index(search_index, output_file, self.output_format)
             return True
         except Exception as e:
-            print(f"Error saving to JSON: {e}")
+            logger.error("Error saving to JSON: %s", e)
             return False
     
-    def process_pdf(self, pdf_path, output_path, start_problem=1, existing_file=None):
+    def save_to_json_stream(self, problems, output_file):
+        """Write problems one at a time as they arrive
+
+        Produces the same file(s) as save_to_json without holding the whole
+        list or its serialized form in memory. Returns the number of problems
+        written.
+        """
+        if self.katex_renderer is not None:
+            problems = self.katex_renderer.iter_prerendered(problems)
+        if self.sample_size:
+            problems = self.iter_sampled(problems)
+        search_index = new_search_index(self.search_index)
+        if search_index is not None:
+            problems = search_index.iter_added(problems)
+        result = write_problems(problems, output_file, EXPORT_SETTINGS,
+                                self.output_format, self.shard_max_bytes)
+        logger.info("💾 Output (%s): %s", self.output_format, result.describe())
+        if search_index is not None:
+            save_search_index(search_index, output_file, self.output_format)
+        return result.problems
+    
+    def iter_sampled(self, problems):
+        """Pass problems through, keeping the first sample_size of them"""
+        self.sample_problems = []
+        for problem in problems:
+            if len(self.sample_problems) < self.sample_size:
+                self.sample_problems.append(problem)
+            yield problem
+    
+    def prerender_katex(self, problems):
+        """Attach the KaTeX markup of every math span to the problems; failed spans are logged"""
+        logger.info("Pre-rendering math with KaTeX...")
+        return self.katex_renderer.prerender(problems)
+    
+    def iter_processed_problems(self, pdf_path, start_problem=1, workers=1, end_problem=None):
+        """Stream fully formatted problems straight from the PDF pages"""
+        for problem_num, problem_text in self.iter_selected_problem_texts(pdf_path, start_problem,
+                                                                          end_problem, workers):
+            record = self.parse_single_problem(problem_num, problem_text)
+            logger.debug("Parsed problem %s", problem_num)
+            self.post_process_problem(record)
+            yield self.export_problem(record)
+    
+    def process_pdf_streaming(self, pdf_path, output_path, start_problem=1, workers=1, end_problem=None):
+        """Streaming pipeline: each problem is formatted and written as soon as it is read
+
+        Peak memory is bounded by the largest page/problem rather than the whole
+        PDF. Merging with an existing file needs the full set, so it is not
+        supported here.
+        """
+        logger.info("Starting streaming PDF to JSON pipeline...")
+        logger.info("Input PDF: %s", pdf_path)
+        logger.info("Output JSON: %s", output_path)
+        if end_problem is None:
+            logger.info("Starting from problem: %d", start_problem)
+        else:
+            logger.info("Problems: %d-%d", start_problem, end_problem)
+        if self.figure_dir:
+            self.extract_figures(pdf_path, start_problem, end_problem, workers)
+        
+        categories = {}
+        progress = self.progress("Streaming")
+        
+        def counted(problems):
+            for problem in problems:
+                category = problem.get('category', 'Unknown')
+                categories[category] = categories.get(category, 0) + 1
+                progress.update()
+                yield problem
+        
+        try:
+            count = self.save_to_json_stream(
+                counted(self.iter_processed_problems(pdf_path, start_problem, workers, end_problem)),
+                output_path
+            )
+        except Exception as e:
+            logger.error("Error in streaming pipeline: %s", e)
+            return False
+        progress.finish()
+        
+        if not count:
+            logger.error("No problems found in PDF")
+            return False
+        
+        logger.info("Successfully saved %d problems to %s", count, output_path)
+        logger.info("✅ Pipeline completed successfully!")
+        logger.info("📊 Total problems: %d", count)
+        logger.info("📚 Categories: %s", dict(sorted(categories.items())))
+        self.report_format_cache()
+        return True
+    
+    def process_pdf(self, pdf_path, output_path, start_problem=1, existing_file=None, workers=1,
+                    conflict_policy=None, end_problem=None):
         """Main processing pipeline"""
-        print(f"Starting PDF to JSON pipeline...")
-        print(f"Input PDF: {pdf_path}")
-        print(f"Output JSON: {output_path}")
-        print(f"Starting from problem: {start_problem}")
+        logger.info("Starting PDF to JSON pipeline...")
+        logger.info("Input PDF: %s", pdf_path)
+        logger.info("Output JSON: %s", output_path)
+        if end_problem is None:
+            logger.info("Starting from problem: %d", start_problem)
+        else:
+            logger.info("Problems: %d-%d", start_problem, end_problem)
         
-        # Step 1: Extract text from PDF
-        text = self.extract_text_from_pdf(pdf_path)
-        if not text:
+        # Step 1: Extract the selected problems' text from the PDF
+        problem_texts = self.extract_problem_texts(pdf_path, start_problem, end_problem, workers)
+        if problem_texts is None:
             return False
         
         # Step 2: Parse problems from text
-        new_problems = self.parse_problems_from_text(text, start_problem)
+        new_problems = self.parse_problem_texts(problem_texts)
         if not new_problems:
-            print("No problems found in PDF")
+            logger.error("No problems found in PDF")
             return False
         
-        # Step 3: Apply post-processing validation and cleanup
-        new_problems = self.post_process_validation(new_problems)
+        # Step 3: Render the problems' figures if requested
+        if self.figure_dir:
+            self.extract_figures(pdf_path, start_problem, end_problem, workers)
+        
+        # Step 4: Apply post-processing validation and cleanup, then render each problem once
+        new_problems = self.export_problems(self.post_process_validation(new_problems))
         
-        # Step 4: Merge with existing problems if specified
-        all_problems = self.merge_with_existing(new_problems, existing_file)
+        # Step 5: Merge with existing problems if specified
+        all_problems = self.merge_with_existing(new_problems, existing_file, conflict_policy)
         
-        # Step 5: Save to JSON
+        # Step 6: Save to JSON
         success = self.save_to_json(all_problems, output_path)
         
         if success:
-            print(f"\n✅ Pipeline completed successfully!")
-            print(f"📊 Total problems: {len(all_problems)}")
-            print(f"🆕 New problems added: {len(new_problems)}")
+            logger.info("✅ Pipeline completed successfully!")
+            logger.info("📊 Total problems: %d", len(all_problems))
+            logger.info("🆕 New problems added: %d", len(new_problems))
             
             # Show category breakdown
             categories = {}
@@ -524,133 +955,750 @@ class PDFMathProblemExtractor:
                 category = problem.get('category', 'Unknown')
                 categories[category] = categories.get(category, 0) + 1
             
-            print(f"📚 Categories: {dict(sorted(categories.items()))}")
+            logger.info("📚 Categories: %s", dict(sorted(categories.items())))
             
             # Show formatting improvements applied
-            print(f"🔧 Enhanced formatting features applied:")
-            print(f"   - Mathematical notation cleanup")
-            print(f"   - Choice formatting with proper line breaks")
-            print(f"   - PDF artifact removal")
-            print(f"   - Post-processing validation")
+            logger.info("🔧 Enhanced formatting features applied:")
+            logger.info("   - Mathematical notation cleanup")
+            logger.info("   - Choice formatting with proper line breaks")
+            logger.info("   - PDF artifact removal")
+            logger.info("   - Post-processing validation")
+            self.report_format_cache()
         
         return success
+    
+    def report_format_cache(self):
+        """Print how many formatting results were reused versus rebuilt"""
+        if self.format_cache is not None:
+            logger.info("♻️  Formatting cache: %d reused, %d rebuilt", self.format_cache.reused, self.format_cache.rebuilt)
+
+    def process_batch(self, root, output_path, args, start_problem=1, jobs=None, workers=1, use_cache=True):
+        """Process every PDF under root concurrently into one merged corpus
 
+        Problem IDs are namespaced per source (e.g. 'gre_subject-18') and each
+        problem records its source. A per-source timing and count summary is
+        written next to the output file. `args` are the extract command's
+        options, from which each worker builds its extractor.
+        """
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        
+        pdf_paths = sorted(str(path) for path in Path(root).rglob('*') if path.suffix.lower() == '.pdf')
+        if not pdf_paths:
+            logger.error("No PDF files found under %s", root)
+            return False
+        
+        jobs = max(1, min(jobs or os.cpu_count() or 1, len(pdf_paths)))
+        namespaces = source_namespaces(pdf_paths, root)
+        logger.info("Starting batch pipeline: %d PDFs under %s with %d jobs", len(pdf_paths), root, jobs)
+        
+        started = time.perf_counter()
+        results = {}
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = {pool.submit(process_pdf_source, pdf_path, args, start_problem, workers, use_cache,
+                                   self.low_memory): pdf_path
+                       for pdf_path in pdf_paths}
+            for future in as_completed(futures):
+                pdf_path = futures[future]
+                try:
+                    results[pdf_path] = future.result()
+                except Exception as e:
+                    import traceback
+                    
+                    # The worker process itself died (e.g. crashed inside pdfplumber)
+                    results[pdf_path] = {'pdf': pdf_path, 'problems': [], 'seconds': None,
+                                         'error': f"{type(e).__name__}: {e}", 'traceback': traceback.format_exc()}
+                result = results[pdf_path]
+                if result['traceback']:
+                    logger.error("Failed %s: %s\n%s", pdf_path, result['error'], result['traceback'].rstrip())
+                else:
+                    logger.info("Finished %s: %s", pdf_path, result['error'] or f"{len(result['problems'])} problems")
+        
+        # Merge in a stable order: by source, then by problem number
+        corpus = []
+        summary = []
+        for pdf_path in pdf_paths:
+            result = results[pdf_path]
+            namespace = namespaces[pdf_path]
+            for problem in result['problems']:
+                problem['id'] = f"{namespace}-{problem['id']}"
+                problem['source'] = namespace
+                corpus.append(problem)
+            summary.append({
+                'source': namespace,
+                'pdf': pdf_path,
+                'problems': len(result['problems']),
+                'seconds': result['seconds'],
+                'error': result['error'],
+                'traceback': result['traceback'],
+            })
+        
+        success = self.save_to_json(corpus, output_path)
+        summary_path = Path(output_path).with_name(Path(output_path).stem + '_summary.json')
+        with open(summary_path, 'w') as f:
+            json.dump({
+                'root': str(root),
+                'total_problems': len(corpus),
+                'total_seconds': round(time.perf_counter() - started, 3),
+                'sources': summary,
+            }, f, indent=2, ensure_ascii=False)
+        
+        failed = [entry for entry in summary if entry['error']]
+        logger.info("📊 Batch summary (%s):", summary_path)
+        for entry in summary:
+            timing = f"{entry['seconds']:.2f}s" if entry['seconds'] is not None else "-"
+            logger.info("   %s: %d problems in %s%s", entry['source'], entry['problems'], timing,
+                        f" ❌ {entry['error']}" if entry['error'] else "")
+        if failed:
+            logger.warning("⚠️  %d of %d PDFs failed", len(failed), len(summary))
+        
+        return success and len(failed) < len(summary)
+    
     def post_process_validation(self, problems):
         """Apply post-processing validation and final cleanup"""
         
-        print("Applying post-processing validation and cleanup...")
+        logger.info("Applying post-processing validation and cleanup...")
         
         validation_fixes = 0
+        progress = self.progress("Post-processing", total=len(problems))
         for problem in problems:
-            original_text = problem.get('problem', '')
-            if not original_text:
-                continue
-            
-            # Apply final validation fixes
-            fixed_text = self.apply_final_validation_fixes(original_text)
-            
-            if fixed_text != original_text:
-                problem['problem'] = fixed_text
+            if self.post_process_problem(problem):
                 validation_fixes += 1
-                print(f"Applied validation fixes to problem {problem['id']}")
+            progress.update()
+        progress.finish()
         
-        print(f"Post-processing completed: {validation_fixes} problems refined")
+        logger.info("Post-processing completed: %d problems refined", validation_fixes)
         return problems
     
-    def apply_final_validation_fixes(self, text):
-        """Apply final validation and cleanup fixes"""
-        
-        # Remove any remaining duplicate "Choices:" labels
-        text = re.sub(r'Choices:\s*Choices:\s*', 'Choices:\n', text)
-        
-        # Ensure proper spacing before mathematical expressions
-        spacing_patterns = [
-            (r'then\$', 'then $'),
-            (r'will\$', 'will $'),
-            (r'on\$', 'on $'),
-            (r'to\$', 'to $'),
-            (r'Let\$', 'Let $'),
-            (r'\$denote', '$ denote'),
-            (r'\$and\$', '$ and $'),
-        ]
-        
-        for pattern, replacement in spacing_patterns:
-            text = re.sub(pattern, replacement, text)
-        
-        # Ensure choices are properly formatted with line breaks
-        if 'Choices:' in text:
-            parts = text.split('Choices:', 1)
-            if len(parts) == 2:
-                problem_part = parts[0].strip()
-                choices_part = parts[1].strip()
-                
-                # Ensure each choice is on a separate line
-                choices_part = re.sub(r'\s*\(([A-E])\)\s*', r'\n(\1) ', choices_part)
-                choices_part = choices_part.strip()
-                
-                text = f"{problem_part}\n\nChoices:\n{choices_part}"
+    def post_process_problem(self, record):
+        """Apply final validation fixes to one problem record; return True if it changed"""
+        if not record.stem and not record.choices:
+            return False
         
-        # Final whitespace cleanup
-        text = re.sub(r'\s+', ' ', text)
-        text = re.sub(r'\n\s*\n\s*\n+', '\n\n', text)
+        # Apply final validation fixes to every segment (memoized across runs)
+        if self.format_cache is not None:
+            original = record.encode_segments()
+            fixed = self.format_cache.memoize(
+                'final-record', original, self.rule_fingerprint.base.hex(), self.final_segments
+            )
+            changed = fixed != original
+            if changed:
+                record.set_segments(fixed)
+        else:
+            changed = record.map_segments(self.apply_final_validation_fixes)
         
-        return text.strip()
+        if changed:
+            logger.debug("Applied validation fixes to problem %s", record.id)
+        return changed
+    
+    def final_segments(self, encoded):
+        """Final validation fixes applied to encoded segments, for the format cache"""
+        record = ProblemRecord(None, '').set_segments(encoded)
+        record.map_segments(self.apply_final_validation_fixes)
+        return record.encode_segments()
+    
+    def apply_final_validation_fixes(self, text):
+        """Apply final validation and cleanup fixes to one segment of a problem
 
+        Drops a duplicate "Choices:" label, puts spaces back between words
+        and dollar signs, and cleans up whitespace (see self.final_rules).
+        """
+        return self.final_rules.apply(text)
 
-def main():
-    """Command line interface for the PDF to JSON pipeline"""
+
+def start_katex_renderer(use_cache):
+    """Start the --katex renderer before any extraction, so a missing Node.js or katex fails fast"""
+    from pipeline_katex import KatexRenderer, KatexUnavailable, open_katex_cache
+    
+    renderer = KatexRenderer(open_katex_cache() if use_cache else None)
+    try:
+        renderer.start()
+    except KatexUnavailable as e:
+        renderer.close()
+        logger.error("Error: KaTeX renderer unavailable (run npm install): %s", e)
+        return None
+    return renderer
+
+
+def finish_katex_renderer(renderer):
+    """Stop the --katex renderer and report its span counts"""
+    if renderer is not None:
+        renderer.close()
+        logger.info("🧮 KaTeX: %s", renderer.describe())
+
+
+# Subcommands; a first argument that is none of them runs `extract`, so the
+# original `pdf_to_json_pipeline.py input.pdf output.json` still works
+COMMANDS = ('extract', 'reformat', 'merge', 'validate', 'sample', 'dedup', 'index')
+
+
+def build_parser():
+    """Argument parser with one subcommand per pipeline entry point"""
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--quiet', '-q', action='store_true',
+                       help='Only log warnings and errors')
+    common.add_argument('--verbose', '-v', action='store_true',
+                       help='Also log every page and problem')
+    
     parser = argparse.ArgumentParser(
         description="Convert PDF math problems to structured JSON format",
         formatter_class=argparse.RawDescriptionHelpFormatter,
         epilog="""
 Examples:
-  python3 pdf_to_json_pipeline.py problems.pdf output.json
-  python3 pdf_to_json_pipeline.py problems.pdf output.json --start-problem 18
-  python3 pdf_to_json_pipeline.py problems.pdf output.json --existing current.json
+  python3 pdf_to_json_pipeline.py extract problems.pdf output.json
+  python3 pdf_to_json_pipeline.py extract problems.pdf output.json --start-problem 18
+  python3 pdf_to_json_pipeline.py extract problems.pdf output.json --problems 18-25
+  python3 pdf_to_json_pipeline.py extract problems.pdf output.json --existing current.json
+  python3 pdf_to_json_pipeline.py extract problems.pdf output.json --existing current.json --on-conflict overwrite
+  python3 pdf_to_json_pipeline.py extract problems.pdf output.json --workers 4
+  python3 pdf_to_json_pipeline.py extract problems.pdf output.json --stream
+  python3 pdf_to_json_pipeline.py extract compilation.pdf output.json --stream --low-memory --max-rss-mb 256
+  python3 pdf_to_json_pipeline.py extract problems.pdf output.json --figures --workers 4
+  python3 pdf_to_json_pipeline.py extract problems.pdf output.json --katex
+  python3 pdf_to_json_pipeline.py extract problems.pdf output.json --watch
+  python3 pdf_to_json_pipeline.py extract src/data corpus.json --batch --jobs 4
+  python3 pdf_to_json_pipeline.py extract problems.pdf problems.ndjson --format ndjson
+  python3 pdf_to_json_pipeline.py extract problems.pdf output.json --profile --cprofile run.prof
+  python3 pdf_to_json_pipeline.py extract src/data corpus_shards --batch --format shards
+  python3 pdf_to_json_pipeline.py extract src/data public/problems --batch --format bundle
+  python3 pdf_to_json_pipeline.py reformat src/data/mathProblems.json
+  python3 pdf_to_json_pipeline.py merge current.json new.json --output merged.json --on-conflict overwrite
+  python3 pdf_to_json_pipeline.py validate src/data/mathProblems.json
+  python3 pdf_to_json_pipeline.py sample src/data/mathProblems.json 5
+  python3 pdf_to_json_pipeline.py dedup corpus.json --drop --output deduped.json
+  python3 pdf_to_json_pipeline.py index src/data/mathProblems.json --query "eigenvalue"
+  python3 pdf_to_json_pipeline.py problems.pdf output.json  (same as extract)
         """
     )
+    commands = parser.add_subparsers(dest='command', metavar='COMMAND')
     
-    parser.add_argument('pdf_file', help='Input PDF file path')
-    parser.add_argument('json_file', help='Output JSON file path')
-    parser.add_argument('--start-problem', type=int, default=1, 
+    extract = commands.add_parser('extract', parents=[common], help='Extract problems from a PDF (the default)')
+    extract.add_argument('pdf_file', help='Input PDF file path (a directory with --batch)')
+    extract.add_argument('json_file', help='Output JSON file path')
+    extract.add_argument('--start-problem', type=int, default=1, 
                        help='Problem number to start extracting from (default: 1)')
-    parser.add_argument('--existing', help='Existing JSON file to merge with')
-    parser.add_argument('--sample', type=int, help='Create a sample file with N problems')
+    extract.add_argument('--problems', type=parse_problem_range, metavar='N-M',
+                       help='Only extract problems N to M (also N, or N- for N onwards); '
+                            'with a cached problem index only their pages are read')
+    extract.add_argument('--existing', help='Existing JSON file to merge with')
+    extract.add_argument('--on-conflict', choices=CONFLICT_POLICIES,
+                       help="How --existing handles problems with the same id "
+                            f"(default: {MERGE_SETTINGS['policy']})")
+    extract.add_argument('--sample', type=int, help='Create a sample file with N problems')
+    extract.add_argument('--format', choices=OUTPUT_FORMATS,
+                       help=f"Output format; with shards or bundle json_file is a directory (default: {OUTPUT_SETTINGS['format']})")
+    extract.add_argument('--shard-kb', type=int,
+                       help=f"Size cap of each shard in KB (default: {OUTPUT_SETTINGS['shard_max_kb']})")
+    extract.add_argument('--workers', type=int, default=1,
+                       help='Number of processes for page extraction (default: 1)')
+    extract.add_argument('--figures', nargs='?', const=FIGURE_SETTINGS['directory'], metavar='DIR',
+                       help='Render each problem\'s figures as cropped PNGs and record them as its image '
+                            f"(default DIR: {FIGURE_SETTINGS['directory']})")
+    extract.add_argument('--katex', action='store_true',
+                       help='Pre-render every math span with the app\'s KaTeX (needs Node.js and npm install)')
+    extract.add_argument('--stream', action='store_true',
+                       help='Stream pages to problems to output without holding the whole PDF text')
+    extract.add_argument('--watch', action='store_true',
+                       help='Stay running and re-run the changed stages whenever the PDF or pipeline_config.py changes')
+    extract.add_argument('--low-memory', action='store_true',
+                       help='Read pages in small windows and release their layout objects, for very large PDFs '
+                            f"(window: {LOW_MEMORY_SETTINGS['window_pages']} pages)")
+    extract.add_argument('--max-rss-mb', type=int,
+                       help='Memory ceiling per process with --low-memory; above it fewer pages are read at once '
+                            f"(default: {LOW_MEMORY_SETTINGS['max_rss_mb']})")
+    extract.add_argument('--batch', action='store_true',
+                       help='Process every PDF under the pdf_file directory into one corpus')
+    extract.add_argument('--jobs', type=int,
+                       help='Number of PDFs processed concurrently in batch mode (default: CPU count)')
+    extract.add_argument('--profile', nargs='?', const='', metavar='REPORT',
+                       help='Time each pipeline stage and write a JSON report (default: <output>_profile.json)')
+    extract.add_argument('--slowest', type=int, default=10,
+                       help='Number of slowest problems listed in the profile report (default: 10)')
+    extract.add_argument('--no-trace-memory', action='store_true',
+                       help='Profile without tracemalloc (accurate timings, no peak memory)')
+    extract.add_argument('--cprofile', metavar='FILE',
+                       help='Also write a cProfile dump of the run (readable with pstats)')
+    extract.add_argument('--no-search-index', action='store_true',
+                       help='Do not write the keyword search index next to the output')
+    extract.add_argument('--no-cache', action='store_true',
+                       help='Do not read or write the page text and formatting caches')
+    extract.add_argument('--clear-cache', action='store_true',
+                       help='Empty the page text and formatting caches before running')
+    extract.set_defaults(run=run_extract)
+    
+    reformat = commands.add_parser('reformat', parents=[common],
+                                   help='Re-run post-processing over a problem file, without its PDF')
+    reformat.add_argument('problems_file', help='Problem file (json, ndjson, shards or bundle)')
+    reformat.add_argument('--output', help='Write here instead of updating problems_file')
+    reformat.add_argument('--format', choices=OUTPUT_FORMATS,
+                         help='Output format (default: the format of the output path)')
+    reformat.add_argument('--shard-kb', type=int,
+                         help=f"Size cap of each shard in KB (default: {OUTPUT_SETTINGS['shard_max_kb']})")
+    reformat.add_argument('--no-search-index', action='store_true',
+                         help='Do not write the keyword search index next to the output')
+    reformat.add_argument('--no-cache', action='store_true',
+                         help='Do not read or write the formatting cache')
+    reformat.set_defaults(run=run_reformat)
     
-    args = parser.parse_args()
+    merge = commands.add_parser('merge', parents=[common], help='Merge a problem file into an existing one by id')
+    merge.add_argument('existing_file', help='Existing problem file')
+    merge.add_argument('new_file', help='Problem file merged into it')
+    merge.add_argument('--output', help='Write here instead of updating existing_file')
+    merge.add_argument('--on-conflict', choices=CONFLICT_POLICIES,
+                      help=f"How problems with the same id are handled (default: {MERGE_SETTINGS['policy']})")
+    merge.add_argument('--format', choices=OUTPUT_FORMATS,
+                      help='Output format (default: the format of the output path)')
+    merge.add_argument('--shard-kb', type=int,
+                      help=f"Size cap of each shard in KB (default: {OUTPUT_SETTINGS['shard_max_kb']})")
+    merge.add_argument('--no-search-index', action='store_true',
+                      help='Do not write the keyword search index next to the output')
+    merge.set_defaults(run=run_merge)
     
+    validate = commands.add_parser('validate', parents=[common],
+                                   help='Check every problem of a problem file; exits with 1 on any issue')
+    validate.add_argument('problems_file', help='Problem file (json, ndjson, shards or bundle)')
+    validate.set_defaults(run=run_validate)
+    
+    sample = commands.add_parser('sample', parents=[common], help='Write the first N problems of a problem file')
+    sample.add_argument('problems_file', help='Problem file (json, ndjson, shards or bundle)')
+    sample.add_argument('count', type=int, help='Number of problems')
+    sample.add_argument('--output', help='Sample file (default: <problems_file>_sample.json)')
+    sample.set_defaults(run=run_sample)
+    
+    dedup = commands.add_parser('dedup', parents=[common],
+                                help='Find near-duplicate problems of a problem file and optionally drop them')
+    dedup.add_argument('problems_file', help='Problem file (json, ndjson, shards or bundle)')
+    dedup.add_argument('--report', help='Duplicate report (default: <problems_file>_duplicates.json)')
+    dedup.add_argument('--threshold', type=float,
+                       help=f"Similarity at which two problems are duplicates (default: {DEDUP_SETTINGS['threshold']})")
+    dedup.add_argument('--drop', action='store_true',
+                       help='Also write the problems without the duplicates, keeping the earliest of each cluster')
+    dedup.add_argument('--output', help='With --drop, write here instead of updating problems_file')
+    dedup.add_argument('--format', choices=OUTPUT_FORMATS,
+                       help='Output format (default: the format of the output path)')
+    dedup.add_argument('--shard-kb', type=int,
+                       help=f"Size cap of each shard in KB (default: {OUTPUT_SETTINGS['shard_max_kb']})")
+    dedup.add_argument('--no-search-index', action='store_true',
+                       help='With --drop, do not write the keyword search index next to the output')
+    dedup.set_defaults(run=run_dedup)
+    
+    index = commands.add_parser('index', parents=[common],
+                                help='Write the keyword search index of a problem file, or query it')
+    index.add_argument('problems_file', help='Problem file (json, ndjson, shards or bundle)')
+    index.add_argument('--output', help='Index file (default: <problems_file>_search.json, or search.json '
+                                        'inside a shards or bundle directory)')
+    index.add_argument('--query', help='Print the ids of the problems matching this query instead')
+    index.set_defaults(run=run_index)
+    return parser
+
+
+def build_extractor(args, page_cache=None, format_cache=None, katex_renderer=None, low_memory=None):
+    """Extractor set up from the extract command's options, the same for single, watched and batch runs
+
+    Batch workers call it too, with the parsed options sent to their process.
+    """
+    extractor = PDFMathProblemExtractor(page_cache, format_cache, args.format, args.shard_kb, args.figures,
+                                        katex_renderer)
+    extractor.sample_size = args.sample or 0
+    extractor.search_index = extractor.search_index and not args.no_search_index
+    extractor.low_memory = low_memory
+    return extractor
+
+
+def run_extract(args):
+    """The extract command: the full PDF to JSON pipeline"""
     # Validate inputs
+    if args.max_rss_mb is not None and not args.low_memory:
+        logger.error("Error: --max-rss-mb needs --low-memory")
+        return 1
+    low_memory = None
+    if args.low_memory:
+        low_memory = dict(LOW_MEMORY_SETTINGS)
+        if args.max_rss_mb is not None:
+            low_memory['max_rss_mb'] = args.max_rss_mb
+    
+    if args.batch:
+        if not Path(args.pdf_file).is_dir():
+            logger.error("Error: batch root '%s' is not a directory", args.pdf_file)
+            return 1
+        if args.existing or args.stream or args.problems or args.figures or args.watch:
+            logger.error("Error: --batch cannot be combined with --existing, --stream, --problems, --figures or --watch")
+            return 1
+        if args.profile is not None or args.cprofile:
+            logger.error("Error: --profile and --cprofile run in a single process and cannot be combined with --batch")
+            return 1
+        use_cache = CACHE_SETTINGS['enabled'] and not args.no_cache
+        if args.clear_cache:
+            from pipeline_cache import FormatCache, PageTextCache
+            
+            for cache in (PageTextCache(CACHE_SETTINGS['directory'], 0), FormatCache(CACHE_SETTINGS['directory'], 0)):
+                cache.clear()
+                cache.close()
+            logger.info("Cleared caches in %s", CACHE_SETTINGS['directory'])
+        katex_renderer = None
+        if args.katex:
+            katex_renderer = start_katex_renderer(use_cache)
+            if katex_renderer is None:
+                return 1
+        extractor = build_extractor(args, katex_renderer=katex_renderer, low_memory=low_memory)
+        success = extractor.process_batch(
+            args.pdf_file, args.json_file, args, args.start_problem, args.jobs, args.workers, use_cache
+        )
+        finish_katex_renderer(katex_renderer)
+        if low_memory:
+            report_peak_rss()
+        if success and args.sample:
+            save_sample(extractor, args.json_file)
+        return 0 if success else 1
+    
     if not Path(args.pdf_file).exists():
-        print(f"Error: PDF file '{args.pdf_file}' does not exist")
+        logger.error("Error: PDF file '%s' does not exist", args.pdf_file)
+        return 1
+    
+    if args.stream and args.existing:
+        logger.error("Error: --stream cannot be combined with --existing")
         return 1
     
+    if args.watch and (args.stream or args.profile is not None or args.cprofile):
+        logger.error("Error: --watch cannot be combined with --stream, --profile or --cprofile")
+        return 1
+    
+    start_problem, end_problem = args.start_problem, None
+    if args.problems:
+        if args.start_problem != 1:
+            logger.error("Error: --problems cannot be combined with --start-problem")
+            return 1
+        start_problem, end_problem = args.problems
+    
+    # Open the page text and formatting caches unless disabled
+    page_cache = format_cache = None
+    if args.clear_cache or (CACHE_SETTINGS['enabled'] and not args.no_cache):
+        from pipeline_cache import FormatCache, PageTextCache
+        
+        page_cache = PageTextCache(CACHE_SETTINGS['directory'], CACHE_SETTINGS['max_size_mb'] * 1024 * 1024)
+        format_cache = FormatCache(CACHE_SETTINGS['directory'], CACHE_SETTINGS['format_max_size_mb'] * 1024 * 1024)
+        if args.clear_cache:
+            page_cache.clear()
+            format_cache.clear()
+            logger.info("Cleared caches in %s", CACHE_SETTINGS['directory'])
+        if args.no_cache:
+            page_cache.close()
+            format_cache.close()
+            page_cache = format_cache = None
+    
+    katex_renderer = None
+    if args.katex:
+        katex_renderer = start_katex_renderer(CACHE_SETTINGS['enabled'] and not args.no_cache)
+        if katex_renderer is None:
+            return 1
+    
+    # Stay resident and re-run on changes; each run compiles the current config
+    if args.watch:
+        from pipeline_watch import PipelineWatcher
+        
+        def run(extractor):
+            success = extractor.process_pdf(args.pdf_file, args.json_file, start_problem, args.existing,
+                                            args.workers, args.on_conflict, end_problem)
+            if success and args.sample:
+                save_sample(extractor, args.json_file)
+            return success
+        
+        watcher = PipelineWatcher(
+            lambda: build_extractor(args, page_cache, format_cache, katex_renderer, low_memory),
+            run,
+            args.pdf_file
+        )
+        watcher.serve()
+        finish_katex_renderer(katex_renderer)
+        if page_cache is not None:
+            page_cache.close()
+            format_cache.close()
+        return 0
+    
     # Create extractor and run pipeline
-    extractor = PDFMathProblemExtractor()
-    success = extractor.process_pdf(
-        args.pdf_file, 
-        args.json_file, 
-        args.start_problem, 
-        args.existing
-    )
+    extractor = build_extractor(args, page_cache, format_cache, katex_renderer, low_memory)
     
-    # Create sample file if requested
+    # Wrap the pipeline stages only when profiling, so normal runs pay nothing
+    profiler = cprofiler = None
+    if args.profile is not None:
+        from pipeline_profile import StageProfiler
+        
+        profiler = StageProfiler(args.slowest, trace_memory=not args.no_trace_memory)
+        profiler.instrument(extractor)
+        profiler.start()
+    if args.cprofile:
+        import cProfile
+        
+        cprofiler = cProfile.Profile()
+        cprofiler.enable()
+    
+    if args.stream:
+        success = extractor.process_pdf_streaming(
+            args.pdf_file,
+            args.json_file,
+            start_problem,
+            args.workers,
+            end_problem
+        )
+    else:
+        success = extractor.process_pdf(
+            args.pdf_file, 
+            args.json_file, 
+            start_problem, 
+            args.existing,
+            args.workers,
+            args.on_conflict,
+            end_problem
+        )
+    
+    if cprofiler is not None:
+        cprofiler.disable()
+        cprofiler.dump_stats(args.cprofile)
+        logger.info("cProfile dump written to %s", args.cprofile)
+    if profiler is not None:
+        profiler.stop()
+        output = Path(args.json_file)
+        report_path = args.profile or output.with_name(output.stem + '_profile.json')
+        report = profiler.write(report_path, pdf=args.pdf_file, mode='stream' if args.stream else 'full',
+                                workers=args.workers, cprofile=args.cprofile)
+        memory = (f", peak {report['peak_memory_bytes'] / (1024 * 1024):.1f} MB traced"
+                  if report['peak_memory_bytes'] is not None else "")
+        logger.info("⏱️  Profile (%s): %.2fs total%s", report_path, report['total_seconds'], memory)
+        for stage in report['stages']:
+            logger.info("   %-26s %6d calls  %8.3fs (self %.3fs)",
+                        stage['stage'], stage['calls'], stage['seconds'], stage['self_seconds'])
+    
+    finish_katex_renderer(katex_renderer)
+    if page_cache is not None:
+        logger.info("Page cache: %d hits, %d misses", page_cache.hits, page_cache.misses)
+        page_cache.close()
+        format_cache.close()
+    if low_memory:
+        report_peak_rss()
+    
+    # Create sample file if requested, from the problems kept while writing
     if success and args.sample:
-        try:
-            with open(args.json_file, 'r') as f:
-                all_problems = json.load(f)
-            
-            sample_problems = all_problems[:args.sample]
-            sample_file = args.json_file.replace('.json', '_sample.json')
-            
-            with open(sample_file, 'w') as f:
-                json.dump(sample_problems, f, indent=2, ensure_ascii=False)
-            
-            print(f"📄 Sample file created: {sample_file} ({len(sample_problems)} problems)")
-        except Exception as e:
-            print(f"Warning: Could not create sample file: {e}")
+        save_sample(extractor, args.json_file)
     
     return 0 if success else 1
 
 
+def report_peak_rss():
+    """Log the peak resident memory of this process and of its largest worker process"""
+    from pipeline_memory import peak_rss_bytes
+    
+    peak, worker_peak = peak_rss_bytes(), peak_rss_bytes(children=True)
+    if peak is None:
+        logger.info("Peak RSS is not available on this platform")
+        return
+    logger.info("📈 Peak RSS: %.0f MB%s", peak / (1024 * 1024),
+                f" (largest worker process: {worker_peak / (1024 * 1024):.0f} MB)" if worker_peak else "")
+
+
+def sample_path(problems_file):
+    """Default sample file next to a problem file"""
+    path = Path(problems_file)
+    return path.with_name(path.stem + '_sample.json')
+
+
+def save_sample(extractor, json_file):
+    """Write the sample file of a run from the problems the extractor kept while writing"""
+    try:
+        write_sample(extractor.sample_problems, sample_path(json_file))
+    except Exception as e:
+        logger.warning("Could not create sample file: %s", e)
+
+
+def write_sample(problems, sample_file):
+    """Write problems as a small JSON array for quick inspection"""
+    with open(sample_file, 'w') as f:
+        json.dump(problems, f, indent=2, ensure_ascii=False)
+    logger.info("📄 Sample file created: %s (%d problems)", sample_file, len(problems))
+
+
+def write_output(problems, output, output_format=None, shard_kb=None, search_index=True):
+    """Write problems in output_format (default: the format of the output path), and their search index if search_index"""
+    output_format = output_format or detect_format(output)
+    search_index = new_search_index(search_index)
+    if search_index is not None:
+        problems = search_index.iter_added(problems)
+    result = write_problems(problems, output, EXPORT_SETTINGS, output_format,
+                            (shard_kb or OUTPUT_SETTINGS['shard_max_kb']) * 1024)
+    logger.info("💾 Output (%s): %s", output, result.describe())
+    if search_index is not None:
+        save_search_index(search_index, output, output_format)
+
+
+def new_search_index(enabled=True):
+    """A SearchIndexBuilder for an output about to be written, or None when indexing is off"""
+    if not (enabled and SEARCH_SETTINGS['enabled']):
+        return None
+    from pipeline_search import SearchIndexBuilder
+    
+    return SearchIndexBuilder(SEARCH_SETTINGS)
+
+
+def save_search_index(search_index, output, output_format, path=None):
+    """Write a SearchIndexBuilder's index next to the output it was built from"""
+    from pipeline_search import search_index_path
+    
+    path = path or search_index_path(output, output_format)
+    written = search_index.write(path)
+    logger.info("🔎 Search index (%s): %d terms over %d problems%s", path, len(search_index.postings),
+                len(search_index.ids), "" if written else ", unchanged")
+
+
+def run_reformat(args):
+    """The reformat command: post-processing over an existing problem file"""
+    if not Path(args.problems_file).exists():
+        logger.error("Error: problem file '%s' does not exist", args.problems_file)
+        return 1
+    
+    format_cache = None
+    if CACHE_SETTINGS['enabled'] and not args.no_cache:
+        from pipeline_cache import FormatCache
+        
+        format_cache = FormatCache(CACHE_SETTINGS['directory'], CACHE_SETTINGS['format_max_size_mb'] * 1024 * 1024)
+    extractor = PDFMathProblemExtractor(format_cache=format_cache)
+    problems = list(iter_problems(args.problems_file))
+    reformatted = extractor.reformat_problems(problems)
+    changed = sum(old != new for old, new in zip(problems, reformatted))
+    
+    write_output(reformatted, args.output or args.problems_file, args.format, args.shard_kb,
+                 not args.no_search_index)
+    logger.info("🔧 Reformatted %d problems, %d changed", len(reformatted), changed)
+    extractor.report_format_cache()
+    if format_cache is not None:
+        format_cache.close()
+    return 0
+
+
+def run_merge(args):
+    """The merge command: merge one problem file into another by id"""
+    if not Path(args.new_file).exists():
+        logger.error("Error: problem file '%s' does not exist", args.new_file)
+        return 1
+    
+    problems = PDFMathProblemExtractor.merge_with_existing(
+        list(iter_problems(args.new_file)), args.existing_file, args.on_conflict
+    )
+    write_output(problems, args.output or args.existing_file, args.format, args.shard_kb, not args.no_search_index)
+    return 0
+
+
+def run_validate(args):
+    """The validate command: report problems that fail validate_problem or share an id"""
+    if not Path(args.problems_file).exists():
+        logger.error("Error: problem file '%s' does not exist", args.problems_file)
+        return 1
+    
+    count = invalid = 0
+    ids = set()
+    duplicates = set()
+    for problem in iter_problems(args.problems_file):
+        count += 1
+        if problem.get('id') in ids:
+            duplicates.add(problem.get('id'))
+        ids.add(problem.get('id'))
+        errors = validate_problem(problem)
+        if errors:
+            invalid += 1
+            logger.warning("Problem %s has validation issues: %s", problem.get('id'), errors)
+    if duplicates:
+        logger.warning("Duplicate ids: %s", sorted(duplicates, key=str))
+    
+    logger.info("✅ %d problems checked: %d with issues, %d duplicate ids", count, invalid, len(duplicates))
+    return 1 if invalid or duplicates else 0
+
+
+def run_sample(args):
+    """The sample command: the first N problems of a problem file, read no further"""
+    if not Path(args.problems_file).exists():
+        logger.error("Error: problem file '%s' does not exist", args.problems_file)
+        return 1
+    
+    write_sample(list(islice(iter_problems(args.problems_file), args.count)),
+                 args.output or sample_path(args.problems_file))
+    return 0
+
+
+def run_dedup(args):
+    """The dedup command: cluster near-duplicate problems with MinHash and LSH"""
+    if not Path(args.problems_file).exists():
+        logger.error("Error: problem file '%s' does not exist", args.problems_file)
+        return 1
+    from pipeline_dedup import drop_duplicates, find_duplicates
+    
+    settings = dict(DEDUP_SETTINGS)
+    if args.threshold is not None:
+        settings['threshold'] = args.threshold
+    problems = list(iter_problems(args.problems_file))
+    started = time.perf_counter()
+    clusters = find_duplicates(problems, settings)
+    dropped = sum(len(cluster.members) for cluster in clusters)
+    logger.info("🔍 %d problems checked in %.2fs: %d clusters, %d duplicates",
+                len(problems), time.perf_counter() - started, len(clusters), dropped)
+    
+    path = Path(args.problems_file)
+    report = args.report or path.with_name(path.stem + '_duplicates.json')
+    with open(report, 'w') as f:
+        json.dump({
+            'threshold': settings['threshold'],
+            'problems': len(problems),
+            'duplicates': dropped,
+            'clusters': [cluster.as_dict(problems) for cluster in clusters],
+        }, f, indent=2, ensure_ascii=False)
+    logger.info("📄 Duplicate report: %s", report)
+    
+    if args.drop:
+        write_output(drop_duplicates(problems, clusters), args.output or args.problems_file,
+                     args.format, args.shard_kb, not args.no_search_index)
+    return 0
+
+
+def run_index(args):
+    """The index command: build the search index of a problem file, or run a query against it"""
+    if not Path(args.problems_file).exists():
+        logger.error("Error: problem file '%s' does not exist", args.problems_file)
+        return 1
+    from pipeline_search import SearchIndex, SearchIndexBuilder, search_index_path
+    
+    output_format = detect_format(args.problems_file)
+    if args.query is not None:
+        path = Path(args.output or search_index_path(args.problems_file, output_format))
+        if path.exists():
+            search_index = SearchIndex.load(path)
+        else:
+            logger.info("No search index at %s; indexing %s in memory", path, args.problems_file)
+            search_index = SearchIndex.build(iter_problems(args.problems_file), SEARCH_SETTINGS)
+        matches = search_index.search(args.query)
+        logger.info("🔎 %d problems match %r", len(matches), args.query)
+        for problem_id in matches:
+            print(problem_id)
+        return 0
+    
+    search_index = SearchIndexBuilder(SEARCH_SETTINGS)
+    for problem in iter_problems(args.problems_file):
+        search_index.add(problem)
+    save_search_index(search_index, args.problems_file, output_format, args.output)
+    return 0
+
+
+def main(argv=None):
+    """Command line interface for the PDF to JSON pipeline"""
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] not in COMMANDS and argv[0] not in ('-h', '--help'):
+        argv = ['extract'] + argv
+    
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.print_help()
+        return 1
+    configure_logging(LOGGING_CONFIG, args.quiet, args.verbose)
+    return args.run(args)
+
+
+
+
 if __name__ == "__main__":
     exit(main()) 
\ No newline at end of file
@@ -0,0 +1,634 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the PDF to JSON Math Problems Pipeline
+=====================================================
+
+Measures the pipeline's text-processing hot spots on a corpus built from the
+problems in src/data/mathProblems.json, scaled up to the requested size.
+
+The `stages` benchmark builds synthetic PDF-extracted text (corrupted
+symbols, cid codes, page headers and footers, and the inline, one-per-line
+and "Choices:" choice layouts) at each requested size. It reports the
+throughput and peak traced memory of every pipeline stage.
+
+The `rules` benchmark runs both formatting stages over the segments of
+that synthetic text and of the exported problems. It checks the output is
+identical to the stages before they became rule sets, and compares how
+many guard checks and rewrite passes each problem costs.
+
+The `startup` benchmark runs each JSON-only subcommand of the pipeline in a
+fresh interpreter. It reports the wall time over bare interpreter startup
+and checks that the import of the pipeline module pulls in none of the
+modules only PDF stages or single commands need.
+
+Usage:
+    python3 pipeline_benchmark.py replacements [--problems N] [--repeat N] [--output results.json]
+    python3 pipeline_benchmark.py classifier [--problems N] [--repeat N] [--output results.json]
+    python3 pipeline_benchmark.py math [--repeat N] [--output results.json]
+    python3 pipeline_benchmark.py stages [--sizes 1000,10000,100000] [--repeat N] [--no-memory] [--output results.json]
+    python3 pipeline_benchmark.py rules [--problems N] [--repeat N] [--output results.json]
+    python3 pipeline_benchmark.py startup [--repeat N] [--output results.json]
+"""
+
+import argparse
+import json
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from pipeline_classifier import KeywordClassifier
+from pipeline_config import (
+    SYMBOL_REPLACEMENTS, UNICODE_ARTIFACTS, NOTATION_FIXES, CATEGORY_KEYWORDS, COMPLEXITY_INDICATORS,
+    EXPORT_SETTINGS, PDF_ARTIFACT_PATTERNS
+)
+from pipeline_math import wrap_math_spans
+from pipeline_model import ProblemRecord
+from pipeline_replacements import ReplacementTable, apply_sequentially
+from pipeline_writer import write_problems
+
+DEFAULT_SOURCE = Path(__file__).parent / 'src' / 'data' / 'mathProblems.json'
+DEFAULT_STAGE_SIZES = [1000, 10000, 100000]
+
+# Problems per synthetic page; each page ends with the headers and footers
+# that PDF_ARTIFACT_PATTERNS removes
+PROBLEMS_PER_PAGE = 4
+
+
+def build_replacement_corpus(size, source=DEFAULT_SOURCE):
+    """Build `size` raw problem texts that look like pdfplumber output
+
+    The formatted problems are turned back into PDF-style text by swapping
+    LaTeX for the corrupted symbols the replacement tables are meant to fix.
+    """
+    with open(source, 'r') as f:
+        texts = [problem['problem'] for problem in json.load(f)]
+
+    # Reverse the single-character symbol mappings (e.g. '\\leq' -> '≤')
+    corruptions = {}
+    for symbol, replacement in SYMBOL_REPLACEMENTS.items():
+        if len(symbol) == 1 and replacement.startswith('\\') and replacement not in corruptions:
+            corruptions[replacement] = symbol
+    artifacts = [artifact for artifact in UNICODE_ARTIFACTS if artifact not in SYMBOL_REPLACEMENTS]
+
+    corpus = []
+    for i in range(size):
+        text = texts[i % len(texts)].replace('$', '')
+        for latex, symbol in sorted(corruptions.items(), key=lambda item: -len(item[0])):
+            text = text.replace(latex + ' ', symbol + ' ')
+        if i % 3 == 0:
+            text = f"{text} cid:32 {artifacts[i % len(artifacts)]}"
+        corpus.append(text)
+    return corpus
+
+
+def build_extracted_text(size, source=DEFAULT_SOURCE):
+    """Build synthetic pdfplumber output holding `size` numbered problems
+
+    Problems come from build_replacement_corpus (corrupted symbols and cid
+    codes). Their choices rotate through the layouts the parser handles: one
+    per line, all on one line, and under a "Choices:" label. Each page ends
+    with the book's header and footer lines.
+    """
+    lines = []
+    for number, text in enumerate(build_replacement_corpus(size, source), 1):
+        parts = re.split(r'\s*(?=\([A-E]\) )', text)
+        stem = ' '.join(parts[0].split())
+        choices = [' '.join(choice.split()) for choice in parts[1:]]
+
+        lines.append(f"{number}. {stem}")
+        layout = number % 3
+        if layout == 0:
+            lines.extend(choices)
+        elif layout == 1:
+            lines.append(' '.join(choices))
+        elif choices:
+            lines.append('Choices:')
+            lines.extend(choices)
+
+        if number % PROBLEMS_PER_PAGE == 0:
+            page = number // PROBLEMS_PER_PAGE
+            lines.append(f"GRE Mathematics Test Practice Book Page {page}")
+            lines.append("Unauthorized copying or reuse of any part of this page is illegal.")
+            lines.append("GO ON TO THE NEXT PAGE.")
+    return '\n'.join(lines)
+
+
+def time_call(func, repeat):
+    """Best-of-`repeat` wall time for func()"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def benchmark_replacements(corpus, repeat=5):
+    """Compare one str.replace per entry against the compiled tables"""
+    tables = [
+        ('UNICODE_ARTIFACTS', [(artifact, '') for artifact in UNICODE_ARTIFACTS]),
+        ('NOTATION_FIXES', list(NOTATION_FIXES.items())),
+        ('SYMBOL_REPLACEMENTS', list(SYMBOL_REPLACEMENTS.items())),
+    ]
+
+    results = []
+    for name, rules in tables:
+        table = ReplacementTable(rules)
+
+        # The compiled table must reproduce the sequential passes exactly
+        expected = [apply_sequentially(rules, text) for text in corpus]
+        if [table.apply(text) for text in corpus] != expected:
+            raise AssertionError(f"Compiled {name} table differs from sequential replacement")
+
+        sequential = time_call(lambda: [apply_sequentially(rules, text) for text in corpus], repeat)
+        compiled = time_call(lambda: [table.apply(text) for text in corpus], repeat)
+        results.append({
+            'table': name,
+            'rules': table.rule_count,
+            'segments': len(table.segments),
+            'sequential_seconds': round(sequential, 6),
+            'compiled_seconds': round(compiled, 6),
+            'speedup': round(sequential / compiled, 2) if compiled else None,
+        })
+    return results
+
+
+def score_per_problem(keyword_table, texts):
+    """Reference one-problem-at-a-time scoring: count every keyword's label for each text"""
+    scores = []
+    for text in texts:
+        text_lower = text.lower()
+        scores.append([sum(keyword.lower() in text_lower for keyword in keywords)
+                       for keywords in keyword_table.values()])
+    return scores
+
+
+def benchmark_classifier(corpus, repeat=5):
+    """Compare per-problem keyword scoring against one batched classify() call"""
+    tables = [
+        ('CATEGORY_KEYWORDS', CATEGORY_KEYWORDS, 'Mathematics'),
+        ('COMPLEXITY_INDICATORS', COMPLEXITY_INDICATORS, 'Medium'),
+    ]
+
+    results = []
+    for name, keyword_table, default in tables:
+        classifier = KeywordClassifier(keyword_table)
+        defaults = [default] * len(corpus)
+
+        sequential = time_call(lambda: score_per_problem(keyword_table, corpus), repeat)
+        batched = time_call(lambda: classifier.classify(corpus, defaults), repeat)
+        results.append({
+            'table': name,
+            'labels': len(classifier.labels),
+            'keywords': len(classifier.keywords),
+            'sequential_seconds': round(sequential, 6),
+            'batched_seconds': round(batched, 6),
+            'speedup': round(sequential / batched, 2) if batched else None,
+        })
+    return results
+
+
+# The regex loop wrap_math_expressions ran before pipeline_math's tokenizer
+LEGACY_MATH_PATTERNS = [
+    r'\\frac\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}',
+    r'\\sqrt\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}',
+    r'\\int_[^\\s]*\^[^\\s]*\s*[^\\s]*\s*dx',
+    r'\\int_[^\\s]*\s*[^\\s]*\s*dx',
+    r'\\int\s*[^\\s]*\s*dx',
+    r'\\(?:sin|cos|tan)(?:\^[0-9]+)?\s*[a-zA-Z]*',
+    r'\\(?:pi|alpha|beta|gamma|delta|theta|lambda|mu|sigma|phi|omega)',
+    r'\\(?:leq|geq|neq|approx|equiv|in|subset|cup|cap|infty)',
+    r'\\mathbb\{[RQNCZH]\}',
+]
+
+
+def wrap_math_regex_loop(text):
+    """Reference wrapper: rebuild the string for every match of every pattern"""
+    for pattern in LEGACY_MATH_PATTERNS:
+        for match in reversed(list(re.finditer(pattern, text))):
+            start, end = match.span()
+            if (start > 0 and text[start - 1] == '$') or (end < len(text) and text[end] == '$'):
+                continue
+            text = text[:start] + f'${match.group()}$' + text[end:]
+    text = re.sub(r'\\frac\{\\sqrt\{\\pi\}\}\{2\}', r'$\\frac{\\sqrt{\\pi}}{2}$', text)
+    text = re.sub(r'\\frac\{\\sqrt\{\\pi\}\}\{4\}', r'$\\frac{\\sqrt{\\pi}}{4}$', text)
+    text = re.sub(r'2\\sqrt\{\\pi\}', r'$2\\sqrt{\\pi}$', text)
+    text = re.sub(r'4\\sqrt\{\\pi\}', r'$4\\sqrt{\\pi}$', text)
+    text = re.sub(r'\\sqrt\{\\pi\}', r'$\\sqrt{\\pi}$', text)
+    return text
+
+
+def malformed_math(text):
+    """True if the $...$ spans in wrapped text would not render
+
+    That is an odd number of dollar signs, '$$' (display math in KaTeX), an
+    empty or brace-unbalanced span, a span that cuts a command in two
+    (e.g. '$\\in$fty'), or a span that opens inside a brace group of the
+    surrounding text (e.g. 'e^{i$\\theta$}').
+    """
+    pieces = text.split('$')
+    if len(pieces) % 2 == 0 or '$$' in text:
+        return True
+    for span in pieces[1::2]:
+        if not span.strip() or span.count('{') != span.count('}'):
+            return True
+    # Brace depth of the text outside the spans, where each span starts;
+    # an unmatched '}' is ignored, as the tokenizer does
+    depth = 0
+    for outside in pieces[:-1:2]:
+        for brace in re.findall(r'(?<!\\)[{}]', outside):
+            depth = depth + 1 if brace == '{' else max(depth - 1, 0)
+        if depth:
+            return True
+    return re.search(r'\\[a-zA-Z]+\$[a-zA-Z]', text) is not None
+
+
+def build_math_corpus(source=DEFAULT_SOURCE):
+    """Problem texts from mathProblems.json without their dollar signs, as PDF text arrives"""
+    with open(source, 'r') as f:
+        return [' '.join(problem['problem'].replace('$', '').split()) for problem in json.load(f)]
+
+
+def benchmark_math(corpus, repeat=5, lengths=(1, 64, 512)):
+    """Compare the math-span tokenizer with the per-match regex loop
+
+    Outputs are compared problem by problem on the corpus. The first timing
+    wraps the stem and choice segments of each problem, as the pipeline
+    does; the others join `length` problems into one text to show how each
+    scales with length, the last also without closing braces.
+    """
+    legacy = [wrap_math_regex_loop(text) for text in corpus]
+    tokenized = [wrap_math_spans(text) for text in corpus]
+    differing = [(text, old, new) for text, old, new in zip(corpus, legacy, tokenized) if old != new]
+    comparison = {
+        'problems': len(corpus),
+        'identical': len(corpus) - len(differing),
+        'differing': len(differing),
+        'malformed_legacy': sum(map(malformed_math, legacy)),
+        'malformed_tokenized': sum(map(malformed_math, tokenized)),
+        'examples': [{'legacy': old, 'tokenized': new} for _, old, new in differing[:5]],
+    }
+
+    inputs = [('segments', [segment for segments in problem_segments(corpus) for segment in segments])]
+    for length in lengths:
+        inputs.append((f'{length} problems',
+                       [' '.join(corpus[(i + j) % len(corpus)] for j in range(length)) for i in range(len(corpus))]))
+    inputs.append((f'{lengths[-1]} unbalanced', [text.replace('}', '') for text in inputs[-1][1]]))
+
+    timings = []
+    for name, texts in inputs:
+        loop = time_call(lambda: [wrap_math_regex_loop(text) for text in texts], repeat)
+        tokenizer = time_call(lambda: [wrap_math_spans(text) for text in texts], repeat)
+        timings.append({
+            'texts': name,
+            'count': len(texts),
+            'characters': sum(map(len, texts)),
+            'regex_loop_seconds': round(loop, 6),
+            'tokenizer_seconds': round(tokenizer, 6),
+            'speedup': round(loop / tokenizer, 2) if tokenizer else None,
+        })
+    return comparison, timings
+
+
+def peak_memory(func):
+    """Peak traced allocation (bytes) while running func()"""
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def pipeline_stages(extractor, text, output_dir):
+    """(stage, input size in characters, setup, run) for every stage of the pipeline
+
+    setup() builds the stage's input from the previous stage's output and is
+    not timed; run(input) is the measured work.
+    """
+    raw = list(extractor.iter_problem_texts([text]))
+    stems = [extractor.normalize_problem_text(problem_text) for _, problem_text in raw]
+    records = extractor.parse_problems_from_text(text)
+    numbers = [number for number, _ in raw]
+    problems = extractor.export_problems(records)
+    formatted = [problem['problem'] for problem in problems]
+    output_file = Path(output_dir) / 'problems.json'
+
+    def write(batch):
+        output_file.unlink(missing_ok=True)
+        write_problems(batch, output_file, EXPORT_SETTINGS)
+
+    return [
+        ('parse_problems_from_text', len(text), lambda: text, extractor.parse_problems_from_text),
+        ('classify_problems', sum(map(len, stems)), lambda: stems,
+         lambda batch: extractor.classify_problems(numbers, batch)),
+        ('apply_formatting_fixes', sum(map(len, stems)),
+         lambda: [ProblemRecord.parse(number, stem) for number, stem in zip(numbers, stems)],
+         lambda batch: [extractor.format_record(record) for record in batch]),
+        ('wrap_math_expressions', sum(map(len, formatted)), lambda: formatted,
+         lambda batch: [extractor.wrap_math_expressions(problem_text) for problem_text in batch]),
+        ('post_process_validation', sum(map(len, formatted)), lambda: [record.copy() for record in records],
+         extractor.post_process_validation),
+        ('export_problems', sum(map(len, formatted)), lambda: records, extractor.export_problems),
+        ('write_json', sum(map(len, formatted)), lambda: problems, write),
+    ], len(problems)
+
+
+def benchmark_stages(sizes, repeat=1, measure_memory=True):
+    """Throughput and peak memory of every pipeline stage at each corpus size"""
+    # Only this benchmark needs the pipeline module itself
+    from pdf_to_json_pipeline import PDFMathProblemExtractor
+
+    # Pipeline logging stays unconfigured here, so only warnings are shown
+    extractor = PDFMathProblemExtractor()
+    results = []
+    with tempfile.TemporaryDirectory() as output_dir:
+        for size in sizes:
+            text = build_extracted_text(size)
+            stages, problem_count = pipeline_stages(extractor, text, output_dir)
+            for stage, characters, setup, run in stages:
+                best = None
+                for _ in range(repeat):
+                    batch = setup()
+                    start = time.perf_counter()
+                    run(batch)
+                    elapsed = time.perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+                peak = peak_memory(lambda: run(setup())) if measure_memory else None
+                results.append({
+                    'stage': stage,
+                    'problems': problem_count,
+                    'input_characters': characters,
+                    'seconds': round(best, 6),
+                    'problems_per_second': round(problem_count / best, 1) if best else None,
+                    'characters_per_second': round(characters / best, 1) if best else None,
+                    'peak_memory_bytes': peak,
+                })
+    return results
+
+
+# Spacing subs of the formatting fixes before they became a rule set; the
+# final two removed every space they added
+LEGACY_FORMAT_SPACING = [
+    (r'Let\$', 'Let $'), (r'\$denote', '$ denote'), (r'\$and\$', '$ and $'), (r'\$be', '$ be'),
+    (r'\$satisfies', '$ satisfies'), (r'\$for\$', '$ for $'), (r'\$is', '$ is'), (r'\$are', '$ are'),
+    (r'then\$', 'then $'), (r'will\$', 'will $'), (r'on\$', 'on $'), (r'to\$', 'to $'),
+    (r'\$\s+', '$'), (r'\s+\$', '$'),
+]
+LEGACY_FINAL_SPACING = [
+    (r'then\$', 'then $'), (r'will\$', 'will $'), (r'on\$', 'on $'), (r'to\$', 'to $'),
+    (r'Let\$', 'Let $'), (r'\$denote', '$ denote'), (r'\$and\$', '$ and $'),
+]
+
+
+def legacy_formatting_fixes(extractor, text, counts):
+    """Reference: the formatting fixes as separate passes, counting checks and rewrites"""
+    def check(found):
+        counts['checks'] += 1
+        return found
+
+    def sub(pattern, replacement, text, flags=0):
+        counts['rewrites'] += 1
+        return re.sub(pattern, replacement, text, flags=flags)
+
+    def call(func, text):
+        counts['rewrites'] += 1
+        return func(text)
+
+    if check(extractor.artifact_gate.search(text)):
+        for pattern in PDF_ARTIFACT_PATTERNS:
+            text = sub(pattern, '', text, re.MULTILINE | re.IGNORECASE)
+    text = call(extractor.unicode_artifact_table.apply, text)
+    text = call(extractor.notation_fix_table.apply, text)
+    if check('\\int' in text):
+        text = sub(r'\\int\s*\\infty', r'\\int_0^{\\infty}', text)
+        text = sub(r'\\int\s*(\d+)', r'\\int_0^{\1}', text)
+    if check('£' in text):
+        text = sub(r'(\d+)\s*£\s*(\w+)\s*£\s*(\d+)', r'\1 \\leq \2 \\leq \3', text)
+        text = sub(r'£\s*(\w+)\s*£', r'\\leq \1 \\leq', text)
+    if check('\\\\' in text):
+        text = sub(r'\\\\(frac|sum|int|lim|log|ln|sqrt)', r'\\\1', text)
+    text = call(extractor.symbol_table.apply, text)
+    if check('$' in text):
+        for pattern, replacement in LEGACY_FORMAT_SPACING:
+            text = sub(pattern, replacement, text)
+    text = call(extractor.wrap_math_expressions, text)
+    return sub(r'\s+', ' ', text).strip()
+
+
+def legacy_final_fixes(text, counts):
+    """Reference: the final validation fixes as separate passes, counting checks and rewrites"""
+    counts['checks'] += 2
+    if 'Choices:' in text:
+        counts['rewrites'] += 1
+        text = re.sub(r'Choices:\s*Choices:\s*', 'Choices: ', text)
+    if '$' in text:
+        for pattern, replacement in LEGACY_FINAL_SPACING:
+            counts['rewrites'] += 1
+            text = re.sub(pattern, replacement, text)
+    counts['rewrites'] += 1
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def problem_segments(texts):
+    """[stem, choice, ...] of each normalized problem text"""
+    segments = []
+    for text in texts:
+        record = ProblemRecord.parse(None, text)
+        segments.append([record.stem] + [choice for _, choice in record.choices])
+    return segments
+
+
+def benchmark_rules(size, repeat=5, source=DEFAULT_SOURCE):
+    """Compare the formatting rule sets with the separate passes they replaced
+
+    Raw segments come from synthetic PDF text of `size` problems and go
+    through both stages, as in extraction; exported segments come from the
+    problem file and go through the final stage only, as in `reformat`.
+    """
+    from pdf_to_json_pipeline import PDFMathProblemExtractor
+
+    extractor = PDFMathProblemExtractor()
+    raw = problem_segments(extractor.normalize_problem_text(problem_text)
+                           for _, problem_text in extractor.iter_problem_texts([build_extracted_text(size, source)]))
+    with open(source, 'r') as f:
+        exported = problem_segments(re.sub(r'\s+', ' ', problem['problem']).strip() for problem in json.load(f))
+
+    def run_legacy(problems, stages):
+        counts = {'checks': 0, 'rewrites': 0}
+        output = []
+        for segments in problems:
+            for segment in segments:
+                if 'format' in stages:
+                    segment = legacy_formatting_fixes(extractor, segment, counts)
+                output.append(legacy_final_fixes(segment, counts))
+        return output, counts
+
+    def run_rules(problems, stages):
+        extractor.format_rules.reset_counts()
+        extractor.final_rules.reset_counts()
+        output = []
+        for segments in problems:
+            for segment in segments:
+                if 'format' in stages:
+                    segment = extractor.apply_formatting_fixes(segment)
+                output.append(extractor.apply_final_validation_fixes(segment))
+        counts = {'checks': extractor.format_rules.checks + extractor.final_rules.checks,
+                  'rewrites': extractor.format_rules.rewrites + extractor.final_rules.rewrites}
+        return output, counts
+
+    results = []
+    for name, problems, stages in (('extraction', raw, ('format', 'final')), ('reformat', exported, ('final',))):
+        legacy, legacy_counts = run_legacy(problems, stages)
+        fused, rule_counts = run_rules(problems, stages)
+        legacy_seconds = time_call(lambda: run_legacy(problems, stages), repeat)
+        rules_seconds = time_call(lambda: run_rules(problems, stages), repeat)
+        results.append({
+            'corpus': name,
+            'problems': len(problems),
+            'segments': len(legacy),
+            'identical': sum(old == new for old, new in zip(legacy, fused)),
+            'legacy_checks_per_problem': round(legacy_counts['checks'] / len(problems), 2),
+            'legacy_rewrites_per_problem': round(legacy_counts['rewrites'] / len(problems), 2),
+            'rule_checks_per_problem': round(rule_counts['checks'] / len(problems), 2),
+            'rule_rewrites_per_problem': round(rule_counts['rewrites'] / len(problems), 2),
+            'legacy_seconds': round(legacy_seconds, 6),
+            'rules_seconds': round(rules_seconds, 6),
+            'speedup': round(legacy_seconds / rules_seconds, 2) if rules_seconds else None,
+        })
+    return results
+
+
+# Modules that only the PDF stages of the pipeline may import
+PDF_STAGE_MODULES = (
+    'pdfplumber', 'multiprocessing', 'concurrent.futures.process', 'cProfile', 'tracemalloc',
+    'pipeline_figures', 'pipeline_profile', 'pipeline_katex', 'pipeline_watch', 'pipeline_memory',
+)
+# Modules that only the commands using them may import
+COMMAND_MODULES = ('sqlite3', 'pipeline_cache', 'pipeline_search', 'pipeline_dedup')
+
+
+def benchmark_startup(repeat=5, source=DEFAULT_SOURCE):
+    """Wall time of each JSON-only pipeline command, each run as a fresh process"""
+    root = Path(__file__).resolve().parent
+    pipeline = [sys.executable, str(root / 'pdf_to_json_pipeline.py')]
+
+    check = ("import json, sys; import pdf_to_json_pipeline; "
+             f"print(json.dumps([name for name in {PDF_STAGE_MODULES + COMMAND_MODULES!r} if name in sys.modules]))")
+    loaded = json.loads(subprocess.run([sys.executable, '-c', check], cwd=root, check=True,
+                                       capture_output=True, text=True).stdout)
+
+    def run(command):
+        return time_call(lambda: subprocess.run(command, cwd=root, check=True, capture_output=True), repeat)
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        output = str(Path(output_dir) / 'problems.json')
+        commands = [
+            ('import', [sys.executable, '-c', 'import pdf_to_json_pipeline']),
+            ('validate', pipeline + ['validate', str(source), '-q']),
+            ('sample', pipeline + ['sample', str(source), '5', '--output', output, '-q']),
+            ('reformat', pipeline + ['reformat', str(source), '--output', output, '--no-cache', '-q']),
+            ('merge', pipeline + ['merge', str(source), str(source), '--output', output, '-q']),
+            ('dedup', pipeline + ['dedup', str(source), '--report', str(Path(output_dir) / 'duplicates.json'), '-q']),
+            ('index', pipeline + ['index', str(source), '--output', str(Path(output_dir) / 'search.json'), '-q']),
+        ]
+        interpreter = run([sys.executable, '-c', 'pass'])
+        results = []
+        for name, command in commands:
+            seconds = run(command)
+            results.append({
+                'command': name,
+                'seconds': round(seconds, 4),
+                'over_interpreter_seconds': round(seconds - interpreter, 4),
+            })
+    return {'interpreter_seconds': round(interpreter, 4), 'lazy_modules_loaded': loaded}, results
+
+
+def main():
+    """Command line interface for the pipeline benchmarks"""
+    parser = argparse.ArgumentParser(description="Benchmark the PDF to JSON pipeline")
+    parser.add_argument('benchmark', choices=['replacements', 'classifier', 'math', 'stages', 'rules', 'startup'], help='Benchmark to run')
+    parser.add_argument('--problems', type=int, default=10000,
+                       help='Number of problems in the benchmark corpus (default: 10000)')
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_STAGE_SIZES)),
+                       help='Comma-separated corpus sizes for the stages benchmark (default: 1000,10000,100000)')
+    parser.add_argument('--repeat', type=int,
+                       help='Repetitions; the best time is kept (default: 5, or 1 for stages)')
+    parser.add_argument('--no-memory', action='store_true',
+                       help='Skip the traced peak memory run of each stage')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+
+    args = parser.parse_args()
+
+    if args.benchmark == 'stages':
+        sizes = [int(size) for size in args.sizes.split(',')]
+        results = benchmark_stages(sizes, args.repeat or 1, not args.no_memory)
+        for result in results:
+            memory = (f", peak {result['peak_memory_bytes'] / (1024 * 1024):.1f} MB"
+                      if result['peak_memory_bytes'] is not None else '')
+            print(f"{result['problems']:>7} problems  {result['stage']:<25} {result['seconds']:.4f}s "
+                  f"({result['problems_per_second']:.0f} problems/s{memory})")
+        summary = {'benchmark': args.benchmark, 'sizes': sizes, 'results': results}
+    elif args.benchmark == 'startup':
+        startup, results = benchmark_startup(args.repeat or 5)
+        print(f"Interpreter startup {startup['interpreter_seconds']:.4f}s; lazily imported modules loaded on "
+              f"import: {', '.join(startup['lazy_modules_loaded']) or 'none'}")
+        for result in results:
+            print(f"{result['command']:<9} {result['seconds']:.4f}s (+{result['over_interpreter_seconds']:.4f}s)")
+        summary = {'benchmark': args.benchmark, **startup, 'results': results}
+    elif args.benchmark == 'rules':
+        results = benchmark_rules(args.problems, args.repeat or 5)
+        for result in results:
+            print(f"{result['corpus']:<10} {result['problems']:>6} problems, {result['identical']}/{result['segments']} "
+                  f"segments identical; per problem {result['legacy_checks_per_problem']} checks + "
+                  f"{result['legacy_rewrites_per_problem']} rewrites -> {result['rule_checks_per_problem']} + "
+                  f"{result['rule_rewrites_per_problem']}; {result['legacy_seconds']:.4f}s -> "
+                  f"{result['rules_seconds']:.4f}s (x{result['speedup']})")
+        summary = {'benchmark': args.benchmark, 'results': results}
+    elif args.benchmark == 'math':
+        corpus = build_math_corpus()
+        comparison, results = benchmark_math(corpus, args.repeat or 5)
+        print(f"{comparison['problems']} problems: {comparison['identical']} identical, "
+              f"{comparison['differing']} differ from the regex loop; malformed $...$ output "
+              f"{comparison['malformed_legacy']} -> {comparison['malformed_tokenized']}")
+        for result in results:
+            print(f"{result['count']:>4} texts of {result['texts']:<16} {result['regex_loop_seconds']:.4f}s -> "
+                  f"{result['tokenizer_seconds']:.4f}s (x{result['speedup']})")
+        summary = {'benchmark': args.benchmark, 'comparison': comparison, 'results': results}
+    else:
+        corpus = build_replacement_corpus(args.problems)
+        print(f"Benchmark corpus: {len(corpus)} problems, {sum(map(len, corpus))} characters")
+
+        if args.benchmark == 'classifier':
+            results = benchmark_classifier(corpus, args.repeat or 5)
+            for result in results:
+                print(f"{result['table']:<22} {result['keywords']:>3} keywords, {result['labels']:>2} labels: "
+                      f"{result['sequential_seconds']:.4f}s -> {result['batched_seconds']:.4f}s "
+                      f"(x{result['speedup']})")
+        else:
+            results = benchmark_replacements(corpus, args.repeat or 5)
+            for result in results:
+                print(f"{result['table']:<20} {result['rules']:>3} rules in {result['segments']:>2} segments: "
+                      f"{result['sequential_seconds']:.4f}s -> {result['compiled_seconds']:.4f}s "
+                      f"(x{result['speedup']})")
+        summary = {'benchmark': args.benchmark, 'problems': len(corpus), 'results': results}
+
+    summary['python'] = platform.python_version()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
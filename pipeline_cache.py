@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+On-disk caches for the PDF to JSON pipeline
+===========================================
+
+Extracting text with pdfplumber is the slowest step of the pipeline, but the
+result only depends on the PDF bytes, the page and the extraction settings.
+`PageTextCache` stores each page's text in a small SQLite database keyed by
+exactly that, so reruns after a `pipeline_config.py` change skip pdfplumber.
+The same database holds each PDF's `ProblemIndex`, so runs that select
+problems only read the pages those problems are on.
+
+`FormatCache` memoizes each problem's formatted text under a hash of its raw
+text and a `RuleFingerprint` of the rules that can apply to it, so reruns
+after a rule edit only reformat the affected problems.
+
+Both caches are capped in size; the least recently used entries are evicted
+first.
+"""
+
+import hashlib
+import json
+import sqlite3
+import time
+from pathlib import Path
+
+from pipeline_index import ProblemIndex
+
+CACHE_FILENAME = 'page_text.sqlite3'
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """Content hash of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def settings_fingerprint(settings):
+    """Stable short hash of the extractor settings"""
+    encoded = json.dumps(settings, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()[:16]
+
+
+class PageTextCache:
+    """Persistent, size-capped LRU cache of per-page extracted text"""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(self.directory / CACHE_FILENAME, timeout=30)
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS pages (
+                pdf_hash TEXT NOT NULL,
+                settings TEXT NOT NULL,
+                page_index INTEGER NOT NULL,
+                text TEXT,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (pdf_hash, settings, page_index)
+            );
+            CREATE INDEX IF NOT EXISTS pages_last_used ON pages (last_used);
+            CREATE TABLE IF NOT EXISTS documents (
+                pdf_hash TEXT NOT NULL,
+                settings TEXT NOT NULL,
+                page_count INTEGER NOT NULL,
+                PRIMARY KEY (pdf_hash, settings)
+            );
+            CREATE TABLE IF NOT EXISTS problem_index (
+                pdf_hash TEXT NOT NULL,
+                settings TEXT NOT NULL,
+                page_count INTEGER NOT NULL,
+                entries BLOB NOT NULL,
+                PRIMARY KEY (pdf_hash, settings)
+            );
+        ''')
+        self.hits = 0
+        self.misses = 0
+
+    def close(self):
+        self.db.close()
+
+    def clear(self):
+        """Remove every cached page, document and problem index"""
+        with self.db:
+            self.db.execute('DELETE FROM pages')
+            self.db.execute('DELETE FROM documents')
+            self.db.execute('DELETE FROM problem_index')
+        self.db.execute('VACUUM')
+
+    def get_page_count(self, pdf_hash, settings):
+        """Page count recorded for a fully extracted document, or None"""
+        row = self.db.execute(
+            'SELECT page_count FROM documents WHERE pdf_hash = ? AND settings = ?',
+            (pdf_hash, settings)
+        ).fetchone()
+        return row[0] if row else None
+
+    def get_pages(self, pdf_hash, settings, first=0, last=None):
+        """Map of page index -> cached text (None for pages without text), for pages first..last"""
+        last = (1 << 62) if last is None else last
+        rows = self.db.execute(
+            'SELECT page_index, text FROM pages WHERE pdf_hash = ? AND settings = ? AND page_index BETWEEN ? AND ?',
+            (pdf_hash, settings, first, last)
+        ).fetchall()
+        if rows:
+            with self.db:
+                self.db.execute(
+                    'UPDATE pages SET last_used = ? WHERE pdf_hash = ? AND settings = ? AND page_index BETWEEN ? AND ?',
+                    (time.time(), pdf_hash, settings, first, last)
+                )
+        return dict(rows)
+
+    def get_page_indices(self, pdf_hash, settings):
+        """Indices of a document's cached pages, without reading their text"""
+        return {index for index, in self.db.execute(
+            'SELECT page_index FROM pages WHERE pdf_hash = ? AND settings = ?',
+            (pdf_hash, settings)
+        )}
+
+    def put_pages(self, pdf_hash, settings, page_texts, page_count=None, evict=True):
+        """Store extracted pages ({page_index: text}); record the page count once complete
+
+        With evict=False the cache may exceed its size until the next write
+        that evicts, so cached pages of a document still being read stay put.
+        """
+        now = time.time()
+        with self.db:
+            self.db.executemany(
+                'INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?)',
+                [(pdf_hash, settings, index, text, len(text.encode('utf-8')) if text else 0, now)
+                 for index, text in page_texts.items()]
+            )
+            if page_count is not None:
+                self.db.execute(
+                    'INSERT OR REPLACE INTO documents VALUES (?, ?, ?)',
+                    (pdf_hash, settings, page_count)
+                )
+        if evict:
+            self.evict()
+
+    def get_problem_index(self, pdf_hash, settings):
+        """The ProblemIndex stored for a document, or None"""
+        row = self.db.execute(
+            'SELECT page_count, entries FROM problem_index WHERE pdf_hash = ? AND settings = ?',
+            (pdf_hash, settings)
+        ).fetchone()
+        return ProblemIndex.from_bytes(row[0], row[1]) if row else None
+
+    def put_problem_index(self, pdf_hash, settings, index):
+        with self.db:
+            self.db.execute(
+                'INSERT OR REPLACE INTO problem_index VALUES (?, ?, ?, ?)',
+                (pdf_hash, settings, index.page_count, index.to_bytes())
+            )
+
+    def total_bytes(self):
+        return self.db.execute('SELECT COALESCE(SUM(size), 0) FROM pages').fetchone()[0]
+
+    def evict(self):
+        """Drop least recently used pages until the cache fits in max_bytes"""
+        excess = self.total_bytes() - self.max_bytes
+        if excess <= 0:
+            return 0
+
+        evicted = []
+        for pdf_hash, settings, index, size in self.db.execute(
+                'SELECT pdf_hash, settings, page_index, size FROM pages ORDER BY last_used'):
+            evicted.append((pdf_hash, settings, index))
+            excess -= size
+            if excess <= 0:
+                break
+
+        with self.db:
+            self.db.executemany(
+                'DELETE FROM pages WHERE pdf_hash = ? AND settings = ? AND page_index = ?',
+                evicted
+            )
+            # A document with evicted pages can no longer be served without the PDF
+            self.db.executemany(
+                'DELETE FROM documents WHERE pdf_hash = ? AND settings = ?',
+                {(pdf_hash, settings) for pdf_hash, settings, _ in evicted}
+            )
+        return len(evicted)
+
+
+class CachedPages:
+    """A document's cached pages, read from a PageTextCache a batch at a time
+
+    Membership comes from the page indices alone. Texts are read in ranges of
+    batch_pages as pages are asked for in order, so only one batch is in
+    memory however many pages the document has.
+    """
+
+    def __init__(self, cache, pdf_hash, settings, batch_pages):
+        self.cache = cache
+        self.pdf_hash = pdf_hash
+        self.settings = settings
+        self.batch_pages = batch_pages
+        self.indices = cache.get_page_indices(pdf_hash, settings)
+        self.first = self.last = -1
+        self.batch = {}
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __contains__(self, index):
+        return index in self.indices
+
+    def __getitem__(self, index):
+        if index not in self.indices:
+            raise KeyError(index)
+        if not self.first <= index <= self.last:
+            self.first, self.last = index, index + self.batch_pages - 1
+            self.batch = self.cache.get_pages(self.pdf_hash, self.settings, self.first, self.last)
+        return self.batch[index]
+
+    def get(self, index, default=None):
+        return self[index] if index in self.indices else default
+
+
+class RuleFingerprint:
+    """Fingerprint of the formatting rules that can affect a given problem text
+
+    Literal table entries whose pattern contains a non-ASCII character can only
+    match when that character is in the raw text (or can be produced by some
+    replacement), so they are left out of the fingerprint of problems that
+    lack it. Editing e.g. the '≥' entry therefore only invalidates problems
+    containing '≥'. Everything else (ASCII entries, regex patterns and the
+    formatting code itself) is part of every problem's fingerprint.
+    """
+
+    def __init__(self, literal_tables, global_parts):
+        # Non-ASCII characters that replacements can introduce into any text
+        introducible = {c for _, table in literal_tables for _, new in table for c in new if not c.isascii()}
+
+        self.base = hashlib.sha256(json.dumps(global_parts, sort_keys=True, default=str).encode('utf-8')).digest()
+        self.entries = []
+        for name, table in literal_tables:
+            for old, new in table:
+                required = frozenset(c for c in old if not c.isascii() and c not in introducible)
+                entry = json.dumps([name, old, new]).encode('utf-8')
+                self.entries.append((required, entry))
+        self.always = hashlib.sha256(
+            self.base + b''.join(entry for required, entry in self.entries if not required)
+        ).digest()
+        self.conditional_chars = frozenset(c for required, _ in self.entries for c in required)
+
+    def for_text(self, text):
+        """Digest of the rules that can apply to text"""
+        present = self.conditional_chars.intersection(text)
+        if not present:
+            return self.always.hex()
+        digest = hashlib.sha256(self.base)
+        for required, entry in self.entries:
+            if not required or required <= present:
+                digest.update(entry)
+        return digest.hexdigest()
+
+
+class FormatCache:
+    """Persistent, size-capped LRU memo of formatted problem text
+
+    Keys combine the formatting stage, a hash of the stage's input text and the
+    RuleFingerprint of that text, so reruns only rebuild problems whose input
+    or applicable rules changed.
+    """
+
+    def __init__(self, directory, max_bytes, filename='formatted.sqlite3'):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(self.directory / filename, timeout=30)
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS formatted (
+                key TEXT PRIMARY KEY,
+                output TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS formatted_last_used ON formatted (last_used);
+        ''')
+        self.pending = {}
+        self.used = []
+        self.reused = 0
+        self.rebuilt = 0
+
+    @staticmethod
+    def make_key(stage, text, fingerprint):
+        digest = hashlib.sha256(f"{stage}\0{fingerprint}\0".encode('utf-8'))
+        digest.update(text.encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Cached output for key, or None"""
+        if key in self.pending:
+            return self.pending[key]
+        row = self.db.execute('SELECT output FROM formatted WHERE key = ?', (key,)).fetchone()
+        if row:
+            self.used.append(key)
+            return row[0]
+        return None
+
+    def put(self, key, output):
+        self.pending[key] = output
+        if len(self.pending) >= 256:
+            self.flush()
+
+    def memoize(self, stage, text, fingerprint, func):
+        """Return func(text), reusing the cached result when the key matches"""
+        key = self.make_key(stage, text, fingerprint)
+        output = self.get(key)
+        if output is not None:
+            self.reused += 1
+            return output
+        self.rebuilt += 1
+        output = func(text)
+        self.put(key, output)
+        return output
+
+    def flush(self):
+        """Write pending entries, refresh recency of reused ones and evict"""
+        now = time.time()
+        with self.db:
+            self.db.executemany(
+                'INSERT OR REPLACE INTO formatted VALUES (?, ?, ?, ?)',
+                [(key, output, len(output.encode('utf-8')), now) for key, output in self.pending.items()]
+            )
+            self.db.executemany('UPDATE formatted SET last_used = ? WHERE key = ?',
+                                [(now, key) for key in self.used])
+        self.pending = {}
+        self.used = []
+        self.evict()
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes"""
+        excess = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM formatted').fetchone()[0] - self.max_bytes
+        if excess <= 0:
+            return 0
+
+        evicted = []
+        for key, size in self.db.execute('SELECT key, size FROM formatted ORDER BY last_used'):
+            evicted.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        with self.db:
+            self.db.executemany('DELETE FROM formatted WHERE key = ?', evicted)
+        return len(evicted)
+
+    def clear(self):
+        self.pending = {}
+        self.used = []
+        with self.db:
+            self.db.execute('DELETE FROM formatted')
+        self.db.execute('VACUUM')
+
+    def close(self):
+        self.flush()
+        self.db.close()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Batched keyword classifier for problem category and difficulty
+==============================================================
+
+`KeywordClassifier` scores every label of a keyword table (CATEGORY_KEYWORDS
+or COMPLEXITY_INDICATORS) for a whole batch of problems at once:
+
+1. the keywords are compiled into one trie-shaped regex that finds every
+   keyword starting at a word boundary (so 'integers' counts for 'integer',
+   but 'string' no longer counts for 'ring')
+2. a block of problems is joined and scanned in a single pass; the hits
+   form a sparse problem x keyword count matrix, which is multiplied by the
+   keyword x label incidence matrix with NumPy
+3. the best-scoring label wins; its share of all keyword hits is returned
+   as the confidence
+
+Ties go to the label listed first in the table. NumPy is optional: without
+it the same scores are computed in pure Python.
+"""
+
+import bisect
+import re
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Rows scored per block; bounds the joined text and the dense count matrix
+BLOCK_SIZE = 8192
+
+# Joins the texts of a block; no keyword can match across it
+SEPARATOR = '\0'
+
+
+def _trie_pattern(words):
+    """Regex alternation of words factored into a trie
+
+    Python's regex engine tries alternatives one by one, so sharing prefixes
+    ('integral', 'integer', 'integration') keeps the work per position small.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:%s)' % '|'.join(branches)
+        return '(?:%s)?' % body if '' in node else body
+
+    return build(trie)
+
+
+class KeywordClassifier:
+    """Score-based classifier over a {label: [keywords]} table"""
+
+    def __init__(self, keyword_table):
+        self.labels = list(keyword_table)
+        self.keywords = list(dict.fromkeys(
+            keyword.lower() for keywords in keyword_table.values() for keyword in keywords
+        ))
+        keyword_index = {keyword: i for i, keyword in enumerate(self.keywords)}
+
+        # Keyword -> labels incidence (a keyword may belong to several labels)
+        self.keyword_labels = [[] for _ in self.keywords]
+        for label_index, keywords in enumerate(keyword_table.values()):
+            for keyword in dict.fromkeys(k.lower() for k in keywords):
+                self.keyword_labels[keyword_index[keyword]].append(label_index)
+
+        # One pass finds the longest keyword at every word start; shorter
+        # keywords that are prefixes of it are credited too. The pattern
+        # starts with a character class so the regex engine can skip ahead
+        # to candidate characters; the lookbehinds then check the word start
+        # and match the keyword trie from that character.
+        first_chars = ''.join(sorted({re.escape(k[0]) for k in self.keywords}))
+        self.pattern = re.compile(r'[%s](?<!\w.)(?<=(?=(%s)).)' % (first_chars, _trie_pattern(self.keywords)))
+        self.prefixes = {
+            keyword: [keyword_index[other] for other in self.keywords if keyword.startswith(other)]
+            for keyword in self.keywords
+        }
+
+        if np is not None:
+            self.incidence = np.zeros((len(self.keywords), len(self.labels)))
+            for keyword_i, label_indices in enumerate(self.keyword_labels):
+                self.incidence[keyword_i, label_indices] = 1.0
+
+    def keyword_hits(self, texts):
+        """Sparse keyword counts: parallel lists of (row, keyword index) pairs
+
+        The texts are lowercased, joined and scanned in one pass; match
+        positions are mapped back to rows through the text offsets.
+        Lowercasing can change a text's length ('İ' becomes two characters),
+        so the offsets are taken from the lowercased texts.
+        """
+        texts = [text.lower() for text in texts]
+        offsets = []
+        position = 0
+        for text in texts:
+            offsets.append(position)
+            position += len(text) + len(SEPARATOR)
+        joined = SEPARATOR.join(texts)
+
+        rows = []
+        columns = []
+        prefixes = self.prefixes
+        row = 0
+        next_offset = offsets[1] if len(offsets) > 1 else position
+        for match in self.pattern.finditer(joined):
+            start = match.start()
+            if start >= next_offset:
+                row = bisect.bisect_right(offsets, start) - 1
+                next_offset = offsets[row + 1] if row + 1 < len(offsets) else position
+            for keyword_i in prefixes[match.group(1)]:
+                rows.append(row)
+                columns.append(keyword_i)
+        return rows, columns
+
+    def score(self, texts):
+        """Label scores for each text, as a list of rows (or a NumPy array)"""
+        texts = list(texts)
+
+        if np is None:
+            scores = [[0.0] * len(self.labels) for _ in texts]
+            for start in range(0, len(texts), BLOCK_SIZE):
+                rows, columns = self.keyword_hits(texts[start:start + BLOCK_SIZE])
+                for row, keyword_i in zip(rows, columns):
+                    for label_i in self.keyword_labels[keyword_i]:
+                        scores[start + row][label_i] += 1.0
+            return scores
+
+        scores = np.zeros((len(texts), len(self.labels)))
+        keyword_count = len(self.keywords)
+        for start in range(0, len(texts), BLOCK_SIZE):
+            block = texts[start:start + BLOCK_SIZE]
+            rows, columns = self.keyword_hits(block)
+            counts = np.bincount(
+                np.asarray(rows, dtype=np.int64) * keyword_count + np.asarray(columns, dtype=np.int64),
+                minlength=len(block) * keyword_count
+            ).reshape(len(block), keyword_count)
+            scores[start:start + len(block)] = counts @ self.incidence
+        return scores
+
+    def classify(self, texts, defaults):
+        """Best label and confidence for each text
+
+        `defaults` gives the label for each text without any keyword hit
+        (confidence 0.0). Confidence is the winning label's share of all
+        label scores for that text.
+        """
+        scores = self.score(texts)
+        results = []
+
+        if np is None:
+            for row, default in zip(scores, defaults):
+                total = sum(row)
+                if not total:
+                    results.append((default, 0.0))
+                    continue
+                best = max(range(len(row)), key=lambda i: (row[i], -i))
+                results.append((self.labels[best], round(row[best] / total, 3)))
+            return results
+
+        if len(scores) == 0:
+            return results
+        best = scores.argmax(axis=1)
+        totals = scores.sum(axis=1)
+        best_scores = scores[np.arange(len(scores)), best]
+        for label_i, best_score, total, default in zip(best.tolist(), best_scores.tolist(),
+                                                       totals.tolist(), defaults):
+            if not total:
+                results.append((default, 0.0))
+            else:
+                results.append((self.labels[label_i], round(best_score / total, 3)))
+        return results
@@ -122,6 +122,60 @@ SYMBOL_REPLACEMENTS = {
     'cid:14': '+',
 }
 
+# Notation fixes applied before SYMBOL_REPLACEMENTS (see fix_mathematical_notation)
+NOTATION_FIXES = {
+    # Integral and math symbols
+    '\\int \\$1': '\\int_0^1',
+    '\\int \\$': '\\int_',
+    'sin p': '\\sin \\pi',
+    'cos p': '\\cos \\pi',
+    'tan p': '\\tan \\pi',
+    'si p': '\\sin \\pi',
+    'co p': '\\cos \\pi',
+    'lo ': '\\log ',
+    'ln ': '\\ln ',
+    
+    # Greek letters and special symbols
+    ' p ': ' \\pi ',
+    ' p$': ' \\pi',
+    '$p': '\\pi',
+    'p$': '\\pi',
+    'p)': '\\pi)',
+    '(p': '(\\pi',
+    
+    # Fractions and expressions
+    'frac{': '\\frac{',
+    'sqrt{': '\\sqrt{',
+    'sum_{': '\\sum_{',
+    'prod_{': '\\prod_{',
+    'lim_{': '\\lim_{',
+    
+    # Comparison operators
+    ' £ ': ' \\leq ',
+    ' ³ ': ' \\geq ',
+    ' ¢ ': ' \\neq ',
+    '£': '\\leq',
+    '³': '\\geq',
+    '¢': '\\neq',
+    
+    # Common corrupted expressions
+    'Æ\\mathbb{R}': '\\to \\mathbb{R}',
+    'ı': 'i',
+    '\\p': ' \\neq 0',
+    
+    # Specific fixes for problem content
+    'cid:11': '',
+    'cid:12': '',
+    'cid:32': ' = ',
+    'cid:94': '',
+    'cid:96': '',
+    'cid:135': '',
+    'cid:149': '\\geq',
+    'cid:144': '',
+    'cid:199': '',
+    'cid:14': '+',
+}
+
 # Category classification keywords
 CATEGORY_KEYWORDS = {
     "Complex Analysis": [
@@ -242,6 +296,96 @@ CHOICE_PATTERNS = {
     'roman': r'\([ivx]+\)',    # (i), (ii), (iii), etc.
 }
 
+# Keyword arguments passed to pdfplumber's page.extract_text()
+PDF_EXTRACT_SETTINGS = {}
+
+# Bounded-memory extraction (--low-memory, see pipeline_memory.py)
+LOW_MEMORY_SETTINGS = {
+    'window_pages': 16,            # Pages read per opening of the PDF
+    'max_rss_mb': 512              # Memory ceiling per process; above it the window is halved
+}
+
+# On-disk caches of extracted page text and formatted problems (see pipeline_cache.py)
+CACHE_SETTINGS = {
+    'enabled': True,
+    'directory': '.pipeline_cache',
+    'max_size_mb': 256,            # Page text cache
+    'write_batch_pages': 32,       # Pages written or read per cache transaction
+    'format_max_size_mb': 64       # Formatted problem cache
+}
+
+# Figures rendered with --figures (see pipeline_figures.py)
+FIGURE_SETTINGS = {
+    'directory': 'src/assets/images/figures',  # Default output directory of the images
+    'resolution': 150,             # DPI figures are rendered at
+    'min_resolution': 72,          # Lowest DPI figures are downscaled to in order to fit max_kb
+    'max_kb': 150,                 # Size budget of each image
+    'max_colors': 256,             # Palette size of the PNGs (0 keeps full color)
+    'min_size': 36,                # Smallest figure width and height, in points
+    'gap': 12,                     # Graphics closer than this (points) belong to one figure
+    'padding': 6                   # Margin around each figure, in points
+}
+
+# Math pre-rendered with --katex or pipeline_katex.py
+KATEX_SETTINGS = {
+    'node': 'node',                # Node.js executable; katex is loaded from the app's node_modules
+    'options': {},                 # katex.renderToString options (throwOnError is always on)
+    'batch_size': 500,             # Spans sent to the renderer at once
+    'problems_per_batch': 64,      # Problems collected per batch when streaming
+    'cache_max_size_mb': 64        # Rendered span cache
+}
+
+# Hints and solutions precomputed by pipeline_solutions.py
+SOLUTION_SETTINGS = {
+    'endpoint': 'https://api.perplexity.ai/chat/completions',
+    'model': 'sonar',
+    'api_key_env': ['PERPLEXITY_API_KEY', 'VITE_PERPLEXITY_API_KEY'],  # First one set is used
+    'concurrency': 4,              # Requests in flight at once
+    'retries': 5,                  # Retries of a rate-limited or failed request
+    'backoff_seconds': 1.0,        # Delay before the first retry, doubled for each next one
+    'max_backoff_seconds': 60.0,
+    'timeout_seconds': 60,
+    'temperature': 0.3,
+    'max_tokens': {'hint': 200, 'solution': 1000}
+}
+
+# Watch mode (--watch, see pipeline_watch.py)
+WATCH_SETTINGS = {
+    'poll_interval': 0.25,         # Seconds between checks of the PDF and this file
+    'debounce': 0.1                # Quiet time after a change before the pipeline re-runs
+}
+
+# Merging with an existing problem set (see pipeline_merge.py)
+MERGE_SETTINGS = {
+    'policy': 'keep-existing',     # keep-existing, overwrite or keep-both
+    'preserve_fields': ['correctAnswer', 'choices', 'image', 'imageAlt']  # Hand-edited fields kept on overwrite
+}
+
+# Near-duplicate detection by the dedup command (see pipeline_dedup.py)
+DEDUP_SETTINGS = {
+    'shingle_size': 5,             # Characters per shingle of the normalized stem and choices
+    'num_perm': 120,               # MinHash signature length
+    'bands': 20,                   # LSH bands (num_perm / bands values each)
+    'threshold': 0.8,              # Jaccard similarity at which two problems are duplicates
+    'max_bucket': 64               # Candidates kept per LSH bucket
+}
+
+# Keyword search index written next to the output (see pipeline_search.py)
+SEARCH_SETTINGS = {
+    'enabled': True,
+    'fields': ['problem', 'category'],  # Problem fields whose text is indexed
+    'min_length': 2,               # Shorter words (single-letter variables) are not indexed
+    'stopwords': ['a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'if', 'in', 'is', 'it',
+                  'of', 'on', 'or', 'such', 'that', 'the', 'then', 'this', 'to', 'which', 'with'],
+    'ignored_commands': ['left', 'right', 'text', 'mathrm', 'displaystyle', 'quad', 'qquad', 'big', 'bigg']
+}
+
+# Output written by the pipeline (see pipeline_writer.py)
+OUTPUT_SETTINGS = {
+    'format': 'json',              # json, ndjson, shards (a directory of JSON arrays) or bundle (per-category shards and a manifest)
+    'shard_max_kb': 512            # Size cap of each shard
+}
+
 # Export settings
 EXPORT_SETTINGS = {
     'indent': 2,
@@ -263,7 +407,8 @@ VALIDATION_RULES = {
 LOGGING_CONFIG = {
     'level': 'INFO',
     'format': '%(asctime)s - %(levelname)s - %(message)s',
-    'show_progress': True
+    'show_progress': True,
+    'progress_interval': 2.0       # Seconds between progress lines
 }
 
 def get_difficulty_for_problem_number(problem_num):
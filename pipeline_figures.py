@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Figure detection and rendering for the PDF to JSON pipeline
+===========================================================
+
+Graphs and diagrams are drawn in the PDF as rects, curves, lines and
+embedded images, none of which survive text extraction. This module finds
+them with pdfplumber and renders each one as a cropped PNG:
+
+- Graphic objects closer than `gap` points are clustered into figures;
+  clusters smaller than `min_size` (fraction bars, brackets) are ignored,
+  as are page backgrounds and the full-width rules between problems
+- Each figure belongs to a problem: the last problem starting above it in
+  the same box between rules, or else the first one below it (figures can
+  precede their problem's text, as in "the flowchart above"). Figures at
+  the top of a page continue the previous page's problem unless that
+  problem's box was closed by a rule. Pages without problem lines
+  (instructions, answer keys) are skipped
+- Words beside a figure, within `gap` (choice labels), are part of it
+- Figures of one problem on one page are rendered together, padded by
+  `padding` points, and downscaled until the PNG fits in `max_kb`
+
+Images are named by a hash of the PDF content, the page, the crop box and
+the render settings, so reruns only render figures that are not on disk
+yet. Pages are processed in worker processes, each opening its own handle
+on the PDF like the text extraction workers.
+"""
+
+import hashlib
+import io
+import json
+import os
+import tempfile
+from collections import namedtuple
+from itertools import chain
+from pathlib import Path
+
+import pdfplumber
+from PIL import Image
+
+from pipeline_index import PROBLEM_START
+from pipeline_memory import release_page
+
+FIGURE_PREFIX = 'figure-'
+
+# Settings that change the rendered image, and so its file name
+RENDER_SETTINGS = ('resolution', 'min_resolution', 'max_kb', 'max_colors', 'padding')
+
+# A rendered figure; problem is None for a figure at the top of a page, before any rule
+Figure = namedtuple('Figure', 'problem page path bytes cached')
+
+# The figures of one page, with its first and last problem and whether a rule closes the last one
+PageFigures = namedtuple('PageFigures', 'first last closed figures')
+
+
+def union_box(a, b):
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+
+def boxes_near(a, b, gap):
+    return a[0] - gap <= b[2] and b[0] - gap <= a[2] and a[1] - gap <= b[3] and b[1] - gap <= a[3]
+
+
+def page_graphics(page):
+    """(graphic boxes, tops of the full-width rules) of a page, clipped to the page
+
+    Rules in the top and bottom tenth of the page belong to the header and
+    footer and do not separate problems.
+    """
+    x0, top, x1, bottom = page.bbox
+    width, height = x1 - x0, bottom - top
+    boxes = []
+    rules = []
+    for obj in chain(page.rects, page.curves, page.lines, page.images):
+        box = (max(obj['x0'], x0), max(obj['top'], top), min(obj['x1'], x1), min(obj['bottom'], bottom))
+        if box[0] > box[2] or box[1] > box[3]:
+            continue
+        if box[2] - box[0] >= 0.8 * width:
+            # Rules between problems and page backgrounds are not figures
+            if box[3] - box[1] < 3:
+                if top + 0.1 * height < box[1] < bottom - 0.1 * height:
+                    rules.append(box[1])
+                continue
+            if box[3] - box[1] >= 0.8 * height:
+                continue
+        boxes.append(box)
+    return boxes, sorted(rules)
+
+
+def cluster_boxes(boxes, gap):
+    """Bounding boxes of the groups of boxes that are within gap of each other"""
+    clusters = []
+    for box in sorted(boxes, key=lambda box: box[1]):
+        merged = True
+        while merged:
+            merged = False
+            kept = []
+            for cluster in clusters:
+                if boxes_near(cluster, box, gap):
+                    box = union_box(cluster, box)
+                    merged = True
+                else:
+                    kept.append(cluster)
+            clusters = kept
+        clusters.append(box)
+    return clusters
+
+
+def grow_box(box, words, gap):
+    """box grown to take in the words beside it, within gap to its left or right
+
+    Words above or below are left out: they are usually the problem text.
+    """
+    grown = box
+    for word in words:
+        if word[1] < box[3] and box[1] < word[3] and boxes_near(box, word, gap):
+            grown = union_box(grown, word)
+    return grown
+
+
+def figure_owner(starts, rules, box):
+    """Problem number a figure belongs to, or None for a figure above the page's first rule and problem
+
+    starts are the (number, top) problem lines of the page and rules the
+    tops of its full-width rules, both in top-to-bottom order.
+    """
+    center = (box[1] + box[3]) / 2
+    above = max((rule for rule in rules if rule <= center), default=None)
+    below = min((rule for rule in rules if rule > center), default=None)
+    in_box = [(number, top) for number, top in starts
+              if (above is None or top >= above) and (below is None or top < below)]
+    preceding = [number for number, top in in_box if top <= center]
+    if preceding:
+        return preceding[-1]
+    if in_box and above is not None:
+        return in_box[0][0]
+    if in_box:
+        return None
+    preceding = [number for number, top in starts if top <= center]
+    return preceding[-1] if preceding else None
+
+
+def page_problem_starts(page, start_problem=1):
+    """(number, top) of the lines of a page starting a problem, from the top down"""
+    starts = []
+    for line in page.extract_text_lines():
+        match = PROBLEM_START.match(line['text'])
+        if match and int(match.group(1)) >= start_problem:
+            starts.append((int(match.group(1)), line['top']))
+    return sorted(starts, key=lambda start: start[1])
+
+
+def detect_page_figures(page, starts, settings):
+    """({problem number or None: crop box}, whether a rule closes the last problem) of a page"""
+    if not starts:
+        return {}, False
+
+    boxes, rules = page_graphics(page)
+    words = None
+    closed = bool(rules) and rules[-1] > starts[-1][1]
+    figures = {}
+    for box in cluster_boxes(boxes, settings['gap']):
+        if box[2] - box[0] < settings['min_size'] or box[3] - box[1] < settings['min_size']:
+            continue
+        if words is None:
+            words = [(word['x0'], word['top'], word['x1'], word['bottom']) for word in page.extract_words()]
+        box = grow_box(box, words, settings['gap'])
+        owner = figure_owner(starts, rules, box)
+        figures[owner] = union_box(figures[owner], box) if owner in figures else box
+
+    padding = settings['padding']
+    x0, top, x1, bottom = page.bbox
+    return {owner: (max(box[0] - padding, x0), max(box[1] - padding, top),
+                    min(box[2] + padding, x1), min(box[3] + padding, bottom))
+            for owner, box in figures.items()}, closed
+
+
+def figure_name(pdf_hash, page_index, box, settings):
+    """File name of a figure: a hash of everything its image depends on"""
+    key = json.dumps([pdf_hash, page_index, [round(v, 2) for v in box],
+                      {name: settings[name] for name in RENDER_SETTINGS}])
+    return f"{FIGURE_PREFIX}{hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]}.png"
+
+
+def encode_png(image, max_colors):
+    buffer = io.BytesIO()
+    if max_colors:
+        image = image.convert('RGB').quantize(colors=max_colors)
+    image.save(buffer, 'PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def render_figure(page, box, settings):
+    """PNG bytes of a page region, downscaled until they fit in max_kb
+
+    Downscaling stops at min_resolution; the smallest encoding tried is
+    returned (antialiasing can make a smaller palette image larger).
+    """
+    resolution = settings['resolution']
+    image = page.crop(box).to_image(resolution=resolution).original
+    max_bytes = settings['max_kb'] * 1024
+    data = smallest = encode_png(image, settings['max_colors'])
+    while len(data) > max_bytes and resolution > settings['min_resolution']:
+        # Size scales roughly with the pixel count
+        resolution = max(settings['min_resolution'], resolution * 0.9 * (max_bytes / len(data)) ** 0.5)
+        scale = resolution / settings['resolution']
+        size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        data = encode_png(image.resize(size, Image.LANCZOS), settings['max_colors'])
+        smallest = min(smallest, data, key=len)
+    return smallest
+
+
+def write_atomic(path, data):
+    """Write data to path through a temporary file and a rename"""
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix='.' + path.name, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        # mkstemp creates the file private; give it the default mode
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(tmp_path, 0o666 & ~umask)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def render_page_figures(pdf_path, pdf_hash, start, end, directory, settings, start_problem=1, end_problem=None):
+    """Detect and render the figures of pages [start, end) into directory
+
+    Runs inside worker processes, so each call opens its own handle on the
+    PDF. Figures already on disk are not rendered again. Returns the
+    PageFigures of every page.
+    """
+    directory = Path(directory)
+    pages = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for page_index, page in enumerate(pdf.pages[start:end], start):
+            starts = page_problem_starts(page, start_problem)
+            detected, closed = detect_page_figures(page, starts, settings)
+            figures = []
+            pages.append(PageFigures(starts[0][0] if starts else None, starts[-1][0] if starts else None,
+                                     closed, figures))
+            for owner, box in sorted(detected.items(), key=lambda item: item[1][1]):
+                if owner is not None and end_problem is not None and owner > end_problem:
+                    continue
+                path = directory / figure_name(pdf_hash, page_index, box, settings)
+                if path.exists():
+                    figures.append(Figure(owner, page_index, str(path), path.stat().st_size, True))
+                    continue
+                data = render_figure(page, box, settings)
+                write_atomic(path, data)
+                figures.append(Figure(owner, page_index, str(path), len(data), False))
+            release_page(page)
+    return pages
+
+
+def assign_figures(pages, start_problem=1, end_problem=None):
+    """{problem number: [Figure, ...]} from the PageFigures of every page in order
+
+    A figure at the top of a page goes to the problem started on an earlier
+    page if its box is still open, and otherwise to the page's first
+    problem; it is dropped if there is no earlier problem.
+    """
+    assigned = {}
+    current = None
+    closed = False
+    for page in pages:
+        for figure in page.figures:
+            owner = figure.problem
+            if owner is None:
+                owner = page.first if closed else current
+            if owner is None or owner < start_problem or (end_problem is not None and owner > end_problem):
+                continue
+            assigned.setdefault(owner, []).append(figure._replace(problem=owner))
+        if page.last is not None:
+            current, closed = page.last, page.closed
+    return assigned
+
+
+def figure_url(path):
+    """Path recorded on a problem: root-relative for relative paths, like the hand-made entries"""
+    path = Path(path)
+    return path.as_posix() if path.is_absolute() else '/' + path.as_posix()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Problem boundary index for the PDF to JSON pipeline
+===================================================
+
+A problem starts at a line beginning with its number ("18. ..."). These
+lines are found with one multiline regex pass over the text instead of a
+`re.match` per line.
+
+`ProblemIndex` records, for every such line of a PDF, the problem number,
+the page and the offset within that page's text. The index is persisted
+with the page cache. A later run with `--start-problem` or `--problems`
+then loads only the pages between the first selected problem and the end
+of the last one, and slices the problems out of those pages.
+
+Offsets refer to the text the pipeline builds from the pages: every
+non-empty page followed by a blank line, so each page starts at a line
+start.
+"""
+
+import argparse
+import re
+from array import array
+
+# The line of a problem's first line: its number, a period and the text
+PROBLEM_START = re.compile(r'^[^\S\n]*(\d+)\.', re.MULTILINE)
+
+# Separator the pipeline appends to each non-empty page's text
+PAGE_SEPARATOR = '\n\n'
+
+
+def problem_starts(text):
+    """(problem number, offset) of every line starting a problem in text"""
+    return [(int(match.group(1)), match.start()) for match in PROBLEM_START.finditer(text)]
+
+
+def select_boundaries(numbers, start_problem=1, end_problem=None):
+    """Positions (into numbers) of the problem boundaries and of the problems kept
+
+    Lines numbered below start_problem are not boundaries, as in a scan
+    starting at start_problem. Problems above end_problem still end the
+    problem before them but are not kept.
+    """
+    boundaries = [i for i, number in enumerate(numbers) if number >= start_problem]
+    if end_problem is None:
+        return boundaries, boundaries
+    return boundaries, [i for i in boundaries if numbers[i] <= end_problem]
+
+
+def slice_problems(text, starts, start_problem=1, end_problem=None):
+    """(problem number, problem text) pairs of text given its problem_starts
+
+    A problem runs from its line to the line before the next boundary, or to
+    the end of text.
+    """
+    boundaries, kept = select_boundaries([number for number, _ in starts], start_problem, end_problem)
+    following = dict(zip(boundaries, boundaries[1:]))
+    problems = []
+    for i in kept:
+        number, start = starts[i]
+        end = starts[following[i]][1] - 1 if i in following else len(text)
+        problems.append((number, text[start:end]))
+    return problems
+
+
+def parse_problem_range(value):
+    """argparse type for --problems: 'N', 'N-M' or 'N-'; returns (start, end or None)"""
+    match = re.fullmatch(r'\s*(\d+)\s*(?:(-)\s*(\d+)?)?\s*', value)
+    if not match:
+        raise argparse.ArgumentTypeError(f"invalid problem range '{value}' (expected N, N-M or N-)")
+    start = int(match.group(1))
+    if match.group(3) is not None:
+        end = int(match.group(3))
+    else:
+        end = None if match.group(2) else start
+    if end is not None and end < start:
+        raise argparse.ArgumentTypeError(f"invalid problem range '{value}' (end before start)")
+    return start, end
+
+
+class ProblemIndex:
+    """Problem number, page and page offset of every problem-starting line of one PDF"""
+
+    def __init__(self, page_count=0, entries=None):
+        self.page_count = page_count
+        # Flat (number, page, offset) triples in text order
+        self.entries = entries if entries is not None else array('q')
+
+    def add_page(self, page_index, page_text):
+        """Index one page's text; pages must be added in order"""
+        self.page_count = page_index + 1
+        if page_text:
+            for number, offset in problem_starts(page_text):
+                self.entries.extend((number, page_index, offset))
+
+    def __len__(self):
+        return len(self.entries) // 3
+
+    def to_bytes(self):
+        return self.entries.tobytes()
+
+    @classmethod
+    def from_bytes(cls, page_count, data):
+        entries = array('q')
+        entries.frombytes(data)
+        return cls(page_count, entries)
+
+    def page_range(self, start_problem=1, end_problem=None):
+        """(first, last) page holding the selected problems, or None if none are selected"""
+        entries = self.entries
+        numbers = entries[0::3]
+        boundaries, kept = select_boundaries(numbers, start_problem, end_problem)
+        if not kept:
+            return None
+        first = entries[kept[0] * 3 + 1]
+        after = boundaries.index(kept[-1]) + 1
+        last = entries[boundaries[after] * 3 + 1] if after < len(boundaries) else self.page_count - 1
+        return first, last
+
+    def slice_pages(self, page_texts, first_page, start_problem=1, end_problem=None):
+        """(problem number, problem text) pairs cut from the pages starting at first_page
+
+        page_texts are the texts of pages first_page to the last page of
+        page_range(); only those pages are joined, and the pairs equal the
+        ones found in the text of the whole PDF.
+        """
+        bases = {}
+        chunks = []
+        length = 0
+        for page_index, page_text in enumerate(page_texts, first_page):
+            if page_text:
+                bases[page_index] = length
+                chunks.append(page_text + PAGE_SEPARATOR)
+                length += len(page_text) + len(PAGE_SEPARATOR)
+        text = ''.join(chunks)
+
+        entries = self.entries
+        starts = [(entries[i], bases[entries[i + 1]] + entries[i + 2])
+                  for i in range(0, len(entries), 3) if entries[i + 1] in bases]
+        return slice_problems(text, starts, start_problem, end_problem)
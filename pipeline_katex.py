@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Build-time KaTeX rendering for the PDF to JSON pipeline
+=======================================================
+
+The app renders every `$...$` span with KaTeX in the browser, on every
+device and every view, although the corpus is static. This stage renders
+each span once at build time with the app's own `katex` package (from
+node_modules, run by Node.js) and attaches the markup to the problem:
+
+    "katex": {"\\int_0^1 f(x) dx": "<span class=\\"katex\\">...</span>", ...}
+
+The app looks spans up in this map and only falls back to rendering in
+the browser for spans missing from it.
+
+- Spans are found like the app finds them: the text gets the same cleanups
+  as in renderMathText, `$$`, `\\(...\\)` and `\\[...\\]` count as `$`, the
+  math between each pair of `$` is trimmed, and solutions are split by line
+- One Node.js process renders the spans in batches of `batch_size`
+- Results are memoized in `.pipeline_cache/katex.sqlite3` under a hash of
+  the span, the KaTeX version and the options, so unchanged spans are
+  never rendered again
+- Spans KaTeX rejects are logged as errors with their problem and left out
+  of the map; the app then shows them through its own fallback
+
+Usage:
+    python3 pipeline_katex.py src/data/mathProblems.json
+"""
+
+import argparse
+import json
+import re
+import subprocess
+import tempfile
+from pathlib import Path
+
+from pipeline_cache import FormatCache, settings_fingerprint
+from pipeline_config import CACHE_SETTINGS, EXPORT_SETTINGS, KATEX_SETTINGS, LOGGING_CONFIG, OUTPUT_SETTINGS
+from pipeline_logging import configure_logging, logger
+from pipeline_writer import detect_format, iter_problems, write_problems
+
+# LaTeX commands outside `$` that the app wraps in `$` before rendering
+APP_COMMAND = re.compile(r'\\([a-zA-Z]+)\s*\{([^}]*)\}')
+
+# Renderer run with `node -e`: reports the KaTeX version, then answers each
+# line of JSON spans with a line of {"html"} or {"error"} results
+KATEX_SCRIPT = r'''
+const katex = require('katex');
+const readline = require('readline');
+const options = Object.assign({}, JSON.parse(process.argv[1]), {throwOnError: true});
+process.stdout.write(JSON.stringify({version: katex.version}) + '\n');
+readline.createInterface({input: process.stdin}).on('line', line => {
+  const results = JSON.parse(line).map(tex => {
+    try {
+      return {html: katex.renderToString(tex, options)};
+    } catch (e) {
+      return {error: String(e && e.message || e)};
+    }
+  });
+  process.stdout.write(JSON.stringify(results) + '\n');
+});
+'''
+
+
+class KatexUnavailable(RuntimeError):
+    """Node.js or the katex package could not be started"""
+
+
+# Coupled to renderMathText in src/components/MathProblem.jsx: the spans
+# found here are the keys the app looks its math up by, so an edit to the
+# steps there must be made here too (tests/test_katex.py compares the two)
+def app_math_text(text):
+    """text after the cleanups renderMathText in MathProblem.jsx applies before splitting on `$`"""
+    text = text.replace('Then\\int', 'Then $\\int$').replace('constant.Then', 'constant. Then')
+    text = re.sub(r'([a-zA-Z])\\int', r'\1 $\\int$', text)
+    text = re.sub(r'([a-z])([A-Z])', r'\1 \2', text)
+    text = re.sub(r'([a-z])(\d)', r'\1 \2', text)
+    text = re.sub(r'(\d)([a-z])', r'\1 \2', text)
+    text = re.sub(r'\(([A-E])\)\s*', r'\n\n(\1) ', text)
+    text = re.sub(r'[ \t]+', ' ', text)
+    text = re.sub(r'\n\s+', '\n', text).strip()
+    for delimiter in ('\\(', '\\)', '\\[', '\\]', '$$'):
+        text = text.replace(delimiter, '$')
+    parts = text.split('$')
+    # Commands left outside math become math of their own
+    parts[::2] = [APP_COMMAND.sub(r'$\\\1{\2}$', part) for part in parts[::2]]
+    return '$'.join(parts)
+
+
+def math_spans(text):
+    """The trimmed math of every closed `$...$` span of text, as the app splits it"""
+    if not text or not isinstance(text, str):
+        return []
+    parts = app_math_text(text).split('$')
+    if len(parts) % 2 == 0:
+        # The last $ is never closed, so what follows it is text
+        parts.pop()
+    return [math for math in (part.strip() for part in parts[1::2]) if math]
+
+
+def problem_spans(problem):
+    """Math spans of a problem's fields; the app renders a solution line by line, so no span crosses a line"""
+    spans = math_spans(problem.get('problem')) + math_spans(problem.get('hint'))
+    solution = problem.get('solution')
+    if solution and isinstance(solution, str):
+        for line in solution.split('\n'):
+            spans += math_spans(line.strip())
+    return spans
+
+
+class KatexRenderer:
+    """Renders math spans with the app's KaTeX in one Node.js process, memoized in a FormatCache"""
+
+    def __init__(self, cache=None, settings=KATEX_SETTINGS, cwd=None):
+        self.cache = cache
+        self.settings = settings
+        # node_modules of the app, next to package.json
+        self.cwd = cwd or Path(__file__).resolve().parent
+        self.process = None
+        self.fingerprint = None
+        self.rendered = 0
+        self.reused = 0
+        self.failed = 0
+
+    def start(self):
+        """Start the renderer; raises KatexUnavailable if Node.js or katex is missing"""
+        self.stderr = tempfile.TemporaryFile()
+        options = json.dumps(self.settings.get('options', {}))
+        try:
+            self.process = subprocess.Popen(
+                [self.settings['node'], '-e', KATEX_SCRIPT, options], cwd=self.cwd,
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=self.stderr,
+                text=True, encoding='utf-8'
+            )
+        except OSError as e:
+            raise KatexUnavailable(f"cannot run {self.settings['node']}: {e}")
+        line = self.process.stdout.readline()
+        if not line:
+            self.process.wait()
+            self.stderr.seek(0)
+            lines = self.stderr.read().decode('utf-8', 'replace').strip().splitlines()
+            # Node prints the failing source line before the error itself
+            errors = [line for line in lines if 'Error' in line]
+            raise KatexUnavailable((errors or lines or ['renderer exited'])[0])
+        version = json.loads(line)['version']
+        self.fingerprint = settings_fingerprint({'katex': version, 'options': self.settings.get('options', {})})
+        logger.info("KaTeX %s renderer started", version)
+
+    def close(self):
+        if self.process is not None:
+            self.process.stdin.close()
+            self.process.wait()
+            self.process = None
+            self.stderr.close()
+        if self.cache is not None:
+            self.cache.flush()
+
+    def render_batch(self, spans):
+        """Results ({'html'} or {'error'}) of spans, rendered by the Node.js process"""
+        self.process.stdin.write(json.dumps(spans) + '\n')
+        self.process.stdin.flush()
+        line = self.process.stdout.readline()
+        if not line:
+            raise KatexUnavailable('renderer exited')
+        return json.loads(line)
+
+    def render(self, spans):
+        """{span: result} for the distinct spans, rendering only those not cached"""
+        if self.process is None:
+            self.start()
+        results = {}
+        missing = []
+        for span in dict.fromkeys(spans):
+            cached = None
+            if self.cache is not None:
+                cached = self.cache.get(FormatCache.make_key('katex', span, self.fingerprint))
+            if cached is not None:
+                results[span] = json.loads(cached)
+                self.reused += 1
+            else:
+                missing.append(span)
+
+        batch_size = self.settings['batch_size']
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start:start + batch_size]
+            for span, result in zip(batch, self.render_batch(batch)):
+                results[span] = result
+                self.rendered += 1
+                if self.cache is not None:
+                    self.cache.put(FormatCache.make_key('katex', span, self.fingerprint), json.dumps(result))
+        return results
+
+    def prerender(self, problems):
+        """Attach the `katex` map to each problem; spans KaTeX rejects are logged and left out"""
+        spans_by_problem = [problem_spans(problem) for problem in problems]
+        results = self.render([span for spans in spans_by_problem for span in spans])
+        for problem, spans in zip(problems, spans_by_problem):
+            markup = {}
+            for span in spans:
+                result = results[span]
+                if 'html' in result:
+                    markup[span] = result['html']
+                elif span not in markup:
+                    self.failed += 1
+                    logger.error("KaTeX cannot render %r in problem %s: %s", span, problem.get('id'), result['error'])
+            if markup:
+                problem['katex'] = markup
+            else:
+                problem.pop('katex', None)
+        return problems
+
+    def iter_prerendered(self, problems):
+        """prerender for a stream of problems, a batch of problems at a time"""
+        batch = []
+        for problem in problems:
+            batch.append(problem)
+            if len(batch) >= self.settings['problems_per_batch']:
+                yield from self.prerender(batch)
+                batch = []
+        if batch:
+            yield from self.prerender(batch)
+
+    def describe(self):
+        return f"{self.rendered} spans rendered, {self.reused} reused, {self.failed} failed"
+
+
+def open_katex_cache():
+    """The FormatCache holding rendered spans"""
+    return FormatCache(CACHE_SETTINGS['directory'], KATEX_SETTINGS['cache_max_size_mb'] * 1024 * 1024,
+                       filename='katex.sqlite3')
+
+
+def main():
+    """Command line interface for pre-rendering the math of a problem file"""
+    parser = argparse.ArgumentParser(description="Pre-render the math of every problem of a problem file with KaTeX")
+    parser.add_argument('problems_file', help='Problem file (json, ndjson, shards or bundle), updated in place')
+    parser.add_argument('--output', help='Write the problems here instead of updating problems_file')
+    parser.add_argument('--no-cache', action='store_true', help='Render every span again')
+    parser.add_argument('--quiet', '-q', action='store_true', help='Only log warnings and errors')
+
+    args = parser.parse_args()
+    configure_logging(LOGGING_CONFIG, args.quiet)
+
+    if not Path(args.problems_file).exists():
+        logger.error("Error: problem file '%s' does not exist", args.problems_file)
+        return 1
+
+    problems = list(iter_problems(args.problems_file))
+    renderer = KatexRenderer(None if args.no_cache else open_katex_cache())
+    try:
+        renderer.prerender(problems)
+    except KatexUnavailable as e:
+        logger.error("Error: KaTeX renderer unavailable (run npm install): %s", e)
+        return 1
+    finally:
+        renderer.close()
+
+    output = args.output or args.problems_file
+    result = write_problems(problems, output, EXPORT_SETTINGS, detect_format(output),
+                            OUTPUT_SETTINGS['shard_max_kb'] * 1024)
+    logger.info("🧮 KaTeX: %s", renderer.describe())
+    logger.info("💾 Output (%s): %s", output, result.describe())
+    return 0 if not renderer.failed else 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Logging and progress reporting for the PDF to JSON pipeline
+===========================================================
+
+The pipeline logs through the `pdf_to_json_pipeline` logger:
+
+- per-page and per-problem messages at DEBUG
+- status and summaries at INFO
+- validation issues at WARNING
+- failures at ERROR
+
+`configure_logging` applies LOGGING_CONFIG from pipeline_config.py. --quiet
+raises the level to WARNING and --verbose lowers it to DEBUG. Messages use
+lazy %-formatting, so disabled levels never build their strings.
+
+`ProgressMeter` replaces per-item prints with a throughput line (items/s and,
+when the total is known, an ETA). The line is logged at most once per
+LOGGING_CONFIG['progress_interval'] seconds.
+"""
+
+import logging
+import sys
+import time
+
+LOGGER_NAME = 'pdf_to_json_pipeline'
+
+logger = logging.getLogger(LOGGER_NAME)
+
+
+def configure_logging(config, quiet=False, verbose=False):
+    """Send pipeline logs to stderr at the configured (or overridden) level"""
+    if quiet:
+        level = logging.WARNING
+    elif verbose:
+        level = logging.DEBUG
+    else:
+        level = getattr(logging, str(config.get('level', 'INFO')).upper(), logging.INFO)
+
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter(config.get('format', '%(message)s')))
+    logger.handlers[:] = [handler]
+    logger.setLevel(level)
+    logger.propagate = False
+    return logger
+
+
+class ProgressMeter:
+    """Rate-limited throughput/ETA line for a loop over pages or problems
+
+    When progress is disabled, or INFO is not enabled, update() only
+    increments a counter.
+    """
+
+    def __init__(self, label, total=None, unit='problems', interval=2.0, enabled=True):
+        self.label = label
+        self.total = total
+        self.unit = unit
+        self.interval = interval
+        self.enabled = enabled and logger.isEnabledFor(logging.INFO)
+        self.count = 0
+        self.started = time.perf_counter()
+        self.next_report = self.started + interval
+
+    def update(self, n=1):
+        self.count += n
+        if self.enabled:
+            now = time.perf_counter()
+            if now >= self.next_report:
+                self.next_report = now + self.interval
+                self.report(now)
+
+    def report(self, now):
+        elapsed = now - self.started
+        rate = self.count / elapsed if elapsed else 0.0
+        if self.total:
+            eta = (self.total - self.count) / rate if rate else 0.0
+            logger.info("%s: %d/%d %s (%.1f %s/s, ETA %.1fs)",
+                        self.label, self.count, self.total, self.unit, rate, self.unit, eta)
+        else:
+            logger.info("%s: %d %s (%.1f %s/s)", self.label, self.count, self.unit, rate, self.unit)
+
+    def finish(self):
+        """Log the final count and throughput if progress was reported at all"""
+        if self.enabled and self.next_report > self.started + self.interval:
+            self.report(time.perf_counter())
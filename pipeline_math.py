@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+LaTeX math-span tokenizer for the PDF to JSON pipeline
+======================================================
+
+`wrap_math_spans` wraps the LaTeX in text without dollar signs in `$...$`
+for KaTeX. One left-to-right scan finds each span:
+
+- `\\frac{..}{..}`, `\\sqrt[..]{..}` and `\\mathbb{..}`, with nested braces
+  matched
+- `\\int` with its bounds and its integrand up to the differential (`dx`)
+- `\\sin`, `\\cos` and `\\tan` with an optional power and argument word
+- Greek letters and operators (`\\pi`, `\\leq`, `\\in`, `\\infty`, ...)
+
+Sub- and superscripts after a span (`\\mathbb{R}^3`) belong to it, as does a
+number written directly before it (`2\\sqrt{\\pi}`). Scanning resumes after
+each span, so spans never overlap or nest. Spans that touch are merged, so
+the output never contains `$$`, and it is built with a single join.
+
+A span found inside a brace group, such as the `\\infty` of
+`\\sum_{n=0}^{\\infty}`, would open its `$` inside the group; it takes in
+the whole group and the term the group belongs to (`$\\sum_{n=0}^{\\infty}$`)
+instead. A span inside a group that is never closed is not wrapped.
+
+Brace groups are matched by one scan per text (`brace_groups`), so an
+unmatched `{` in PDF text is not rescanned for every command after it, and
+text without a backslash is returned at once.
+"""
+
+import re
+
+# Commands wrapped on their own
+MATH_SYMBOLS = frozenset((
+    # Greek letters
+    'pi', 'alpha', 'beta', 'gamma', 'delta', 'theta', 'lambda', 'mu', 'sigma', 'phi', 'omega',
+    # Operators
+    'leq', 'geq', 'neq', 'approx', 'equiv', 'in', 'subset', 'cup', 'cap', 'infty',
+))
+
+# Commands wrapped together with their brace-group arguments
+ARGUMENT_COUNTS = {'frac': 2, 'sqrt': 1, 'mathbb': 1}
+
+TRIG_FUNCTIONS = frozenset(('sin', 'cos', 'tan'))
+
+COMMAND = re.compile(r'\\([a-zA-Z]+)')
+BRACE = re.compile(r'(?<!\\)[{}]')
+SPACES = re.compile(r'\s*')
+SCRIPT = re.compile(r'[\^_](?:\\[a-zA-Z]+|[A-Za-z0-9])')
+SQRT_INDEX = re.compile(r'\[[^\]]*\]')
+TRIG_ARGUMENT = re.compile(r'(?:\^[0-9]+)?(?:\s*[a-zA-Z]+)?')
+# A number written directly before a command, e.g. the "2" of 2\sqrt{\pi}
+COEFFICIENT = re.compile(r'(?<![\w.])\d+(?:\.\d+)?$')
+# Integrand up to a differential such as "dx", stopping at the end of the expression
+INTEGRAND = re.compile(r'[^=?,;]*?(?<![A-Za-z])d[a-zA-Z](?![A-Za-z])')
+
+
+def brace_groups(text):
+    """Brace groups of text, matched in one left-to-right scan
+
+    Returns (ends, top): ends maps the position of every closed group's `{`
+    to the position after its `}`, and top lists the (start, end) of the
+    outermost groups in order, with end None for a `{` that is never closed
+    (everything after it is inside that group). An unmatched `}` is ignored.
+    """
+    ends = {}
+    top = []
+    opened = []
+    for brace in BRACE.finditer(text):
+        if brace.group() == '{':
+            opened.append(brace.start())
+        elif opened:
+            start = opened.pop()
+            ends[start] = brace.end()
+            if not opened:
+                top.append((start, brace.end()))
+    if opened:
+        top.append((opened[0], None))
+    return ends, top
+
+
+def term_start(text, pos, floor, group_starts):
+    """Start of the term that the brace group opening at pos is a script or argument of
+
+    Walks back over scripts and their base: a command, letters and digits,
+    or a closed `(...)` or `{...}` group, so `\\sum_{n=0}^{..}`, `e^{..}` and
+    `(a_n)_{n=1}^{..}` are taken whole. Never walks back past floor.
+    """
+    while pos > floor:
+        char = text[pos - 1]
+        if char in '^_' or char.isalnum():
+            pos -= 1
+            if char.isalnum():
+                while pos > floor and text[pos - 1].isalnum():
+                    pos -= 1
+                if pos > floor and text[pos - 1] == '\\':
+                    pos -= 1
+        elif char == '}' and pos in group_starts and group_starts[pos] >= floor:
+            pos = group_starts[pos]
+        elif char == ')':
+            # Back to the matching '(', if there is one after floor
+            i, depth = pos - 1, 1
+            while depth and i > floor:
+                i -= 1
+                depth += (text[i] == ')') - (text[i] == '(')
+            if depth:
+                break
+            pos = i
+        else:
+            break
+    return pos
+
+
+def scripts_end(text, pos, group_end):
+    """End of any sub- and superscripts (`_0`, `^{n+1}`, `^\\infty`) starting at pos"""
+    while pos < len(text) and text[pos] in '^_':
+        end = group_end(pos + 1)
+        if end is None:
+            script = SCRIPT.match(text, pos)
+            if not script:
+                break
+            end = script.end()
+        pos = end
+    return pos
+
+
+def command_span_end(text, name, pos, group_end):
+    """End of the math span of command `name` whose name ends at pos, or None
+
+    `group_end(pos)` is the end of the brace group opening at pos, or None.
+    """
+    if name in ARGUMENT_COUNTS:
+        if name == 'sqrt':
+            index = SQRT_INDEX.match(text, pos)
+            if index:
+                pos = index.end()
+        for i in range(ARGUMENT_COUNTS[name]):
+            if i:
+                pos = SPACES.match(text, pos).end()
+            pos = group_end(pos)
+            if pos is None:
+                return None
+        return scripts_end(text, pos, group_end)
+
+    if name == 'int':
+        pos = scripts_end(text, pos, group_end)
+        integrand = INTEGRAND.match(text, pos)
+        return integrand.end() if integrand else pos
+
+    if name in TRIG_FUNCTIONS:
+        return TRIG_ARGUMENT.match(text, pos).end()
+
+    if name in MATH_SYMBOLS:
+        return scripts_end(text, pos, group_end)
+
+    return None
+
+
+def find_math_spans(text):
+    """(start, end) of every math span in text, in order and non-overlapping"""
+    spans = []
+    ends, top = brace_groups(text) if '{' in text else ({}, [])
+    group_end = ends.get
+    top_starts = {end: start for start, end in top}
+    # The outermost group that may contain the next span; spans only move right
+    outer = 0
+    pos = 0
+    while True:
+        command = COMMAND.search(text, pos)
+        if not command:
+            return spans
+        end = command_span_end(text, command.group(1), command.end(), group_end)
+        if end is None:
+            pos = command.end()
+            continue
+
+        # A number written directly before the span is its coefficient
+        coefficient = COEFFICIENT.search(text, pos, command.start())
+        start = coefficient.start() if coefficient else command.start()
+
+        # A span inside a brace group takes in the group and the term it
+        # belongs to, so its dollar signs sit outside every group
+        while outer < len(top) and top[outer][1] is not None and top[outer][1] <= start:
+            outer += 1
+        if outer < len(top) and top[outer][0] < start:
+            group, group_close = top[outer]
+            if group_close is None:
+                pos = end
+                continue
+            start = term_start(text, group, spans[-1][1] if spans else 0, top_starts)
+            end = max(end, scripts_end(text, group_close, group_end))
+
+        # Spans that touch share one pair of dollar signs
+        if spans and spans[-1][1] == start:
+            spans[-1] = (spans[-1][0], end)
+        else:
+            spans.append((start, end))
+        pos = end
+
+
+def wrap_math_spans(text):
+    """text with every math span wrapped in `$...$`"""
+    if '\\' not in text:
+        return text
+    pieces = []
+    pos = 0
+    for start, end in find_math_spans(text):
+        pieces.append(text[pos:start])
+        pieces.append(f'${text[start:end]}$')
+        pos = end
+    if not pieces:
+        return text
+    pieces.append(text[pos:])
+    return ''.join(pieces)
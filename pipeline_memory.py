@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Bounded-memory page extraction (--low-memory)
+=============================================
+
+pdfplumber keeps the parsed layout objects of every page it has touched,
+and pdfminer keeps every PDF object it has resolved, for as long as the PDF
+is open. Reading a 1,000-page compilation through one open `pdf.pages` list
+therefore grows the process by the layout of every page.
+
+`iter_page_windows` reads pages in windows instead. Each window opens the
+PDF for just its pages, releases each page's cached objects as soon as its
+text is taken, and closes the PDF before the next window, so memory is
+bounded by one window rather than the whole document. After each window
+the resident set size is compared with the memory ceiling; above it the
+window is halved (down to one page), trading reopen overhead for memory.
+
+RSS is read from /proc on Linux. Elsewhere only the peak is available
+(from the resource module, missing on Windows), so the ceiling is not
+checked there and peak_rss_bytes() may return None.
+"""
+
+import gc
+import os
+import sys
+
+from pipeline_logging import logger
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def current_rss_bytes():
+    """Resident set size of this process, or None where /proc is not available"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def peak_rss_bytes(children=False):
+    """Peak resident set size of this process (or of its finished child processes)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def release_page(page):
+    """Drop the layout objects pdfplumber cached for page"""
+    close = getattr(page, 'close', None)
+    if close is not None:
+        close()
+    else:
+        page.flush_cache()
+
+
+def iter_page_windows(pdfplumber, pdf_path, page_numbers, extract_settings, window_pages, max_rss_mb=None):
+    """Yield (page index, text) for the given 0-based pages, reading them in windows
+
+    page_numbers must be ascending. A window opens the PDF for its pages only
+    and closes it once their text has been taken.
+    """
+    page_numbers = list(page_numbers)
+    window = max(1, window_pages)
+    ceiling = max_rss_mb * 1024 * 1024 if max_rss_mb else None
+    warned = False
+    position = 0
+    while position < len(page_numbers):
+        numbers = page_numbers[position:position + window]
+        # pdfplumber numbers the pages it should load from 1
+        with pdfplumber.open(pdf_path, pages=[number + 1 for number in numbers]) as pdf:
+            for number, page in zip(numbers, pdf.pages):
+                text = page.extract_text(**extract_settings)
+                release_page(page)
+                yield number, text
+        position += len(numbers)
+        # pdfminer's objects reference each other; collect them before measuring
+        gc.collect()
+        rss = current_rss_bytes() if ceiling else None
+        if rss is not None and rss > ceiling:
+            if window > 1:
+                window = max(1, window // 2)
+                logger.debug("RSS %.0f MB above the %d MB ceiling; reading %d pages per window",
+                             rss / (1024 * 1024), max_rss_mb, window)
+            elif not warned:
+                logger.warning("⚠️  RSS %.0f MB stays above the %d MB ceiling with one page per window",
+                               rss / (1024 * 1024), max_rss_mb)
+                warned = True
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+ID-indexed merge of new problems into an existing problem set
+=============================================================
+
+Both problem lists are sorted by `id` (already-sorted input is detected in
+linear time), so the merge is a single two-pointer pass. When a new problem
+has the same `id` as an existing one, the conflict policy decides:
+
+- `keep-existing`: the existing problem is kept as is
+- `overwrite`: the pipeline's fields (category, difficulty, problem, ...)
+  replace the existing ones, but hand-edited fields listed in
+  MERGE_SETTINGS['preserve_fields'] (e.g. `correctAnswer`, `choices`) are kept
+- `keep-both`: the existing problem is kept and the new one gets the next
+  free integer `id`, after the highest numeric id and before any string id
+
+A new problem whose fields already match the existing one is never a
+conflict and counts as unchanged under every policy.
+
+Ids may mix integers (hand-numbered files) and strings (`--batch` ids such
+as "gre_subject-18"); integers sort before strings.
+"""
+
+CONFLICT_POLICIES = ('keep-existing', 'overwrite', 'keep-both')
+
+
+def id_key(problem):
+    """Sort key of a problem's id: numbers, then strings, then anything else by its text"""
+    problem_id = problem['id']
+    if isinstance(problem_id, (int, float)):
+        return 0, problem_id
+    if isinstance(problem_id, str):
+        return 1, problem_id
+    return 2, str(problem_id)
+
+
+def sorted_by_id(problems):
+    """The problems in id order; returns the list itself when already sorted"""
+    keys = [id_key(problem) for problem in problems]
+    if all(keys[i] <= keys[i + 1] for i in range(len(keys) - 1)):
+        return problems
+    return sorted(problems, key=id_key)
+
+
+class MergeStats:
+    """Counts reported by merge_problem_sets"""
+
+    def __init__(self):
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.conflicts = 0
+        self.renumbered = []
+
+    def as_dict(self):
+        return {
+            'inserted': self.inserted,
+            'updated': self.updated,
+            'unchanged': self.unchanged,
+            'conflicts': self.conflicts,
+            'renumbered': len(self.renumbered),
+        }
+
+
+def overwrite_problem(existing, new, preserve_fields):
+    """Existing problem updated with the new fields, keeping hand-edited ones"""
+    merged = dict(existing)
+    for key, value in new.items():
+        if key in preserve_fields and key in existing:
+            continue
+        merged[key] = value
+    return merged
+
+
+def merge_problem_sets(existing_problems, new_problems, policy='keep-existing', preserve_fields=()):
+    """Merge new problems into existing ones by id
+
+    Returns (merged problems sorted by id, MergeStats). Problems renumbered by
+    `keep-both` take the integers after the highest numeric id, so they stay
+    before any string id, and are listed in stats.renumbered as (old id,
+    new id) pairs.
+    """
+    if policy not in CONFLICT_POLICIES:
+        raise ValueError(f"Unknown conflict policy '{policy}' (expected one of {', '.join(CONFLICT_POLICIES)})")
+
+    existing_problems = sorted_by_id(existing_problems)
+    new_problems = sorted_by_id(new_problems)
+    preserve_fields = frozenset(preserve_fields)
+    stats = MergeStats()
+
+    merged = []
+    deferred = []
+    i = j = 0
+    while i < len(existing_problems) or j < len(new_problems):
+        if j == len(new_problems) or (i < len(existing_problems)
+                                      and id_key(existing_problems[i]) < id_key(new_problems[j])):
+            merged.append(existing_problems[i])
+            i += 1
+            continue
+
+        new = new_problems[j]
+        j += 1
+        # Compare with the existing problem of the same id, or with a new
+        # problem merged just before it (duplicate ids within the new set)
+        if i < len(existing_problems) and existing_problems[i]['id'] == new['id']:
+            merged.append(existing_problems[i])
+            i += 1
+        elif not merged or merged[-1]['id'] != new['id']:
+            merged.append(new)
+            stats.inserted += 1
+            continue
+
+        current = merged[-1]
+        updated = overwrite_problem(current, new, preserve_fields)
+        if updated == current:
+            stats.unchanged += 1
+            continue
+
+        stats.conflicts += 1
+        if policy == 'overwrite':
+            merged[-1] = updated
+            stats.updated += 1
+        elif policy == 'keep-both':
+            deferred.append(new)
+        else:
+            stats.unchanged += 1
+
+    # Renumber kept duplicates after the highest numeric id; merged is in id
+    # order, so the numeric ids come first and the renumbered ones go after them
+    if deferred:
+        numeric = 0
+        while numeric < len(merged) and id_key(merged[numeric])[0] == 0:
+            numeric += 1
+        next_id = int(merged[numeric - 1]['id']) + 1 if numeric else 1
+        renumbered = []
+        for new in deferred:
+            stats.renumbered.append((new['id'], next_id))
+            renumbered.append(dict(new, id=next_id))
+            stats.inserted += 1
+            next_id += 1
+        merged[numeric:numeric] = renumbered
+
+    return merged, stats
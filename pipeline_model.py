@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Structured problem record for the PDF to JSON pipeline
+======================================================
+
+A problem's normalized text is split once into a stem and its multiple
+choice segments. The formatting stages then work on each segment of the
+`ProblemRecord`, and the final string is rendered only once, at export:
+
+    <stem>
+
+    Choices:
+    (A) <choice>
+    (B) <choice>
+    ...
+
+Splitting happens only here. The text fixes no longer re-split on
+"Choices:" or re-scan for choice labels in every stage.
+"""
+
+import json
+import re
+
+# A choice label: "(A)", or a bare "B)" whose opening parenthesis was lost
+# when the PDF line broke before it
+CHOICE_MARKER = re.compile(r'\(([A-E])\)|(?<!\S)([A-E])\)')
+
+# A "Choices:" label the PDF already put before the choices
+TRAILING_CHOICES_LABEL = re.compile(r'\s*Choices:\s*$', re.IGNORECASE)
+
+
+def choice_markers(text):
+    """(letter, start, end) of the labels that delimit the choices of text
+
+    The choices start at the first "(A)", or at the first "(X)" label when
+    there is no "(A)" but at least two such labels. After that every "(X)"
+    label counts. A bare "X)" counts only when X is the letter after the
+    previous label, so "f(x) B)" inside a choice is not split on.
+    """
+    markers = [(match.group(1) or match.group(2), match.start(), match.end(), match.group(1) is not None)
+               for match in CHOICE_MARKER.finditer(text)]
+    labelled = [marker for marker in markers if marker[3]]
+    first = next((marker for marker in labelled if marker[0] == 'A'), None)
+    if first is None:
+        if len(labelled) < 2:
+            return []
+        first = labelled[0]
+
+    delimiters = []
+    for letter, start, end, parenthesized in markers[markers.index(first):]:
+        if parenthesized or chr(ord(delimiters[-1][0]) + 1) == letter:
+            delimiters.append((letter, start, end))
+    return delimiters
+
+
+def split_choices(text):
+    """Split normalized problem text into (stem, [(letter, choice text), ...]) in one pass
+
+    Each choice runs up to the next label (see choice_markers). Only the
+    first choice of each letter is kept and empty choices are dropped. Text
+    without choices (or made only of choices) is all stem.
+    """
+    markers = choice_markers(text)
+    if not markers or markers[0][1] == 0:
+        return text, []
+
+    choices = []
+    seen = set()
+    for i, (letter, _, end) in enumerate(markers):
+        next_start = markers[i + 1][1] if i + 1 < len(markers) else len(text)
+        choice = text[end:next_start].strip()
+        if choice and letter not in seen:
+            seen.add(letter)
+            choices.append((letter, choice))
+
+    stem = TRAILING_CHOICES_LABEL.sub('', text[:markers[0][1]]).strip()
+    return stem, choices
+
+
+class ProblemRecord:
+    """One problem: its classification, stem and choice segments"""
+
+    __slots__ = ('id', 'category', 'difficulty', 'stem', 'choices', 'fields')
+
+    def __init__(self, problem_id, stem, choices=(), category=None, difficulty=None, fields=None):
+        self.id = problem_id
+        self.category = category
+        self.difficulty = difficulty
+        self.stem = stem
+        self.choices = list(choices)
+        self.fields = fields
+
+    @classmethod
+    def parse(cls, problem_id, text, category=None, difficulty=None):
+        """Record for normalized problem text, splitting out its choices"""
+        stem, choices = split_choices(text)
+        return cls(problem_id, stem, choices, category, difficulty)
+
+    def map_segments(self, func):
+        """Apply a text fix to the stem and every choice; choices left empty are dropped
+
+        Returns True if any segment changed.
+        """
+        stem = func(self.stem)
+        choices = []
+        for letter, choice in self.choices:
+            choice = func(choice)
+            if choice:
+                choices.append((letter, choice))
+        changed = stem != self.stem or choices != self.choices
+        self.stem = stem
+        self.choices = choices
+        return changed
+
+    def copy(self):
+        return ProblemRecord(self.id, self.stem, self.choices, self.category, self.difficulty,
+                             dict(self.fields) if self.fields else None)
+
+    def encode_segments(self):
+        """Stem and choices as a compact JSON string (the format cache's value)"""
+        return json.dumps([self.stem, self.choices], ensure_ascii=False)
+
+    def set_segments(self, encoded):
+        """Restore stem and choices from encode_segments()"""
+        self.stem, choices = json.loads(encoded)
+        self.choices = [tuple(choice) for choice in choices]
+        return self
+
+    def render(self):
+        """The problem text as exported"""
+        if not self.choices:
+            return self.stem
+        choices = '\n'.join(f"({letter}) {choice}" for letter, choice in self.choices)
+        if not self.stem:
+            return f"Choices:\n{choices}"
+        return f"{self.stem}\n\nChoices:\n{choices}"
+
+    def to_dict(self):
+        """Exported problem: id, category, difficulty, rendered problem text and extra fields"""
+        problem = {
+            "id": self.id,
+            "category": self.category,
+            "difficulty": self.difficulty,
+            "problem": self.render()
+        }
+        if self.fields:
+            problem.update(self.fields)
+        return problem
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Per-stage profiling for the PDF to JSON pipeline (--profile)
+============================================================
+
+`StageProfiler.instrument` replaces the named extractor methods on one
+instance with timing wrappers. Without --profile nothing is wrapped, so the
+pipeline runs exactly as before with no overhead.
+
+For every stage the report records call count, wall time including nested
+stages, self time excluding them, and peak traced memory (tracemalloc).
+Generator stages such as iter_text_chunks are timed on every resumption. The
+slowest problems are also reported, measured as time spent building and
+post-processing each problem.
+"""
+
+import functools
+import heapq
+import inspect
+import json
+import time
+import tracemalloc
+
+# Pipeline stages timed by --profile
+DEFAULT_STAGES = (
+    'extract_text_from_pdf',
+    'iter_text_chunks',
+    'extract_problem_texts',
+    'parse_problems_from_text',
+    'parse_problem_texts',
+    'classify_problems',
+    'extract_figures',
+    'apply_formatting_fixes',
+    'wrap_math_expressions',
+    'post_process_validation',
+    'export_problems',
+    'merge_with_existing',
+    'prerender_katex',
+    'save_to_json',
+    'save_to_json_stream',
+)
+
+# Per-problem methods and how to find the problem id from their arguments
+PROBLEM_METHODS = {
+    'build_problem': lambda args: args[0],
+    'post_process_problem': lambda args: args[0].id,
+}
+
+
+class StageStats:
+    """Accumulated measurements of one stage"""
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.seconds = 0.0
+        self.self_seconds = 0.0
+        self.peak_memory = 0
+
+    def as_dict(self):
+        return {
+            'stage': self.name,
+            'calls': self.calls,
+            'seconds': round(self.seconds, 6),
+            'self_seconds': round(self.self_seconds, 6),
+            'peak_memory_bytes': self.peak_memory,
+        }
+
+
+class StageProfiler:
+    """Wall time, call counts, peak memory and slowest problems of a pipeline run"""
+
+    def __init__(self, slowest=10, trace_memory=True):
+        self.slowest = slowest
+        self.trace_memory = trace_memory
+        self.stages = {}
+        self.problem_seconds = {}
+        # One [child seconds, child peak memory] frame per active stage
+        self.stack = []
+        self.started = None
+        self.total_seconds = None
+        self.peak_memory = None
+
+    def start(self):
+        if self.trace_memory:
+            tracemalloc.start()
+        self.started = time.perf_counter()
+
+    def stop(self):
+        self.total_seconds = time.perf_counter() - self.started
+        if self.trace_memory:
+            self.peak_memory = max([tracemalloc.get_traced_memory()[1]]
+                                   + [stats.peak_memory for stats in self.stages.values()])
+            tracemalloc.stop()
+
+    def enter(self):
+        """Open a stage frame; resets the traced peak so nested stages are measured alone"""
+        if self.trace_memory:
+            peak_so_far = tracemalloc.get_traced_memory()[1]
+            if self.stack:
+                self.stack[-1][1] = max(self.stack[-1][1], peak_so_far)
+            tracemalloc.reset_peak()
+        self.stack.append([0.0, 0])
+        return time.perf_counter()
+
+    def exit(self, name, started):
+        elapsed = time.perf_counter() - started
+        child_seconds, child_peak = self.stack.pop()
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = StageStats(name)
+        stats.calls += 1
+        stats.seconds += elapsed
+        stats.self_seconds += elapsed - child_seconds
+        if self.trace_memory:
+            peak = max(tracemalloc.get_traced_memory()[1], child_peak)
+            stats.peak_memory = max(stats.peak_memory, peak)
+        else:
+            peak = 0
+        if self.stack:
+            self.stack[-1][0] += elapsed
+            self.stack[-1][1] = max(self.stack[-1][1], peak)
+        return elapsed
+
+    def wrap_stage(self, name, method):
+        """Timing wrapper for one stage method (generators are timed per resumption)"""
+        profiler = self
+
+        def timed_generator(generator):
+            while True:
+                started = profiler.enter()
+                try:
+                    item = next(generator)
+                except StopIteration:
+                    return
+                finally:
+                    profiler.exit(name, started)
+                yield item
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            started = profiler.enter()
+            try:
+                result = method(*args, **kwargs)
+            finally:
+                profiler.exit(name, started)
+            if inspect.isgenerator(result):
+                return timed_generator(result)
+            return result
+
+        return wrapper
+
+    def wrap_problem(self, method, problem_id):
+        """Wrapper adding the time of one per-problem method to that problem's total"""
+        problem_seconds = self.problem_seconds
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                key = problem_id(args)
+                problem_seconds[key] = problem_seconds.get(key, 0.0) + time.perf_counter() - started
+
+        return wrapper
+
+    def instrument(self, extractor, stages=DEFAULT_STAGES):
+        """Wrap the named stages and the per-problem methods of one extractor instance"""
+        for name in stages:
+            if hasattr(extractor, name):
+                setattr(extractor, name, self.wrap_stage(name, getattr(extractor, name)))
+        for name, problem_id in PROBLEM_METHODS.items():
+            setattr(extractor, name, self.wrap_problem(getattr(extractor, name), problem_id))
+        return extractor
+
+    def report(self, **extra):
+        """The profile as a JSON-serializable dict"""
+        slowest = heapq.nlargest(self.slowest, self.problem_seconds.items(), key=lambda item: item[1])
+        report = dict(extra)
+        report.update({
+            'total_seconds': round(self.total_seconds, 6) if self.total_seconds is not None else None,
+            'peak_memory_bytes': self.peak_memory,
+            'stages': [stats.as_dict() for stats in
+                       sorted(self.stages.values(), key=lambda stats: stats.seconds, reverse=True)],
+            'problems_timed': len(self.problem_seconds),
+            'slowest_problems': [{'id': problem_id, 'seconds': round(seconds, 6)}
+                                 for problem_id, seconds in slowest],
+        })
+        return report
+
+    def write(self, path, **extra):
+        """Write the JSON report and return it"""
+        report = self.report(**extra)
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        return report
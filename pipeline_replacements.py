@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Compiled literal replacement tables for the PDF to JSON pipeline
+================================================================
+
+The symbol and artifact tables in pipeline_config.py are applied in table
+order, one `str.replace` pass per entry. Each pass sees the output of the
+previous ones (e.g. 'frac{' is rewritten by both the notation fixes and
+SYMBOL_REPLACEMENTS), so the tables cannot be collapsed into one naive
+alternation without changing the output.
+
+`ReplacementTable` compiles a table once into a short list of gated
+segments instead:
+
+- a long run of consecutive single-character entries (such as
+  UNICODE_ARTIFACTS) becomes one segment gated by a single character-class
+  scan; only the characters actually found are replaced
+- a run of consecutive entries sharing a common substring (e.g. 'cid:' or
+  ' p') becomes one segment gated by a single `in` check
+
+Segments whose entries all contain non-ASCII characters (most of the PDF
+artifact and symbol entries) are additionally skipped in O(1) when the text
+is pure ASCII. Every entry in a segment contains its gate, so when the gate
+is absent at the start of the segment none of its entries can match and the
+whole segment is skipped. Entries that do run still run in table order with
+`str.replace`, which keeps the result identical to the sequential passes.
+"""
+
+import re
+
+# Shortest shared substring worth gating a run of multi-character entries on
+MIN_GATE_LENGTH = 2
+
+# A character-class scan costs about as much as a dozen single-character
+# `str.replace` misses, so only longer runs of single characters are gated
+MIN_CHAR_RUN = 16
+
+
+def _common_substring(patterns):
+    """Longest substring shared by all patterns (the first one wins ties)"""
+    first = min(patterns, key=len)
+    for length in range(len(first), 0, -1):
+        for start in range(len(first) - length + 1):
+            candidate = first[start:start + length]
+            if all(candidate in pattern for pattern in patterns):
+                return candidate
+    return ''
+
+
+class ReplacementTable:
+    """An ordered table of literal replacements compiled into gated segments"""
+
+    def __init__(self, replacements):
+        if isinstance(replacements, dict):
+            replacements = replacements.items()
+        rules = [(old, new) for old, new in replacements if old]
+        self.rule_count = len(rules)
+
+        # Group consecutive entries into runs that can share one gate
+        runs = []
+        for old, new in rules:
+            if runs:
+                run = runs[-1]
+                if len(old) == 1 and all(len(o) == 1 for o, _ in run):
+                    run.append((old, new))
+                    continue
+                if len(old) > 1 and all(len(o) > 1 for o, _ in run):
+                    patterns = [o for o, _ in run] + [old]
+                    if len(_common_substring(patterns)) >= MIN_GATE_LENGTH:
+                        run.append((old, new))
+                        continue
+            runs.append([(old, new)])
+
+        self.segments = [self._compile_segment(run) for run in runs]
+
+    @staticmethod
+    def _compile_segment(run):
+        """Compile one run of entries into a callable text -> text"""
+        segment = ReplacementTable._compile_run(run)
+        if any(old.isascii() for old, _ in run):
+            return segment
+        
+        # No entry can match pure ASCII text, and str.isascii() is O(1)
+        return lambda text: text if text.isascii() else segment(text)
+
+    @staticmethod
+    def _compile_run(run):
+        """Compile the gate and replacements of one run of entries"""
+        if len(run) == 1:
+            (old, new), = run
+            return lambda text: text.replace(old, new)
+
+        if len(run[0][0]) == 1 and len(run) < MIN_CHAR_RUN:
+            def replace_all(text):
+                for old, new in run:
+                    text = text.replace(old, new)
+                return text
+
+            return replace_all
+
+        if len(run[0][0]) == 1:
+            scan = re.compile('[%s]' % ''.join(re.escape(old) for old, _ in run))
+
+            def replace_chars(text):
+                found = scan.findall(text)
+                if not found:
+                    return text
+                present = set(found)
+                for old, new in run:
+                    if old in present:
+                        text = text.replace(old, new)
+                        # A replacement may introduce characters later entries match
+                        present.update(new)
+                return text
+
+            return replace_chars
+
+        gate = _common_substring([old for old, _ in run])
+
+        def replace_gated(text):
+            if gate not in text:
+                return text
+            for old, new in run:
+                text = text.replace(old, new)
+            return text
+
+        return replace_gated
+
+    def apply(self, text):
+        """Apply the table to text; identical to one str.replace per entry in order"""
+        for segment in self.segments:
+            text = segment(text)
+        return text
+
+    __call__ = apply
+
+
+def apply_sequentially(replacements, text):
+    """Reference implementation: one str.replace pass per entry in table order"""
+    if isinstance(replacements, dict):
+        replacements = replacements.items()
+    for old, new in replacements:
+        text = text.replace(old, new)
+    return text
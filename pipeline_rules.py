@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Declarative formatting rules for the PDF to JSON pipeline
+=========================================================
+
+Both formatting stages of a problem segment (the formatting fixes applied
+to raw PDF text and the final validation fixes applied afterwards) are a
+`RuleSet`: an ordered list of `Rule`s, each a rewrite plus a cheap guard
+that rules out a match without running it:
+
+- a string: the rule runs only if the text contains it (e.g. '$')
+- a compiled regex: the rule runs only if it matches somewhere; one such
+  prefilter stands in for a whole group of substitutions
+- a callable taking the text
+- None: the rule always runs
+
+A rewrite is either a list of (pattern, replacement) regex substitutions,
+run in order, or a function of the text. Rules run in list order, each on
+the previous one's output, so a rule set gives exactly the result of
+running its rewrites one after another; the guards only skip rewrites that
+could not change the text.
+
+`NORMALIZE_WHITESPACE` is guarded by an exact fixpoint test: text that is
+already collapsed and stripped is not rewritten, which is the common case
+for the last rule of a stage whose earlier rules added no whitespace.
+
+When every rule of a set has a string or regex guard, the set also gets
+one gate: the union of the guards. If it finds nothing, no rule can run,
+so the text is already a fixpoint of the whole set and is returned after
+that single scan. Segments coming out of the formatting stage mostly
+take this path through the final validation fixes.
+
+Each RuleSet counts its guard checks and rewrite passes (`checks` and
+`rewrites`), which is what the `rules` benchmark compares.
+"""
+
+import re
+from functools import partial
+
+# Whitespace that normalize_whitespace would change: at either end, a run
+# of two, or any whitespace character other than a space
+UNNORMALIZED_WHITESPACE = re.compile(r'\A\s|\s\Z|\s\s|[^\S ]')
+
+# Regex flags that can be scoped to one alternative of a gate
+SCOPED_FLAGS = ((re.IGNORECASE, 'i'), (re.MULTILINE, 'm'), (re.DOTALL, 's'))
+
+
+def normalize_whitespace(text):
+    """Collapse whitespace runs to one space and strip the ends"""
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+class Rule:
+    """One formatting rule: a guard and a rewrite (regex substitutions or a function)"""
+
+    def __init__(self, name, rewrite, guard=None, flags=0):
+        self.name = name
+        if callable(rewrite):
+            self.steps = [rewrite]
+        else:
+            self.steps = [partial(re.compile(pattern, flags).sub, replacement) for pattern, replacement in rewrite]
+        # Regex source equivalent to the guard, for the gate of a RuleSet
+        self.guard_pattern = None
+        if guard is None:
+            self.guard = None
+        elif isinstance(guard, str):
+            self.guard = lambda text, needle=guard: needle in text
+            self.guard_pattern = re.escape(guard)
+        elif isinstance(guard, re.Pattern):
+            self.guard = guard.search
+            flags = ''.join(letter for flag, letter in SCOPED_FLAGS if guard.flags & flag)
+            self.guard_pattern = f'(?{flags}:{guard.pattern})' if flags else f'(?:{guard.pattern})'
+        else:
+            self.guard = guard
+
+
+class RuleSet:
+    """Rules applied in order to one segment of problem text"""
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.checks = 0
+        self.rewrites = 0
+        patterns = [rule.guard_pattern for rule in self.rules]
+        self.gate = re.compile('|'.join(patterns)) if patterns and None not in patterns else None
+
+    def apply(self, text):
+        """Run every rule whose guard passes; identical to running all of them"""
+        if self.gate is not None:
+            self.checks += 1
+            if not self.gate.search(text):
+                return text
+        for rule in self.rules:
+            if rule.guard is not None:
+                self.checks += 1
+                if not rule.guard(text):
+                    continue
+            for step in rule.steps:
+                text = step(text)
+            self.rewrites += len(rule.steps)
+        return text
+
+    __call__ = apply
+
+    def reset_counts(self):
+        self.checks = self.rewrites = 0
+
+
+# The last rule of both stages: skipped for text already at its fixpoint
+NORMALIZE_WHITESPACE = Rule('normalize-whitespace', normalize_whitespace, guard=UNNORMALIZED_WHITESPACE)
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Keyword search index over problem files
+=======================================
+
+The app can only filter problems by category and difficulty. For keyword
+search it loads an index that the pipeline writes next to every output,
+so a query never scans the problem text:
+
+- `ids`: problem IDs in file order; a problem's position is its number
+- `terms`: every indexed term, sorted, so the terms starting with a prefix
+  are one contiguous range found by binary search
+- `postings`: for each term, the numbers of the problems containing it,
+  delta-encoded (the first number, then the gap to each next one)
+- `stopwords`: words left out of the index, which queries skip as well
+
+Terms are the lowercase words of the SEARCH_SETTINGS fields plus the names
+of the LaTeX commands in them, so `\\int` is found by "int" and `\\lambda`
+by "lambda". A query matches the problems that contain, for every query
+word, some term starting with it; results are in file order. A query
+without words (empty, or only punctuation) is no search at all and
+matches every problem, like an empty search box in the app.
+
+`SearchIndex` answers the same queries in Python. The app's copy of the
+query code is src/services/searchIndex.js; keep the two in step.
+"""
+
+import json
+import re
+from bisect import bisect_left
+from pathlib import Path
+
+from pipeline_writer import AtomicFile
+
+INDEX_VERSION = 1
+# Index of a directory output (shards, bundle); next to a file it is <stem>_search.json
+INDEX_NAME = 'search.json'
+
+LATEX_COMMAND = re.compile(r'\\([A-Za-z]+)')
+WORD = re.compile(r'[^\W_]+')
+
+
+def tokenize(text, settings):
+    """Index terms of text: LaTeX command names, then lowercase words"""
+    text = str(text)
+    commands = [name.lower() for name in LATEX_COMMAND.findall(text)]
+    ignored = set(settings['ignored_commands'])
+    words = WORD.findall(LATEX_COMMAND.sub(' ', text).lower())
+    stopwords = set(settings['stopwords'])
+    return ([name for name in commands if name not in ignored and len(name) >= settings['min_length']]
+            + [word for word in words if word not in stopwords and len(word) >= settings['min_length']])
+
+
+def query_terms(query, stopwords):
+    """Prefixes a query is matched with
+
+    A backslash is optional ("\\frac" and "frac" are the same query).
+    Stopwords are skipped, except the last word: it may be the start of a
+    longer word still being typed ("in" for "integral").
+    """
+    words = WORD.findall(str(query).lower())
+    return [word for position, word in enumerate(words)
+            if word not in stopwords or position == len(words) - 1]
+
+
+def delta_encode(numbers):
+    return [number - previous for number, previous in zip(numbers, [0] + numbers[:-1])]
+
+
+def delta_decode(gaps):
+    numbers = []
+    total = 0
+    for gap in gaps:
+        total += gap
+        numbers.append(total)
+    return numbers
+
+
+def search_index_path(output, output_format):
+    """Where the index of an output file or directory is written"""
+    output = Path(output)
+    if output_format in ('shards', 'bundle'):
+        return output / INDEX_NAME
+    return output.with_name(output.stem + '_search.json')
+
+
+class SearchIndexBuilder:
+    """Collects the terms of problems as they are written; write() saves the index"""
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.ids = []
+        # Problem numbers per term, in ascending order
+        self.postings = {}
+
+    def add(self, problem):
+        number = len(self.ids)
+        self.ids.append(problem.get('id'))
+        terms = set()
+        for field in self.settings['fields']:
+            if problem.get(field) is not None:
+                terms.update(tokenize(problem[field], self.settings))
+        for term in terms:
+            self.postings.setdefault(term, []).append(number)
+
+    def iter_added(self, problems):
+        """Pass problems through, indexing each one"""
+        for problem in problems:
+            self.add(problem)
+            yield problem
+
+    def as_dict(self):
+        terms = sorted(self.postings)
+        return {
+            'version': INDEX_VERSION,
+            'ids': self.ids,
+            'stopwords': sorted(self.settings['stopwords']),
+            'terms': terms,
+            'postings': [delta_encode(self.postings[term]) for term in terms],
+        }
+
+    def write(self, path):
+        """Write the index compactly; returns False when the file was unchanged"""
+        with AtomicFile(path) as out:
+            out.write(json.dumps(self.as_dict(), ensure_ascii=False, separators=(',', ':')))
+            return out.commit()
+
+
+class SearchIndex:
+    """Queries over a written search index"""
+
+    def __init__(self, data):
+        if data.get('version') != INDEX_VERSION:
+            raise ValueError(f"Unsupported search index version {data.get('version')} (expected {INDEX_VERSION})")
+        self.ids = data['ids']
+        self.terms = data['terms']
+        self.stopwords = set(data['stopwords'])
+        self.encoded = data['postings']
+        # Decoded posting lists, filled as terms are queried
+        self.decoded = {}
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    @classmethod
+    def build(cls, problems, settings):
+        """Index problems in memory without writing a file"""
+        builder = SearchIndexBuilder(settings)
+        for problem in problems:
+            builder.add(problem)
+        return cls(builder.as_dict())
+
+    def postings(self, position):
+        if position not in self.decoded:
+            self.decoded[position] = delta_decode(self.encoded[position])
+        return self.decoded[position]
+
+    def prefix_terms(self, prefix):
+        """Positions in `terms` of the terms starting with prefix"""
+        start = end = bisect_left(self.terms, prefix)
+        while end < len(self.terms) and self.terms[end].startswith(prefix):
+            end += 1
+        return range(start, end)
+
+    def matching(self, prefix):
+        """Numbers of the problems with a term starting with prefix"""
+        numbers = set()
+        for position in self.prefix_terms(prefix):
+            numbers.update(self.postings(position))
+        return numbers
+
+    def search(self, query, limit=None):
+        """IDs of the problems matching every word of query, in file order
+
+        A query without words matches every problem.
+        """
+        numbers = None
+        # Narrowest prefixes first, so the intersection shrinks early
+        for prefix in sorted(set(query_terms(query, self.stopwords)), key=len, reverse=True):
+            matched = self.matching(prefix)
+            numbers = matched if numbers is None else numbers & matched
+            if not numbers:
+                return []
+        if numbers is None:
+            return self.ids[:limit]
+        return [self.ids[number] for number in sorted(numbers)[:limit]]
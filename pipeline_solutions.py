@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Hint and solution precomputation for the PDF to JSON pipeline
+=============================================================
+
+The app asks an LLM for a hint or a step-by-step solution each time a
+student clicks for one, so every click waits on the API and the same
+problem is paid for again and again. This stage requests both for every
+problem of a problem file ahead of time and stores them on the problems
+as `hint` and `solution`; the app shows those without a request.
+
+- Requests run on asyncio with at most `concurrency` in flight
+- Rate limits (429), server errors and network failures are retried with
+  exponential backoff and jitter, honoring `Retry-After`
+- The endpoint is any chat completions URL (`--endpoint`), so a local
+  stub server can stand in for the real API
+- Responses are kept in `.pipeline_cache/solutions.sqlite3` under a hash
+  of the problem text and of the request (model, prompts and limits), so
+  a rerun only sends requests for new or edited problems. Failed requests
+  are not cached, and a rerun retries them
+
+Usage:
+    python3 pipeline_solutions.py src/data/mathProblems.json [--concurrency 8] [--endpoint URL]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from pipeline_config import CACHE_SETTINGS, EXPORT_SETTINGS, LOGGING_CONFIG, OUTPUT_SETTINGS, SOLUTION_SETTINGS
+from pipeline_logging import ProgressMeter, configure_logging, logger
+from pipeline_writer import detect_format, iter_problems, write_problems
+
+CACHE_FILENAME = 'solutions.sqlite3'
+
+# (system prompt, user prompt template) of each kind, as used by src/services/llmService.js
+PROMPTS = {
+    'hint': (
+        'You are a helpful math tutor. Provide a brief, encouraging hint to help students solve the problem '
+        'without giving away the complete solution. Focus on the first step or key concept they should '
+        'consider. Keep it to 1-2 sentences maximum.',
+        "Please provide a helpful hint for this math problem (don't solve it completely): {problem}",
+    ),
+    'solution': (
+        '''You are an expert math tutor. Provide clear, comprehensive step-by-step solutions to math problems.
+
+IMPORTANT FORMATTING RULES:
+- Use "**Solution:**" as a main heading
+- Break down the solution into numbered steps like "Step 1:", "Step 2:", etc.
+- Use "**Answer:**" or "**Final Answer:**" for the conclusion
+- For ALL mathematical expressions, wrap them in simple dollar signs: $expression$
+- Do NOT use \\( \\) or \\[ \\] delimiters - only use $...$
+- Use standard LaTeX: $\\pi$, $\\int$, $x^2$, $\\frac{a}{b}$, $\\sqrt{x}$, $\\leq$, $\\geq$
+- Write mathematical expressions simply and clearly
+- If there are multiple choice options, clearly identify which option is correct
+
+Examples of CORRECT formatting:
+- Pi: $\\pi$
+- Integrals: $\\int_0^1 f(x) dx$
+- Fractions: $\\frac{\\pi}{2}$, $\\frac{1}{4}$
+- Functions: $y = \\frac{1}{2}\\sin^2(x^2)$
+- Exponents: $x^2$, $[f(y)]^2$
+- Bounds: $0 \\leq x \\leq \\sqrt{\\pi}$
+- Volume: $V = \\pi \\int_a^b [f(y)]^2 dy$
+
+Make sure ALL mathematical content uses ONLY $...$ delimiters, no other LaTeX delimiters.''',
+        'Please solve this calculus problem step by step with clear explanations. Use ONLY $...$ for math '
+        'formatting, no \\( \\) delimiters: {problem}',
+    ),
+}
+KINDS = tuple(PROMPTS)
+
+# Statuses worth retrying: timeouts, rate limits and server errors
+RETRY_STATUSES = frozenset((408, 425, 429, 500, 502, 503, 504))
+
+
+class CompletionError(Exception):
+    """A failed completion request; retryable ones are retried with backoff"""
+
+    def __init__(self, message, retryable=False, retry_after=None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def request_fingerprint(kind, settings):
+    """Short hash of everything besides the problem text that shapes a response"""
+    encoded = json.dumps([kind, settings['model'], PROMPTS[kind], settings['max_tokens'][kind],
+                          settings['temperature']])
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()[:16]
+
+
+class SolutionCache:
+    """Persistent store of generated hints and solutions
+
+    Entries are keyed by (problem text hash, kind, request fingerprint).
+    Responses cost money, so they are committed as they arrive and never
+    evicted.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(self.directory / CACHE_FILENAME, timeout=30)
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS solutions (
+                text_hash TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                content TEXT NOT NULL,
+                created REAL NOT NULL,
+                PRIMARY KEY (text_hash, kind, fingerprint)
+            );
+        ''')
+
+    def get(self, text_hash, kind, fingerprint):
+        row = self.db.execute(
+            'SELECT content FROM solutions WHERE text_hash = ? AND kind = ? AND fingerprint = ?',
+            (text_hash, kind, fingerprint)
+        ).fetchone()
+        return row[0] if row else None
+
+    def put(self, text_hash, kind, fingerprint, content):
+        with self.db:
+            self.db.execute('INSERT OR REPLACE INTO solutions VALUES (?, ?, ?, ?, ?)',
+                            (text_hash, kind, fingerprint, content, time.time()))
+
+    def close(self):
+        self.db.close()
+
+
+class CompletionClient:
+    """Chat completions client with bounded concurrency and retries
+
+    Requests are sent with urllib on a thread pool sized to the concurrency
+    limit, so no HTTP library beyond the standard library is needed.
+    """
+
+    def __init__(self, endpoint, api_key, settings, concurrency):
+        self.endpoint = endpoint
+        self.api_key = api_key
+        self.settings = settings
+        self.concurrency = concurrency
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+        self.semaphore = None
+        self.requests = 0
+        self.retries = 0
+
+    def close(self):
+        self.executor.shutdown()
+
+    def post(self, payload):
+        """Send one request and return the completion text (blocking)"""
+        headers = {'Content-Type': 'application/json'}
+        if self.api_key:
+            headers['Authorization'] = f"Bearer {self.api_key}"
+        request = urllib.request.Request(self.endpoint, json.dumps(payload).encode('utf-8'), headers)
+        try:
+            with urllib.request.urlopen(request, timeout=self.settings['timeout_seconds']) as response:
+                data = json.load(response)
+        except urllib.error.HTTPError as e:
+            retry_after = e.headers.get('Retry-After')
+            raise CompletionError(f"API error {e.code}: {e.reason}", e.code in RETRY_STATUSES,
+                                  float(retry_after) if retry_after and retry_after.isdigit() else None)
+        except (urllib.error.URLError, TimeoutError, ConnectionError) as e:
+            raise CompletionError(f"Request failed: {e}", retryable=True)
+        except json.JSONDecodeError as e:
+            raise CompletionError(f"Invalid response from API: {e}", retryable=True)
+
+        try:
+            return data['choices'][0]['message']['content']
+        except (KeyError, IndexError, TypeError):
+            raise CompletionError('Invalid response format from API')
+
+    async def complete(self, kind, problem_text):
+        """The hint or solution for a problem, retried with exponential backoff"""
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+        system_prompt, user_prompt = PROMPTS[kind]
+        payload = {
+            'model': self.settings['model'],
+            'messages': [
+                {'role': 'system', 'content': system_prompt},
+                {'role': 'user', 'content': user_prompt.format(problem=problem_text)},
+            ],
+            'max_tokens': self.settings['max_tokens'][kind],
+            'temperature': self.settings['temperature'],
+        }
+
+        loop = asyncio.get_running_loop()
+        async with self.semaphore:
+            for attempt in range(self.settings['retries'] + 1):
+                self.requests += 1
+                try:
+                    return await loop.run_in_executor(self.executor, self.post, payload)
+                except CompletionError as e:
+                    if not e.retryable or attempt == self.settings['retries']:
+                        raise
+                    # The slot is kept while backing off, which also slows the other requests down
+                    delay = e.retry_after
+                    if delay is None:
+                        delay = min(self.settings['max_backoff_seconds'],
+                                    self.settings['backoff_seconds'] * 2 ** attempt) * random.uniform(0.5, 1)
+                    logger.debug("Retrying %s request in %.1fs: %s", kind, delay, e)
+                    self.retries += 1
+                    await asyncio.sleep(delay)
+
+
+async def precompute(problems, cache, client, kinds=KINDS, settings=SOLUTION_SETTINGS, progress=None):
+    """Fill in each problem's hint and solution, requesting only those not cached
+
+    Problems with the same text share one request per kind. A problem whose
+    request fails loses any stale value for that kind. Returns counts of
+    cached, requested and failed entries.
+    """
+    fingerprints = {kind: request_fingerprint(kind, settings) for kind in kinds}
+    stats = {'cached': 0, 'requested': 0, 'failed': 0}
+    pending = {}
+    for problem in problems:
+        digest = text_hash(problem['problem'])
+        for kind in kinds:
+            content = cache.get(digest, kind, fingerprints[kind])
+            if content is not None:
+                problem[kind] = content
+                stats['cached'] += 1
+            else:
+                pending.setdefault((digest, kind), []).append(problem)
+
+    async def fetch(digest, kind, waiting):
+        try:
+            content = await client.complete(kind, waiting[0]['problem'])
+        except CompletionError as e:
+            logger.warning("Could not generate %s for problem %s: %s", kind, waiting[0].get('id'), e)
+            stats['failed'] += 1
+            for problem in waiting:
+                problem.pop(kind, None)
+        else:
+            cache.put(digest, kind, fingerprints[kind], content)
+            stats['requested'] += 1
+            for problem in waiting:
+                problem[kind] = content
+        if progress is not None:
+            progress.update()
+
+    await asyncio.gather(*(fetch(digest, kind, waiting) for (digest, kind), waiting in pending.items()))
+    return stats
+
+
+def main():
+    """Command line interface for hint and solution precomputation"""
+    parser = argparse.ArgumentParser(
+        description="Precompute hints and solutions for every problem of a problem file",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python3 pipeline_solutions.py src/data/mathProblems.json
+  python3 pipeline_solutions.py output.json --kinds hint --concurrency 8
+  python3 pipeline_solutions.py output.json --endpoint http://127.0.0.1:8000/chat/completions
+        """
+    )
+    parser.add_argument('problems_file', help='Problem file (json, ndjson or a shard directory), updated in place')
+    parser.add_argument('--output', help='Write the problems here instead of updating problems_file')
+    parser.add_argument('--kinds', default=','.join(KINDS),
+                       help=f"Comma-separated kinds to precompute (default: {','.join(KINDS)})")
+    parser.add_argument('--endpoint', default=SOLUTION_SETTINGS['endpoint'],
+                       help='Chat completions URL (default: SOLUTION_SETTINGS endpoint)')
+    parser.add_argument('--concurrency', type=int, default=SOLUTION_SETTINGS['concurrency'],
+                       help=f"Requests in flight at once (default: {SOLUTION_SETTINGS['concurrency']})")
+    parser.add_argument('--dry-run', action='store_true',
+                       help='Only report how many requests a run would send')
+    parser.add_argument('--quiet', '-q', action='store_true',
+                       help='Only log warnings and errors')
+    parser.add_argument('--verbose', '-v', action='store_true',
+                       help='Also log every retry')
+
+    args = parser.parse_args()
+    configure_logging(LOGGING_CONFIG, args.quiet, args.verbose)
+
+    kinds = [kind.strip() for kind in args.kinds.split(',') if kind.strip()]
+    unknown = [kind for kind in kinds if kind not in PROMPTS]
+    if unknown:
+        logger.error("Error: unknown kinds %s (expected %s)", ', '.join(unknown), ', '.join(KINDS))
+        return 1
+    if not Path(args.problems_file).exists():
+        logger.error("Error: problem file '%s' does not exist", args.problems_file)
+        return 1
+
+    problems = list(iter_problems(args.problems_file))
+    cache = SolutionCache(CACHE_SETTINGS['directory'])
+    try:
+        if args.dry_run:
+            fingerprints = {kind: request_fingerprint(kind, SOLUTION_SETTINGS) for kind in kinds}
+            missing = {(text_hash(problem['problem']), kind) for problem in problems for kind in kinds
+                       if cache.get(text_hash(problem['problem']), kind, fingerprints[kind]) is None}
+            logger.info("%d problems: %d requests needed for %s", len(problems), len(missing), ', '.join(kinds))
+            return 0
+
+        api_key = next((os.environ[name] for name in SOLUTION_SETTINGS['api_key_env'] if os.environ.get(name)), None)
+        if not api_key and args.endpoint == SOLUTION_SETTINGS['endpoint']:
+            logger.error("Error: set %s to call %s", ' or '.join(SOLUTION_SETTINGS['api_key_env']), args.endpoint)
+            return 1
+
+        client = CompletionClient(args.endpoint, api_key, SOLUTION_SETTINGS, max(1, args.concurrency))
+        progress = ProgressMeter("Requesting", None, 'requests', LOGGING_CONFIG.get('progress_interval', 2.0),
+                                 LOGGING_CONFIG.get('show_progress', True))
+        started = time.perf_counter()
+        try:
+            stats = asyncio.run(precompute(problems, cache, client, kinds, SOLUTION_SETTINGS, progress))
+        finally:
+            client.close()
+        progress.finish()
+    finally:
+        cache.close()
+
+    output = args.output or args.problems_file
+    result = write_problems(problems, output, EXPORT_SETTINGS, detect_format(output),
+                            OUTPUT_SETTINGS['shard_max_kb'] * 1024)
+    logger.info("💡 %d problems: %d cached, %d generated, %d failed (%d requests, %d retries) in %.1fs",
+                len(problems), stats['cached'], stats['requested'], stats['failed'],
+                client.requests, client.retries, time.perf_counter() - started)
+    logger.info("💾 Output (%s): %s", output, result.describe())
+    return 0 if not stats['failed'] else 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Watch mode for the PDF to JSON pipeline (--watch)
+=================================================
+
+`PipelineWatcher` keeps one process resident: pdfplumber stays imported,
+the caches stay open, and each PDF's problem texts and figures stay in
+memory. It polls the PDF and pipeline_config.py and, when either changes,
+runs the pipeline again, redoing only the stages the change affects:
+
+- PDF edited: every stage (unchanged pages still come from the page cache)
+- PDF_EXTRACT_SETTINGS or FIGURE_SETTINGS edited: text extraction or figure
+  rendering respectively
+- Any other config edit: the config module is reloaded and a new extractor
+  compiles the rules; problem texts come from memory and the format cache
+  reuses every problem the edit does not touch
+
+A config file that fails to import is logged and the previous settings stay
+in effect until the next save. Polling uses file modification times only,
+so no extra dependency is needed.
+"""
+
+import importlib
+import sys
+import time
+from pathlib import Path
+
+import pipeline_config
+from pipeline_cache import settings_fingerprint
+from pipeline_logging import logger
+
+
+def file_signature(path):
+    """(mtime, size) of path, or None while it does not exist"""
+    try:
+        stat = Path(path).stat()
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def reload_config():
+    """Reload pipeline_config and rebind the names other pipeline modules imported from it
+
+    Only modules next to pipeline_config.py are updated, and only names still
+    bound to the old module's objects.
+    """
+    old = {name: value for name, value in vars(pipeline_config).items() if not name.startswith('__')}
+    importlib.reload(pipeline_config)
+    root = Path(pipeline_config.__file__).resolve().parent
+    for module in list(sys.modules.values()):
+        module_file = getattr(module, '__file__', None)
+        if module is pipeline_config or not module_file or Path(module_file).resolve().parent != root:
+            continue
+        for name, value in old.items():
+            if getattr(module, name, None) is value and hasattr(pipeline_config, name):
+                setattr(module, name, getattr(pipeline_config, name))
+
+
+class PipelineWatcher:
+    """Re-runs the pipeline for one PDF whenever the PDF or pipeline_config.py changes"""
+
+    def __init__(self, make_extractor, run, pdf_path):
+        # make_extractor() builds an extractor from the current config and
+        # run(extractor) processes the PDF with it, returning success
+        self.make_extractor = make_extractor
+        self.run = run
+        self.pdf_path = pdf_path
+        self.config_path = Path(pipeline_config.__file__)
+        self.problem_texts = None
+        self.problem_texts_key = None
+        self.figures = None
+        self.figures_key = None
+
+    def watch_settings(self):
+        # Read on every poll so edits to WATCH_SETTINGS apply after a reload
+        return pipeline_config.WATCH_SETTINGS
+
+    def signatures(self):
+        return {path: file_signature(path) for path in (self.pdf_path, self.config_path)}
+
+    def instrument(self, extractor):
+        """Serve extraction and figure rendering from memory while their inputs are unchanged"""
+        extract_problem_texts = extractor.extract_problem_texts
+        extract_figures = extractor.extract_figures
+
+        def cached_problem_texts(pdf_path, start_problem=1, end_problem=None, workers=1):
+            key = (file_signature(pdf_path), settings_fingerprint(pipeline_config.PDF_EXTRACT_SETTINGS),
+                   start_problem, end_problem)
+            if key == self.problem_texts_key:
+                logger.info("Reusing %d problem texts from memory", len(self.problem_texts))
+                return list(self.problem_texts)
+            problem_texts = extract_problem_texts(pdf_path, start_problem, end_problem, workers)
+            if problem_texts is not None:
+                self.problem_texts, self.problem_texts_key = problem_texts, key
+            return problem_texts
+
+        def cached_figures(pdf_path, start_problem=1, end_problem=None, workers=1):
+            key = (file_signature(pdf_path), settings_fingerprint(pipeline_config.FIGURE_SETTINGS),
+                   start_problem, end_problem)
+            if key == self.figures_key:
+                logger.info("Reusing figures of %d problems from memory", len(self.figures))
+                extractor.figures = self.figures
+                return
+            extract_figures(pdf_path, start_problem, end_problem, workers)
+            self.figures, self.figures_key = extractor.figures, key
+
+        extractor.extract_problem_texts = cached_problem_texts
+        extractor.extract_figures = cached_figures
+        return extractor
+
+    def rebuild(self, reason):
+        """Run the pipeline once with a fresh extractor; returns its success"""
+        started = time.perf_counter()
+        extractor = self.instrument(self.make_extractor())
+        if extractor.format_cache is not None:
+            extractor.format_cache.reused = extractor.format_cache.rebuilt = 0
+        try:
+            success = self.run(extractor)
+        except Exception as e:
+            logger.error("Error in pipeline run: %s", e)
+            success = False
+        # Persist this run's work in case the watcher is stopped
+        if extractor.format_cache is not None:
+            extractor.format_cache.flush()
+        if extractor.katex_renderer is not None and extractor.katex_renderer.cache is not None:
+            extractor.katex_renderer.cache.flush()
+        logger.info("🔁 %s in %.2fs (%s)", "Rebuilt" if success else "Rebuild failed",
+                    time.perf_counter() - started, reason)
+        return success
+
+    def wait_for_change(self, signatures):
+        """Block until a watched file changes and stays unchanged for the debounce interval"""
+        while True:
+            time.sleep(self.watch_settings()['poll_interval'])
+            current = self.signatures()
+            if current == signatures:
+                continue
+            # Editors often write in several steps; wait for the last one
+            while True:
+                time.sleep(self.watch_settings()['debounce'])
+                settled = self.signatures()
+                if settled == current:
+                    return current
+                current = settled
+
+    def serve(self):
+        """Run once, then re-run on every change until interrupted"""
+        signatures = self.signatures()
+        self.rebuild("initial run")
+        logger.info("👀 Watching %s and %s (Ctrl+C to stop)", self.pdf_path, self.config_path.name)
+        try:
+            while True:
+                current = self.wait_for_change(signatures)
+                changed = [path for path in current if current[path] != signatures[path]]
+                signatures = current
+                if self.config_path in changed:
+                    try:
+                        reload_config()
+                    except Exception as e:
+                        logger.error("Error reloading %s, keeping previous settings: %s", self.config_path.name, e)
+                        continue
+                if current[self.pdf_path] is None:
+                    logger.warning("%s is missing; waiting for it to reappear", self.pdf_path)
+                    continue
+                self.rebuild(', '.join(Path(path).name for path in changed) + ' changed')
+        except KeyboardInterrupt:
+            logger.info("Stopped watching")
@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""
+Streaming output writers for the PDF to JSON pipeline
+=====================================================
+
+Problems are serialized one at a time, so the full serialized corpus is
+never held in memory. Four output formats are supported:
+
+- `json`: one JSON array, formatted with EXPORT_SETTINGS (the default)
+- `ndjson`: one compact JSON object per line
+- `shards`: a directory of JSON arrays (`problems-00000.json`, ...), each
+  capped at a configurable size
+- `bundle`: a directory the app can load lazily. It holds one JSON array
+  per category and difficulty (split at the size cap), named after a hash
+  of its content (`calculus--hard.3f2a9c1e4b5d.json`) so it can be cached
+  forever, with a gzip copy next to each. `manifest.json` lists every
+  shard's category, difficulty, problem count, IDs and file names
+
+Every file is written to a temporary file next to its target and moved into
+place with an atomic rename, so readers never see a half-written file. When
+the new content is identical to the file on disk the target is left
+untouched; in shard mode only the shards whose contents changed are
+rewritten, and shards left over from a larger previous run are removed.
+In bundle mode unchanged shards keep their name, and files no longer in
+the manifest are removed.
+
+`iter_problems` reads any of the formats back. A bundle is grouped by
+category, so it is read whole and returned in id order (`id_key`).
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import tempfile
+from pathlib import Path
+
+from pipeline_merge import id_key
+
+OUTPUT_FORMATS = ('json', 'ndjson', 'shards', 'bundle')
+SHARD_PREFIX = 'problems-'
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+# Hex digits of the content hash in bundle file names
+BUNDLE_HASH_LENGTH = 12
+BUNDLE_FILE = re.compile(r'^[a-z0-9-]+\.[0-9a-f]{%d}\.json(?:\.gz)?$' % BUNDLE_HASH_LENGTH)
+
+
+class WriteResult:
+    """What a write touched on disk"""
+
+    def __init__(self):
+        self.problems = 0
+        self.written = []
+        self.unchanged = []
+        self.removed = []
+
+    def describe(self):
+        return (f"{len(self.written)} files written, {len(self.unchanged)} unchanged"
+                + (f", {len(self.removed)} removed" if self.removed else ''))
+
+
+class AtomicFile:
+    """Text file written to a temp file and renamed over the target on commit
+
+    The content is hashed as it is written; commit() keeps the existing
+    target (and its modification time) when the content is unchanged.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, self.temp_path = tempfile.mkstemp(prefix=f".{self.path.name}.", suffix='.tmp', dir=self.path.parent)
+        self.file = os.fdopen(fd, 'w', encoding='utf-8', newline='')
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def write(self, text):
+        data = text.encode('utf-8')
+        self.digest.update(data)
+        self.size += len(data)
+        self.file.write(text)
+
+    def unchanged(self):
+        """True when the target already holds exactly this content"""
+        try:
+            if self.path.stat().st_size != self.size:
+                return False
+        except OSError:
+            return False
+        digest = hashlib.sha256()
+        with open(self.path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        return digest.digest() == self.digest.digest()
+
+    def commit(self):
+        """Move the temp file into place; returns False when the target was unchanged"""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        if self.unchanged():
+            os.unlink(self.temp_path)
+            return False
+        # mkstemp creates the file private; give it the target's (or the default) mode
+        try:
+            mode = self.path.stat().st_mode & 0o777
+        except OSError:
+            umask = os.umask(0)
+            os.umask(umask)
+            mode = 0o666 & ~umask
+        os.chmod(self.temp_path, mode)
+        os.replace(self.temp_path, self.path)
+        return True
+
+    def discard(self):
+        self.file.close()
+        if os.path.exists(self.temp_path):
+            os.unlink(self.temp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.discard()
+        return False
+
+
+class HashedFile(AtomicFile):
+    """AtomicFile named after its content: `<stem>.<hash>.json`
+
+    The name is only known once everything is written, so the temp file is
+    created under `<stem>.json` and commit() picks the final name.
+    """
+
+    def __init__(self, directory, stem):
+        super().__init__(Path(directory) / f"{stem}.json")
+        self.stem = stem
+
+    def commit(self):
+        self.path = self.path.with_name(f"{self.stem}.{self.digest.hexdigest()[:BUNDLE_HASH_LENGTH]}.json")
+        return super().commit()
+
+
+def json_array_piece(encoded, first, indent):
+    """One element of a JSON array written like json.dump with this indent"""
+    if indent is None:
+        return ('[' if first else ', ') + encoded
+    prefix = ' ' * indent if indent else ''
+    return ('[\n' if first else ',\n') + prefix + encoded.replace('\n', '\n' + prefix)
+
+
+def json_array_end(count, indent):
+    if count == 0:
+        return '[]'
+    return ']' if indent is None else '\n]'
+
+
+def iter_json_array(problems, export_settings):
+    """Pieces of a JSON array identical to json.dump(problems, **export_settings)"""
+    indent = export_settings.get('indent')
+    count = 0
+    for problem in problems:
+        yield json_array_piece(json.dumps(problem, **export_settings), count == 0, indent)
+        count += 1
+    yield json_array_end(count, indent)
+
+
+def ndjson_settings(export_settings):
+    """EXPORT_SETTINGS without indentation, for one object per line"""
+    return {key: value for key, value in export_settings.items() if key not in ('indent', 'separators')}
+
+
+def _write_single(problems, path, export_settings, output_format, result):
+    """Write a json or ndjson file through one AtomicFile"""
+    with AtomicFile(path) as out:
+        if output_format == 'ndjson':
+            settings = ndjson_settings(export_settings)
+            for problem in problems:
+                out.write(json.dumps(problem, **settings) + '\n')
+                result.problems += 1
+        else:
+            def counted():
+                for problem in problems:
+                    result.problems += 1
+                    yield problem
+
+            for piece in iter_json_array(counted(), export_settings):
+                out.write(piece)
+        (result.written if out.commit() else result.unchanged).append(str(path))
+
+
+def shard_path(directory, index):
+    return Path(directory) / f"{SHARD_PREFIX}{index:05d}.json"
+
+
+def _write_shards(problems, directory, export_settings, max_bytes, result):
+    """Write size-capped JSON array shards, rewriting only the changed ones"""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    def flush(index, shard_problems):
+        with AtomicFile(shard_path(directory, index)) as out:
+            for piece in iter_json_array(shard_problems, export_settings):
+                out.write(piece)
+            (result.written if out.commit() else result.unchanged).append(str(out.path))
+
+    # Problems are kept as dicts until their shard is full; each one's share
+    # of the file is its serialized length plus indentation and separator
+    indent = export_settings.get('indent') or 0
+    index = 0
+    shard = []
+    shard_bytes = 2
+    for problem in problems:
+        encoded = json.dumps(problem, **export_settings)
+        size = len(encoded.encode('utf-8')) + (encoded.count('\n') + 1) * indent + 2
+        if shard and shard_bytes + size > max_bytes:
+            flush(index, shard)
+            index += 1
+            shard = []
+            shard_bytes = 2
+        shard.append(problem)
+        shard_bytes += size
+        result.problems += 1
+    if shard or index == 0:
+        flush(index, shard)
+        index += 1
+
+    # Remove shards left over from a previous, larger output
+    for stale in sorted(directory.glob(f"{SHARD_PREFIX}*.json")):
+        suffix = stale.stem[len(SHARD_PREFIX):]
+        if suffix.isdigit() and int(suffix) >= index:
+            stale.unlink()
+            result.removed.append(str(stale))
+
+
+def slugify(name):
+    return re.sub(r'[^a-z0-9]+', '-', str(name).lower()).strip('-') or 'unknown'
+
+
+def bundle_stem(category, difficulty):
+    """File name stem of a bundle shard, e.g. 'abstract-algebra--hard'"""
+    return f"{slugify(category)}--{slugify(difficulty)}"
+
+
+def write_gzip_copy(path, result):
+    """Write path + '.gz' unless an identical copy exists; returns the copy's size
+
+    The copy is deterministic (no name or timestamp in the header), so an
+    unchanged shard always has the same gzip bytes.
+    """
+    gz_path = path.with_name(path.name + '.gz')
+    if gz_path.exists():
+        result.unchanged.append(str(gz_path))
+        return gz_path.stat().st_size
+    fd, temp_path = tempfile.mkstemp(prefix=f".{gz_path.name}.", suffix='.tmp', dir=path.parent)
+    try:
+        with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(filename='', mode='wb', fileobj=raw, mtime=0) as out, \
+                open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                out.write(chunk)
+        os.chmod(temp_path, path.stat().st_mode & 0o777)
+        os.replace(temp_path, gz_path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    result.written.append(str(gz_path))
+    return gz_path.stat().st_size
+
+
+def _write_bundle(problems, directory, export_settings, max_bytes, result):
+    """Write content-hashed category/difficulty shards, their gzip copies and the manifest
+
+    Each group's shard is streamed to its own temp file, so only the IDs of
+    the problems are kept in memory.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    indent = export_settings.get('indent')
+    open_shards = {}
+    shards = []
+
+    def finish(shard):
+        out = shard['file']
+        out.write(json_array_end(len(shard['ids']), indent))
+        (result.written if out.commit() else result.unchanged).append(str(out.path))
+        shards.append({
+            'category': shard['category'],
+            'difficulty': shard['difficulty'],
+            'part': shard['part'],
+            'count': len(shard['ids']),
+            'ids': shard['ids'],
+            'file': out.path.name,
+            'bytes': out.size,
+            'gzip': out.path.name + '.gz',
+            'gzip_bytes': write_gzip_copy(out.path, result),
+        })
+
+    def start(key, part):
+        stem = bundle_stem(*key) + (f"-{part}" if part else '')
+        shard = open_shards[key] = {'category': key[0], 'difficulty': key[1], 'part': part,
+                                    'file': HashedFile(directory, stem), 'ids': []}
+        return shard
+
+    try:
+        for problem in problems:
+            key = (problem.get('category', 'Unknown'), problem.get('difficulty', 'Unknown'))
+            encoded = json.dumps(problem, **export_settings)
+            size = len(encoded.encode('utf-8')) + (encoded.count('\n') + 1) * (indent or 0) + 2
+            shard = open_shards.get(key)
+            if shard is None:
+                shard = start(key, 0)
+            elif max_bytes and shard['file'].size + size > max_bytes:
+                finish(open_shards.pop(key))
+                shard = start(key, shard['part'] + 1)
+            shard['file'].write(json_array_piece(encoded, not shard['ids'], indent))
+            shard['ids'].append(problem.get('id'))
+            result.problems += 1
+        for key in list(open_shards):
+            finish(open_shards.pop(key))
+    finally:
+        for shard in open_shards.values():
+            shard['file'].discard()
+
+    shards.sort(key=lambda shard: (str(shard['category']), str(shard['difficulty']), shard['part']))
+    counts = {}
+    for field in ('category', 'difficulty'):
+        counts[field] = {}
+        for shard in shards:
+            counts[field][shard[field]] = counts[field].get(shard[field], 0) + shard['count']
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'total': result.problems,
+        'categories': dict(sorted(counts['category'].items())),
+        'difficulties': dict(sorted(counts['difficulty'].items())),
+        'shards': shards,
+    }
+    with AtomicFile(directory / MANIFEST_NAME) as out:
+        # Compact: the app fetches the manifest before any shard
+        out.write(json.dumps(manifest, ensure_ascii=export_settings.get('ensure_ascii', True), separators=(',', ':')))
+        (result.written if out.commit() else result.unchanged).append(str(out.path))
+
+    # Remove shards of a previous output that the manifest no longer lists
+    current = {name for shard in shards for name in (shard['file'], shard['gzip'])}
+    for stale in sorted(directory.iterdir()):
+        if BUNDLE_FILE.match(stale.name) and stale.name not in current:
+            stale.unlink()
+            result.removed.append(str(stale))
+
+
+def write_problems(problems, path, export_settings, output_format='json', shard_max_bytes=None):
+    """Stream problems (any iterable) to path in the given format; returns a WriteResult
+
+    For `shards` and `bundle`, path is the output directory.
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format '{output_format}' (expected one of {', '.join(OUTPUT_FORMATS)})")
+
+    result = WriteResult()
+    if output_format == 'shards':
+        _write_shards(problems, path, export_settings, shard_max_bytes, result)
+    elif output_format == 'bundle':
+        _write_bundle(problems, path, export_settings, shard_max_bytes, result)
+    else:
+        _write_single(problems, path, export_settings, output_format, result)
+    return result
+
+
+def detect_format(path):
+    """Output format of an existing problem file or shard directory"""
+    path = Path(path)
+    if path.is_dir():
+        return 'bundle' if (path / MANIFEST_NAME).exists() else 'shards'
+    if path.suffix in ('.ndjson', '.jsonl'):
+        return 'ndjson'
+    return 'json'
+
+
+def iter_problems(path):
+    """Yield the problems stored at path in any of the output formats
+
+    Files and shards are read in the order they were written; a bundle is
+    stored by category and difficulty, so its problems are sorted by id.
+    """
+    output_format = detect_format(path)
+    if output_format == 'bundle':
+        with open(Path(path) / MANIFEST_NAME, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        problems = []
+        for shard in manifest['shards']:
+            with open(Path(path) / shard['file'], 'r', encoding='utf-8') as f:
+                problems.extend(json.load(f))
+        yield from sorted(problems, key=id_key)
+    elif output_format == 'shards':
+        for shard in sorted(Path(path).glob(f"{SHARD_PREFIX}*.json")):
+            with open(shard, 'r', encoding='utf-8') as f:
+                yield from json.load(f)
+    elif output_format == 'ndjson':
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            yield from json.load(f)
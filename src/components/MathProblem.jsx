@@ -1,6 +1,8 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useMemo } from 'react';
 import { generateSolution, generateHint } from '../services/llmService';
+import { createSearchIndex } from '../services/searchIndex';
 import mathProblems from '../data/mathProblems.json';
+import mathProblemsSearch from '../data/mathProblems_search.json';
 import 'katex/dist/katex.min.css';
 import { InlineMath, BlockMath } from 'react-katex';
 import './MathProblem.css';
@@ -9,6 +11,7 @@ const MathProblem = () => {
   const [currentProblemIndex, setCurrentProblemIndex] = useState(0);
   const [selectedCategory, setSelectedCategory] = useState('All');
   const [selectedDifficulty, setSelectedDifficulty] = useState('All');
+  const [searchQuery, setSearchQuery] = useState('');
   const [solution, setSolution] = useState('');
   const [hint, setHint] = useState('');
   const [loading, setLoading] = useState(false);
@@ -54,11 +57,16 @@ const MathProblem = () => {
   const uniqueDifficulties = [...new Set(mathProblems.map(problem => problem.difficulty))].sort();
   const difficulties = ['All', ...uniqueDifficulties];
   
-  // Filter problems based on selected category and difficulty
+  // Keyword search through the pipeline's prebuilt index; null (every problem) when the box is empty
+  const searchIndex = useMemo(() => createSearchIndex(mathProblemsSearch), []);
+  const searchMatches = useMemo(() => searchIndex.search(searchQuery), [searchIndex, searchQuery]);
+
+  // Filter problems based on selected category, difficulty and search
   const filteredProblems = mathProblems.filter(problem => {
     const categoryMatch = selectedCategory === 'All' || problem.category === selectedCategory;
     const difficultyMatch = selectedDifficulty === 'All' || problem.difficulty === selectedDifficulty;
-    return categoryMatch && difficultyMatch;
+    const searchMatch = searchMatches === null || searchMatches.has(problem.id);
+    return categoryMatch && difficultyMatch && searchMatch;
   });
 
   const currentProblem = filteredProblems[currentProblemIndex];
@@ -75,7 +83,7 @@ const MathProblem = () => {
     setSelectedAnswer('');
     setShowAnswerFeedback(false);
     setAnswerSubmitted(false);
-  }, [selectedCategory, selectedDifficulty]);
+  }, [selectedCategory, selectedDifficulty, searchQuery]);
 
   // Reset answer state when problem changes
   useEffect(() => {
@@ -103,7 +111,10 @@ const MathProblem = () => {
     }
   };
 
-  // Function to render text with LaTeX math
+  // Function to render text with LaTeX math.
+  // Coupled to app_math_text in pipeline_katex.py, which repeats the steps up
+  // to the split on $ to find the keys of currentProblem.katex; change both
+  // together (tests/test_katex.py runs these steps against it)
   const renderMathText = (text) => {
     if (!text) return null;
     
@@ -189,6 +200,11 @@ const MathProblem = () => {
         // Remove the $ delimiters and render as math
         const mathContent = part.slice(1, -1).trim();
         if (mathContent) {
+          // Markup pre-rendered by pipeline_katex.py needs no KaTeX work in the browser
+          const prerendered = currentProblem?.katex?.[mathContent];
+          if (typeof prerendered === 'string') {
+            return <span key={index} dangerouslySetInnerHTML={{ __html: prerendered }} />;
+          }
           try {
             return <InlineMath key={index} math={mathContent} />;
           } catch (error) {
@@ -222,7 +238,8 @@ const MathProblem = () => {
     setError('');
     
     try {
-      const generatedSolution = await generateSolution(currentProblem.problem);
+      // Solutions precomputed by pipeline_solutions.py need no API call
+      const generatedSolution = currentProblem.solution || await generateSolution(currentProblem.problem);
       setSolution(generatedSolution);
       setShowSolution(true);
     } catch (err) {
@@ -244,7 +261,7 @@ const MathProblem = () => {
     setHintError('');
     
     try {
-      const generatedHint = await generateHint(currentProblem.problem);
+      const generatedHint = currentProblem.hint || await generateHint(currentProblem.problem);
       setHint(generatedHint);
       setShowHint(true);
     } catch (err) {
@@ -262,6 +279,10 @@ const MathProblem = () => {
     setSelectedDifficulty(event.target.value);
   };
 
+  const handleSearchChange = (event) => {
+    setSearchQuery(event.target.value);
+  };
+
   const handleNextProblem = () => {
     const nextIndex = (currentProblemIndex + 1) % filteredProblems.length;
     setCurrentProblemIndex(nextIndex);
@@ -343,51 +364,91 @@ const MathProblem = () => {
     }).filter(Boolean);
   };
 
-  return (
-    <div className="math-problem-container">
-      <div className="header">
+  // Filter dropdowns and search box, also shown when nothing matches
+  const filters = (
+    <div className="filter-container">
+      <div className="filter-group">
+        <label htmlFor="category-filter" className="filter-label">
+          Category:
+        </label>
+        <select 
+          id="category-filter"
+          value={selectedCategory} 
+          onChange={handleCategoryChange}
+          className="category-dropdown"
+        >
+          {categories.map(category => (
+            <option key={category} value={category}>
+              {category}
+              {category !== 'All' && ` (${mathProblems.filter(p => p.category === category).length})`}
+            </option>
+          ))}
+        </select>
       </div>
 
-      {/* Filter Dropdowns */}
-      <div className="filter-container">
-        <div className="filter-group">
-          <label htmlFor="category-filter" className="filter-label">
-            Category:
-          </label>
-          <select 
-            id="category-filter"
-            value={selectedCategory} 
-            onChange={handleCategoryChange}
-            className="category-dropdown"
-          >
-            {categories.map(category => (
-              <option key={category} value={category}>
-                {category}
-                {category !== 'All' && ` (${mathProblems.filter(p => p.category === category).length})`}
-              </option>
-            ))}
-          </select>
+      <div className="filter-group">
+        <label htmlFor="difficulty-filter" className="filter-label">
+            Difficulty:
+        </label>
+        <select 
+          id="difficulty-filter"
+          value={selectedDifficulty} 
+          onChange={handleDifficultyChange}
+          className="category-dropdown"
+        >
+          {difficulties.map(difficulty => (
+            <option key={difficulty} value={difficulty}>
+              {difficulty}
+              {difficulty !== 'All' && ` (${mathProblems.filter(p => p.difficulty === difficulty).length})`}
+            </option>
+          ))}
+        </select>
+      </div>
+
+      <div className="filter-group">
+        <label htmlFor="problem-search" className="filter-label">
+          Search:
+        </label>
+        <input
+          id="problem-search"
+          type="search"
+          value={searchQuery}
+          onChange={handleSearchChange}
+          placeholder="e.g. eigenvalue, integral, \frac"
+          className="search-input"
+        />
+      </div>
+    </div>
+  );
+
+  if (!currentProblem) {
+    return (
+      <div className="math-problem-container">
+        <div className="header">
         </div>
 
-        <div className="filter-group">
-          <label htmlFor="difficulty-filter" className="filter-label">
-              Difficulty:
-          </label>
-          <select 
-            id="difficulty-filter"
-            value={selectedDifficulty} 
-            onChange={handleDifficultyChange}
-            className="category-dropdown"
-          >
-            {difficulties.map(difficulty => (
-              <option key={difficulty} value={difficulty}>
-                {difficulty}
-                {difficulty !== 'All' && ` (${mathProblems.filter(p => p.difficulty === difficulty).length})`}
-              </option>
-            ))}
-          </select>
+        {filters}
+
+        <div className="problem-card no-results">
+          No problems match "{searchQuery}"
+          {selectedCategory !== 'All' && ` in ${selectedCategory}`}
+          {selectedDifficulty !== 'All' && ` (${selectedDifficulty})`}.
+        </div>
+
+        <div className="footer">
+          <p>Built with React & AI • Math Tutor Platform</p>
         </div>
       </div>
+    );
+  }
+
+  return (
+    <div className="math-problem-container">
+      <div className="header">
+      </div>
+
+      {/* Filter Dropdowns */}
+      {filters}
 
       <div className="problem-card">
         <div className="problem-header">
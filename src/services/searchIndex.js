@@ -0,0 +1,59 @@
+// Keyword search over the index the pipeline writes next to each problem file
+// (pipeline_search.py). Keep the query rules in step with SearchIndex there.
+
+const WORD = /[\p{L}\p{N}]+/gu;
+
+// Prefixes a query is matched with: its lowercase words, without stopwords
+// except the last word, which may still be being typed ("in" for "integral")
+export const queryTerms = (query, stopwords) => {
+  const words = query.toLowerCase().match(WORD) || [];
+  return words.filter((word, position) => !stopwords.has(word) || position === words.length - 1);
+};
+
+export const createSearchIndex = (data) => {
+  const { ids, terms, postings } = data;
+  const stopwords = new Set(data.stopwords);
+  // Posting lists are delta-encoded; decode each one the first time it is needed
+  const decoded = new Map();
+
+  const postingsAt = (position) => {
+    if (!decoded.has(position)) {
+      let total = 0;
+      decoded.set(position, postings[position].map(gap => (total += gap)));
+    }
+    return decoded.get(position);
+  };
+
+  // Terms are sorted, so the ones starting with prefix form one range
+  const matching = (prefix) => {
+    let low = 0;
+    let high = terms.length;
+    while (low < high) {
+      const middle = (low + high) >> 1;
+      if (terms[middle] < prefix) low = middle + 1;
+      else high = middle;
+    }
+    const numbers = new Set();
+    for (let position = low; position < terms.length && terms[position].startsWith(prefix); position++) {
+      postingsAt(position).forEach(number => numbers.add(number));
+    }
+    return numbers;
+  };
+
+  // Set of the ids of the problems matching every word of the query. A query
+  // without words matches every problem, as in SearchIndex.search; that is
+  // returned as null rather than a set of every id, so callers skip the filter
+  const search = (query) => {
+    const prefixes = [...new Set(queryTerms(query, stopwords))].sort((a, b) => b.length - a.length);
+    if (prefixes.length === 0) return null;
+    let numbers = null;
+    for (const prefix of prefixes) {
+      const matched = matching(prefix);
+      numbers = numbers === null ? matched : new Set([...numbers].filter(number => matched.has(number)));
+      if (numbers.size === 0) break;
+    }
+    return new Set([...numbers].map(number => ids[number]));
+  };
+
+  return { search };
+};
@@ -0,0 +1,14 @@
+from pdf_to_json_pipeline import PDFMathProblemExtractor, build_parser, process_pdf_source
+
+
+def test_a_failed_pdf_reports_its_exception_and_traceback(monkeypatch):
+    def broken(self, pdf_path, workers=1):
+        raise ValueError(f"unreadable xref in {pdf_path}")
+        yield
+
+    monkeypatch.setattr(PDFMathProblemExtractor, 'iter_text_chunks', broken)
+    args = build_parser().parse_args(['extract', 'root', 'corpus.json', '--batch'])
+    result = process_pdf_source('root/course/broken.pdf', args, use_cache=False)
+    assert result['error'] == "ValueError: unreadable xref in root/course/broken.pdf"
+    assert result['traceback'].startswith('Traceback') and 'in broken' in result['traceback']
+    assert result['problems'] == [] and result['seconds'] is not None
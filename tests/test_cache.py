@@ -0,0 +1,139 @@
+import itertools
+
+import pytest
+
+import pipeline_cache
+from pdf_to_json_pipeline import PDFMathProblemExtractor, split_page_indices
+from pipeline_cache import CachedPages, PageTextCache, file_sha256, settings_fingerprint
+
+PDF_HASH = 'a' * 64
+SETTINGS = settings_fingerprint({'extract_text': {'x_tolerance': 3}})
+
+
+class Clock:
+    """Stand-in for the time module whose time() advances by one per call"""
+
+    def __init__(self):
+        self.ticks = itertools.count(1)
+
+    def time(self):
+        return float(next(self.ticks))
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    # Distinct timestamps, so the least recently used page is well defined
+    monkeypatch.setattr(pipeline_cache, 'time', Clock())
+    cache = PageTextCache(tmp_path, 1 << 20)
+    yield cache
+    cache.close()
+
+
+def test_pages_are_keyed_by_pdf_and_settings(cache, tmp_path):
+    cache.put_pages(PDF_HASH, SETTINGS, {0: 'first', 1: None, 2: 'third'}, page_count=3)
+    assert cache.get_page_count(PDF_HASH, SETTINGS) == 3
+    assert cache.get_pages(PDF_HASH, SETTINGS) == {0: 'first', 1: None, 2: 'third'}
+    assert cache.get_pages(PDF_HASH, SETTINGS, 1, 2) == {1: None, 2: 'third'}
+
+    # A changed PDF or changed extraction settings is a different key
+    pdf = tmp_path / 'input.pdf'
+    pdf.write_bytes(b'%PDF-1.4 one')
+    before = file_sha256(pdf)
+    pdf.write_bytes(b'%PDF-1.4 two')
+    assert file_sha256(pdf) != before
+    changed = settings_fingerprint({'extract_text': {'x_tolerance': 2}})
+    assert changed != SETTINGS
+    for pdf_hash, settings in ((file_sha256(pdf), SETTINGS), (PDF_HASH, changed)):
+        assert cache.get_pages(pdf_hash, settings) == {}
+        assert cache.get_page_count(pdf_hash, settings) is None
+
+
+def test_least_recently_used_pages_are_evicted(cache):
+    cache.max_bytes = 30
+    cache.put_pages('old', SETTINGS, {0: 'x' * 10}, page_count=1)
+    cache.put_pages('used', SETTINGS, {0: 'y' * 10}, page_count=1)
+    cache.get_pages('old', SETTINGS)
+    cache.put_pages('new', SETTINGS, {0: 'z' * 15}, page_count=1)
+
+    # 'used' was read least recently; its document record goes with its page
+    assert cache.get_pages('used', SETTINGS) == {}
+    assert cache.get_page_count('used', SETTINGS) is None
+    assert cache.get_pages('old', SETTINGS) == {0: 'x' * 10}
+    assert cache.get_page_count('new', SETTINGS) == 1
+    assert cache.total_bytes() == 25
+
+
+def test_deferred_eviction_keeps_pages(cache):
+    cache.max_bytes = 10
+    cache.put_pages(PDF_HASH, SETTINGS, {0: 'x' * 10, 1: 'y' * 10}, evict=False)
+    assert len(cache.get_pages(PDF_HASH, SETTINGS)) == 2
+    assert cache.evict() == 1
+    assert cache.total_bytes() == 10
+
+
+def test_cached_pages_read_a_batch_at_a_time(cache, monkeypatch):
+    cache.put_pages(PDF_HASH, SETTINGS, {i: f"page {i}" for i in range(5) if i != 2})
+    ranges = []
+    get_pages = cache.get_pages
+    monkeypatch.setattr(cache, 'get_pages', lambda *key: ranges.append(key[2:]) or get_pages(*key))
+
+    pages = CachedPages(cache, PDF_HASH, SETTINGS, batch_pages=2)
+    assert len(pages) == 4 and 2 not in pages and ranges == []
+    assert [pages.get(i) for i in range(5)] == ['page 0', 'page 1', None, 'page 3', 'page 4']
+    assert ranges == [(0, 1), (3, 4)]
+    with pytest.raises(KeyError):
+        pages[2]
+
+
+def test_split_page_indices_skips_cached_pages():
+    assert split_page_indices([], 4) == []
+    assert split_page_indices(list(range(6)), 2) == [(0, 3), (3, 6)]
+    assert split_page_indices([0, 1, 4, 5, 6, 9], 2) == [(0, 2), (4, 5), (5, 7), (9, 10)]
+    assert split_page_indices([3], 4) == [(3, 4)]
+
+
+class FakePdfExtractor(PDFMathProblemExtractor):
+    """Extractor over a PDF of `pages` pages whose extraction is recorded, not run"""
+
+    def __init__(self, page_cache, pages):
+        super().__init__(page_cache)
+        self.pages = pages
+        self.extracted = []
+
+    def page_cache_key(self, pdf_path):
+        return PDF_HASH, SETTINGS
+
+    def extract_page_texts(self, pdf_path, workers=1, cached=None):
+        cached = cached or {}
+        for i in range(self.pages):
+            if i in cached:
+                yield cached[i]
+            else:
+                self.extracted.append(i)
+                yield f"{i + 1}. Page {i} problem"
+
+
+def run_pages(cache, pages=4):
+    extractor = FakePdfExtractor(cache, pages)
+    texts = list(extractor.iter_page_texts('input.pdf'))
+    return texts, extractor.extracted
+
+
+def test_reruns_are_served_from_the_cache(cache):
+    texts, extracted = run_pages(cache)
+    assert extracted == [0, 1, 2, 3]
+    assert (cache.hits, cache.misses) == (0, 4)
+    assert cache.get_page_count(PDF_HASH, SETTINGS) == 4
+    assert cache.get_problem_index(PDF_HASH, SETTINGS) is not None
+
+    rerun, extracted = run_pages(cache)
+    assert rerun == texts and extracted == []
+    assert (cache.hits, cache.misses) == (4, 4)
+
+    # Once a page is evicted the document is incomplete; only that page is extracted again
+    with cache.db:
+        cache.db.execute('DELETE FROM pages WHERE page_index = 2')
+        cache.db.execute('DELETE FROM documents')
+    rerun, extracted = run_pages(cache)
+    assert rerun == texts and extracted == [2]
+    assert (cache.hits, cache.misses) == (7, 5)
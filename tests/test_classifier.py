@@ -0,0 +1,85 @@
+import json
+import re
+from pathlib import Path
+
+import pytest
+
+import pipeline_classifier
+from pipeline_classifier import KeywordClassifier
+from pipeline_config import CATEGORY_KEYWORDS, COMPLEXITY_INDICATORS
+
+MATH_PROBLEMS = Path(__file__).resolve().parent.parent / 'src' / 'data' / 'mathProblems.json'
+
+TABLE = {
+    'Algebra': ['ring', 'group', 'integer'],
+    'Calculus': ['integral', 'integ', 'limit', 'if and only if'],
+}
+
+
+def problem_texts():
+    with open(MATH_PROBLEMS, encoding='utf-8') as f:
+        return [problem['problem'] for problem in json.load(f)]
+
+
+def reference_scores(table, text):
+    """Label scores counted keyword by keyword: each keyword at each word start"""
+    text = text.lower()
+    scores = [0.0] * len(table)
+    for label_i, keywords in enumerate(table.values()):
+        for keyword in dict.fromkeys(k.lower() for k in keywords):
+            scores[label_i] += len(re.findall(r'(?<!\w)(?=%s)' % re.escape(keyword), text))
+    return scores
+
+
+@pytest.fixture
+def pure_python(monkeypatch):
+    monkeypatch.setattr(pipeline_classifier, 'np', None)
+
+
+def test_keywords_match_only_at_word_starts(pure_python):
+    classifier = KeywordClassifier(TABLE)
+    texts = [
+        'A string is not a ring.',
+        'Integers and (integers) form a Ring',
+        'The integral, integrals and INTEGRATION',
+        'group\0ring',
+        'limit if and only if x',
+        'unlimited xring',
+    ]
+    assert classifier.score(texts) == [reference_scores(TABLE, text) for text in texts]
+    # 'integral' also credits its prefix 'integ'; 'integers' credits 'integer' and 'integ'
+    assert classifier.score(['integral integers']) == [[1.0, 3.0]]
+
+
+def test_rows_stay_aligned_when_lowercasing_changes_length(pure_python):
+    classifier = KeywordClassifier(TABLE)
+    texts = ['İİİİ ring', 'limit', 'İ group limit']
+    assert classifier.score(texts) == [[1.0, 0.0], [0.0, 1.0], [1.0, 1.0]]
+
+
+@pytest.mark.parametrize('table', [CATEGORY_KEYWORDS, COMPLEXITY_INDICATORS], ids=['category', 'difficulty'])
+def test_scores_match_a_keyword_by_keyword_count(table, pure_python):
+    texts = problem_texts()
+    assert KeywordClassifier(table).score(texts) == [reference_scores(table, text) for text in texts]
+
+
+def test_ties_and_defaults(pure_python):
+    classifier = KeywordClassifier(TABLE)
+    assert classifier.classify(['ring limit', 'nothing here', 'ring group limit'], ['D1', 'D2', 'D3']) == [
+        ('Algebra', 0.5), ('D2', 0.0), ('Algebra', 0.667)
+    ]
+
+
+@pytest.mark.parametrize('table', [CATEGORY_KEYWORDS, COMPLEXITY_INDICATORS], ids=['category', 'difficulty'])
+def test_numpy_matches_pure_python(table, monkeypatch):
+    pytest.importorskip('numpy')
+    texts = problem_texts() + ['', 'no keywords at all']
+    defaults = [str(i) for i in range(len(texts))]
+    with_numpy = KeywordClassifier(table)
+    scores = with_numpy.score(texts).tolist()
+    results = with_numpy.classify(texts, defaults)
+
+    monkeypatch.setattr(pipeline_classifier, 'np', None)
+    without_numpy = KeywordClassifier(table)
+    assert scores == without_numpy.score(texts)
+    assert results == without_numpy.classify(texts, defaults)
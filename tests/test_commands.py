@@ -0,0 +1,39 @@
+import json
+import shutil
+from pathlib import Path
+
+import pytest
+
+from pdf_to_json_pipeline import build_extractor, build_parser, main
+
+MATH_PROBLEMS = Path(__file__).resolve().parent.parent / 'src' / 'data' / 'mathProblems.json'
+
+COMMANDS = [
+    ['reformat', '{problems}', '--output', '{output}', '--no-cache'],
+    ['merge', '{problems}', '{problems}', '--output', '{output}'],
+    ['dedup', '{problems}', '--drop', '--output', '{output}', '--report', '{report}'],
+]
+
+
+@pytest.fixture
+def problems(tmp_path):
+    path = tmp_path / 'problems.json'
+    shutil.copy(MATH_PROBLEMS, path)
+    return path
+
+
+@pytest.mark.parametrize('command', COMMANDS, ids=[command[0] for command in COMMANDS])
+@pytest.mark.parametrize('no_search_index', [False, True])
+def test_search_index_follows_the_option(command, no_search_index, problems, tmp_path):
+    output = tmp_path / 'output.json'
+    argv = [arg.format(problems=problems, output=output, report=tmp_path / 'report.json') for arg in command]
+    assert main(argv + ['--quiet'] + (['--no-search-index'] if no_search_index else [])) == 0
+    assert json.loads(output.read_text(encoding='utf-8'))
+    assert (tmp_path / 'output_search.json').exists() != no_search_index
+
+
+@pytest.mark.parametrize('extra', [[], ['--batch'], ['--watch']])
+def test_extractor_takes_the_search_index_option(extra):
+    args = build_parser().parse_args(['extract', 'in.pdf', 'out.json', '--no-search-index', '--sample', '3'] + extra)
+    extractor = build_extractor(args)
+    assert (extractor.search_index, extractor.sample_size) == (False, 3)
@@ -0,0 +1,50 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from pipeline_config import DEDUP_SETTINGS
+from pipeline_dedup import find_duplicates, shingles
+
+ROOT = Path(__file__).resolve().parent.parent
+MATH_PROBLEMS = ROOT / 'src' / 'data' / 'mathProblems.json'
+
+REPORT = """
+import json
+from pipeline_config import DEDUP_SETTINGS
+from pipeline_dedup import find_duplicates, minhash_signature, shingles
+problems = json.load(open({path!r}, encoding='utf-8'))
+problems = problems + [dict(problem, id=f"copy-{{problem.get('id')}}") for problem in problems[::7]]
+hashes = shingles('find the value of x | 1 | 2', DEDUP_SETTINGS['shingle_size'])
+print(json.dumps({{
+    'signature': minhash_signature(hashes, DEDUP_SETTINGS['num_perm']),
+    'clusters': [cluster.as_dict(problems) for cluster in find_duplicates(problems, DEDUP_SETTINGS)],
+}}))
+"""
+
+
+def run_report(hash_seed):
+    env = dict(os.environ, PYTHONHASHSEED=str(hash_seed))
+    result = subprocess.run([sys.executable, '-c', REPORT.format(path=str(MATH_PROBLEMS))], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout)
+
+
+def test_reports_do_not_depend_on_the_hash_seed():
+    first, second = run_report(1), run_report(2)
+    assert first == second
+    assert first['clusters']
+
+
+def test_shingle_hashes_fit_in_64_bits():
+    hashes = shingles('find the value of $x$ such that', DEDUP_SETTINGS['shingle_size'])
+    assert hashes and all(0 <= value < 1 << 64 for value in hashes)
+
+
+def test_copies_are_found():
+    problems = [{'id': 1, 'problem': 'Find the value of $x$ if $2x + 3 = 7$.'},
+                {'id': 2, 'problem': 'Compute the area of a circle of radius $3$.'},
+                {'id': 'b', 'problem': 'Find the value of  x if $2x + 3 = 7$. '}]
+    clusters = [cluster.as_dict(problems) for cluster in find_duplicates(problems, DEDUP_SETTINGS)]
+    assert [(cluster['keep'], [d['id'] for d in cluster['duplicates']]) for cluster in clusters] == [(1, ['b'])]
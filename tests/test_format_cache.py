@@ -0,0 +1,53 @@
+import pdf_to_json_pipeline
+from pdf_to_json_pipeline import PDFMathProblemExtractor
+from pipeline_cache import FormatCache, RuleFingerprint
+from pipeline_config import NOTATION_FIXES, SYMBOL_REPLACEMENTS, UNICODE_ARTIFACTS
+
+TEXTS = [
+    'Show that x ≥ 0 for all real x.',
+    'Find all x with x² ≤ 4 and x ≥ 1.',
+    'Compute the integral of π x from 0 to 1.',
+    'Let α be a root of x^2 + 1 = 0.',
+    'What is 2 + 2?',
+]
+
+
+def fingerprint(symbols):
+    return RuleFingerprint([
+        ('UNICODE_ARTIFACTS', [(artifact, '') for artifact in UNICODE_ARTIFACTS]),
+        ('NOTATION_FIXES', list(NOTATION_FIXES.items())),
+        ('SYMBOL_REPLACEMENTS', list(symbols.items())),
+    ], {'code': 'unchanged'})
+
+
+def test_a_rule_edit_only_changes_the_fingerprints_of_texts_with_its_character():
+    before = fingerprint(SYMBOL_REPLACEMENTS)
+    after = fingerprint(dict(SYMBOL_REPLACEMENTS, **{'≥': '\\geqslant'}))
+    changed = [before.for_text(text) != after.for_text(text) for text in TEXTS]
+    assert changed == ['≥' in text for text in TEXTS]
+
+    # ASCII entries can match any text, so they are part of every fingerprint
+    ascii_edit = fingerprint(dict(SYMBOL_REPLACEMENTS, **{' alpha ': ' \\alpha '}))
+    assert all(before.for_text(text) != ascii_edit.for_text(text) for text in TEXTS)
+
+
+def format_all(cache_dir):
+    cache = FormatCache(cache_dir, 1 << 20)
+    extractor = PDFMathProblemExtractor(format_cache=cache)
+    problems = [extractor.build_problem(i, text, 'Algebra', 'Easy').render()
+                for i, text in enumerate(TEXTS, 1)]
+    cache.close()
+    return problems, (cache.reused, cache.rebuilt)
+
+
+def test_rerun_after_a_rule_edit_rebuilds_only_the_affected_problems(tmp_path, monkeypatch):
+    problems, counts = format_all(tmp_path)
+    assert counts == (0, len(TEXTS))
+    assert format_all(tmp_path) == (problems, (len(TEXTS), 0))
+
+    monkeypatch.setattr(pdf_to_json_pipeline, 'SYMBOL_REPLACEMENTS',
+                        dict(SYMBOL_REPLACEMENTS, **{'≥': '\\geqslant'}))
+    edited, counts = format_all(tmp_path)
+    affected = sum('≥' in text for text in TEXTS)
+    assert counts == (len(TEXTS) - affected, affected)
+    assert ['\\geqslant' in problem for problem in edited] == ['≥' in text for text in TEXTS]
@@ -0,0 +1,71 @@
+import argparse
+
+import pytest
+
+from pipeline_index import PAGE_SEPARATOR, ProblemIndex, parse_problem_range, problem_starts, slice_problems
+
+PAGES = [
+    'Practice exam\n1. What is 2 + 2?\n(A) 3 (B) 4',
+    '(C) 5\n2. Find the derivative of x^2.\n(A) x (B) 2x',
+    None,
+    '3. Evaluate the integral of\ne^x from 0 to 1, where the text\nof problem 3 runs on',
+    'across this page\nand the next one.\n(A) e (B) e - 1',
+    '4. Let A be a 2 x 2 matrix.\n5. Which number is prime? 17. is not a new problem\n(A) 4 (B) 9',
+    '6. The last problem ends the PDF.',
+]
+
+
+def whole_text(pages):
+    """The text the pipeline builds from the pages"""
+    return ''.join(page + PAGE_SEPARATOR for page in pages if page)
+
+
+def build_index(pages):
+    index = ProblemIndex()
+    for page_index, page_text in enumerate(pages):
+        index.add_page(page_index, page_text)
+    return ProblemIndex.from_bytes(index.page_count, index.to_bytes())
+
+
+@pytest.mark.parametrize('start, end, pages', [
+    (1, None, (0, 6)),
+    (1, 1, (0, 1)),
+    (2, 2, (1, 3)),
+    (3, 3, (3, 5)),
+    (3, 4, (3, 5)),
+    (4, 5, (5, 6)),
+    (6, None, (6, 6)),
+])
+def test_problems_sliced_from_their_pages_match_the_whole_text(start, end, pages):
+    index = build_index(PAGES)
+    assert index.page_range(start, end) == pages
+    first, last = pages
+    text = whole_text(PAGES)
+    expected = slice_problems(text, problem_starts(text), start, end)
+    assert index.slice_pages(PAGES[first:last + 1], first, start, end) == expected
+    assert [number for number, _ in expected] == list(range(start, (end or 6) + 1))
+
+
+def test_a_problem_across_a_page_break_keeps_both_parts():
+    index = build_index(PAGES)
+    first, last = index.page_range(3, 3)
+    [(number, problem)] = index.slice_pages(PAGES[first:last + 1], first, 3, 3)
+    assert number == 3
+    assert problem.startswith('3. Evaluate the integral of\n')
+    assert problem.endswith('of problem 3 runs on\n\nacross this page\nand the next one.\n(A) e (B) e - 1\n')
+
+
+def test_nothing_selected():
+    index = build_index(PAGES)
+    assert len(index) == 6
+    assert index.page_range(7) is None
+    assert build_index([None, 'No numbered lines']).page_range() is None
+
+
+def test_parse_problem_range():
+    assert parse_problem_range('5') == (5, 5)
+    assert parse_problem_range(' 3 - 8 ') == (3, 8)
+    assert parse_problem_range('4-') == (4, None)
+    for value in ('8-3', 'x', '-3'):
+        with pytest.raises(argparse.ArgumentTypeError):
+            parse_problem_range(value)
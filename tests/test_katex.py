@@ -0,0 +1,49 @@
+import json
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from pipeline_katex import math_spans, problem_spans
+
+ROOT = Path(__file__).resolve().parent.parent
+# Inputs and the `katex` keys the app looks their spans up by
+CASES = json.loads((Path(__file__).parent / 'data' / 'katex_keys.json').read_text(encoding='utf-8'))
+
+# Runs the cleanup and split steps of renderMathText, cut out of MathProblem.jsx
+# up to where it builds the elements, on each input
+RENDER_MATH_TEXT_SCRIPT = r'''
+const fs = require('fs');
+const source = fs.readFileSync(process.argv[1], 'utf8');
+const start = source.indexOf('    let processedText = text;');
+const end = source.indexOf('    return parts.map(', start);
+if (start < 0 || end < 0) throw new Error('renderMathText steps not found');
+const keys = new Function('text', source.slice(start, end) + `
+    return parts.filter(part => part.startsWith('$') && part.endsWith('$') && part.length > 2)
+      .map(part => part.slice(1, -1).trim()).filter(Boolean);`);
+const texts = JSON.parse(fs.readFileSync(0, 'utf8'));
+process.stdout.write(JSON.stringify(texts.map(keys)));
+'''
+
+
+@pytest.mark.parametrize('case', CASES, ids=lambda case: case['text'][:30])
+def test_spans_are_the_keys_the_app_looks_up(case):
+    assert math_spans(case['text']) == case['keys']
+
+
+def test_solutions_are_split_by_line():
+    problem = {'problem': 'Find $x$.', 'hint': 'Try $x = 1$', 'solution': '## Step 1: $a\n + b$\n- $c$'}
+    # A span cannot continue on the next line, so "$a" and "+ b$" are text
+    assert problem_spans(problem) == ['x', 'x = 1', 'c']
+
+
+def test_keys_match_the_app():
+    # Compare against the app itself, so an edit to either copy of the steps fails here
+    node = shutil.which('node')
+    if node is None:
+        pytest.skip('Node.js is not installed')
+    texts = [case['text'] for case in CASES]
+    result = subprocess.run([node, '-e', RENDER_MATH_TEXT_SCRIPT, str(ROOT / 'src' / 'components' / 'MathProblem.jsx')],
+                            input=json.dumps(texts), capture_output=True, text=True, encoding='utf-8', check=True)
+    assert json.loads(result.stdout) == [case['keys'] for case in CASES]
@@ -0,0 +1,43 @@
+import json
+import time
+from pathlib import Path
+
+from pipeline_benchmark import build_math_corpus, malformed_math
+from pipeline_math import wrap_math_spans
+
+# Tokenizer output for every problem of mathProblems.json without its dollar signs
+EXPECTED = json.loads((Path(__file__).parent / 'data' / 'math_spans.json').read_text())
+
+
+def test_math_problems_wrap_as_recorded():
+    corpus = build_math_corpus()
+    assert corpus == [case['text'] for case in EXPECTED]
+    for case in EXPECTED:
+        assert wrap_math_spans(case['text']) == case['wrapped']
+
+
+def test_math_problems_wrap_into_renderable_spans():
+    for case in EXPECTED:
+        assert not malformed_math(case['wrapped']), case['wrapped']
+
+
+def test_unmatched_braces_are_scanned_once():
+    text = '\\frac{' * 20000 + ' x'
+    started = time.perf_counter()
+    assert wrap_math_spans(text) == text
+    assert time.perf_counter() - started < 1.0
+
+
+def test_spans_inside_brace_groups_take_in_the_term():
+    assert wrap_math_spans('\\sum_{n=0}^{\\infty} a_n') == '$\\sum_{n=0}^{\\infty}$ a_n'
+    assert wrap_math_spans('(a_n)_{n=1}^{\\infty}, f(x)^{\\alpha}') == '$(a_n)_{n=1}^{\\infty}$, $f(x)^{\\alpha}$'
+    assert wrap_math_spans('1 + 2e^{i\\theta}') == '1 + $2e^{i\\theta}$'
+    # Nothing is wrapped inside a group that never closes; a stray '}' is ignored
+    assert wrap_math_spans('{\\pi and \\theta') == '{\\pi and \\theta'
+    assert wrap_math_spans('a } \\pi') == 'a } $\\pi$'
+
+
+def test_malformed_math_checks_the_depth_of_each_span():
+    assert malformed_math('e^{i$\\theta$}')
+    assert malformed_math('{ $\\pi$')
+    assert not malformed_math('$e^{i\\theta}$ } $\\pi$ \\{x\\}')
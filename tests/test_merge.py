@@ -0,0 +1,90 @@
+import pytest
+
+from pipeline_config import MERGE_SETTINGS
+from pipeline_merge import id_key, merge_problem_sets
+
+PRESERVE = MERGE_SETTINGS['preserve_fields']
+
+
+def problem(problem_id, text, **fields):
+    return dict({'id': problem_id, 'problem': text, 'category': 'Algebra'}, **fields)
+
+
+def existing_set():
+    return [
+        problem(2, 'Two', correctAnswer='B'),
+        problem(1, 'One'),
+        problem('x-1', 'Batch one'),
+        problem(3, 'Three', choices=['hand', 'edited']),
+    ]
+
+
+def merge(new, policy):
+    return merge_problem_sets(existing_set(), new, policy, PRESERVE)
+
+
+def ids(problems):
+    return [p['id'] for p in problems]
+
+
+def test_keep_existing_keeps_the_existing_problem():
+    merged, stats = merge([problem(2, 'Two, re-read'), problem(4, 'Four')], 'keep-existing')
+    assert ids(merged) == [1, 2, 3, 4, 'x-1']
+    assert merged[1] == problem(2, 'Two', correctAnswer='B')
+    assert stats.as_dict() == {'inserted': 1, 'updated': 0, 'unchanged': 1, 'conflicts': 1, 'renumbered': 0}
+
+
+def test_overwrite_keeps_preserved_fields():
+    new = [problem(2, 'Two, re-read', correctAnswer='C', category='Analysis'),
+           problem(3, 'Three', choices=['from', 'pdf'], difficulty='Hard')]
+    merged, stats = merge(new, 'overwrite')
+    assert merged[1] == problem(2, 'Two, re-read', correctAnswer='B', category='Analysis')
+    assert merged[2] == problem(3, 'Three', choices=['hand', 'edited'], difficulty='Hard')
+    assert stats.as_dict() == {'inserted': 0, 'updated': 2, 'unchanged': 0, 'conflicts': 2, 'renumbered': 0}
+
+
+def test_matching_problems_are_not_conflicts():
+    # Preserved fields that differ do not count, since overwrite would keep them anyway
+    new = [problem(1, 'One'), problem(2, 'Two', correctAnswer='D')]
+    for policy in ('keep-existing', 'overwrite', 'keep-both'):
+        merged, stats = merge(new, policy)
+        assert merged == sorted(existing_set(), key=id_key)
+        assert (stats.unchanged, stats.conflicts) == (2, 0)
+
+
+def test_keep_both_renumbers_before_string_ids():
+    merged, stats = merge([problem(2, 'Two, re-read'), problem('x-1', 'Batch one, re-read')], 'keep-both')
+    assert ids(merged) == [1, 2, 3, 4, 5, 'x-1']
+    assert merged[3] == problem(4, 'Two, re-read')
+    assert merged[4] == problem(5, 'Batch one, re-read')
+    assert stats.renumbered == [(2, 4), ('x-1', 5)]
+    assert stats.as_dict() == {'inserted': 2, 'updated': 0, 'unchanged': 0, 'conflicts': 2, 'renumbered': 2}
+
+
+def test_keep_both_after_float_ids_and_without_numeric_ids():
+    merged, _ = merge_problem_sets([problem(1, 'One'), problem(2.5, 'Half')], [problem(1, 'Uno')], 'keep-both')
+    assert ids(merged) == [1, 2.5, 3]
+    merged, _ = merge_problem_sets([problem('a', 'A')], [problem('a', 'B')], 'keep-both')
+    assert ids(merged) == [1, 'a']
+
+
+@pytest.mark.parametrize('policy, expected', [
+    ('keep-existing', [problem(4, 'first')]),
+    ('overwrite', [problem(4, 'third')]),
+    ('keep-both', [problem(4, 'first'), problem(5, 'second'), problem(6, 'third')]),
+])
+def test_duplicate_ids_within_the_new_set(policy, expected):
+    merged, stats = merge([problem(4, 'first'), problem(4, 'second'), problem(4, 'third')], policy)
+    assert merged[3:-1] == expected
+    assert ids(merged) == [1, 2, 3] + ids(expected) + ['x-1']
+    assert stats.inserted == len(expected)
+
+
+def test_unsorted_mixed_input_is_merged_in_id_order():
+    merged, _ = merge([problem('a-2', 'A'), problem(10, 'Ten'), problem('a-1', 'A')], 'keep-existing')
+    assert ids(merged) == [1, 2, 3, 10, 'a-1', 'a-2', 'x-1']
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError, match='keep-both'):
+        merge([], 'replace')
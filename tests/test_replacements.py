@@ -0,0 +1,34 @@
+import random
+
+import pytest
+
+from pipeline_config import NOTATION_FIXES, SYMBOL_REPLACEMENTS, UNICODE_ARTIFACTS
+from pipeline_replacements import ReplacementTable, apply_sequentially
+
+MIXED_TABLES = [
+    [('cid:1', 'A'), ('cid:é', 'B')],
+    [('é', 'e')] + [(chr(ord('a') + i), chr(ord('A') + i)) for i in range(16)],
+    [(chr(ord('a') + i), chr(ord('A') + i)) for i in range(8)] + [('é', 'e')] + [('≤', '<=')] * 8,
+    [(' p', ' P'), (' pé', ' PE'), ('≥', 'p')],
+]
+
+
+@pytest.mark.parametrize('table', MIXED_TABLES)
+def test_mixed_ascii_tables_match_sequential_replacement(table):
+    compiled = ReplacementTable(table)
+    alphabet = sorted({char for old, new in table for char in old + new} | {' ', 'x'})
+    rng = random.Random(0)
+    texts = ['x cid:1 y', 'abc é', ' p ≥ pé'] + [
+        ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 24))) for _ in range(2000)
+    ]
+    for text in texts:
+        assert compiled.apply(text) == apply_sequentially(table, text), repr(text)
+
+
+def test_config_tables_match_sequential_replacement():
+    texts = ['∫ 0 1 f(x) dx ≤ 2 cid:3 ', 'plain ascii text', '']
+    for table in ([(artifact, '') for artifact in UNICODE_ARTIFACTS], NOTATION_FIXES, SYMBOL_REPLACEMENTS):
+        items = list(table.items()) if isinstance(table, dict) else list(table)
+        compiled = ReplacementTable(items)
+        for text in texts + [old for old, _ in items]:
+            assert compiled.apply(text) == apply_sequentially(items, text)
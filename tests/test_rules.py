@@ -0,0 +1,92 @@
+import json
+import re
+from pathlib import Path
+
+import pytest
+
+from pdf_to_json_pipeline import PDFMathProblemExtractor
+from pipeline_rules import NORMALIZE_WHITESPACE, Rule, RuleSet
+
+MATH_PROBLEMS = Path(__file__).resolve().parent.parent / 'src' / 'data' / 'mathProblems.json'
+
+# Segments that each trigger a different rule, or none
+EDGE_CASES = [
+    '', ' ', 'Already normal text.', 'Let$x$denote a root then$y$', 'Choices:  Choices: (A) 1',
+    ' leading', 'trailing ', 'two  spaces', 'a\ttab', 'a\nnewline', 'no\u00a0break', 'em\u2003space',
+    'GRE Practice Book Page 12 Find x ≥ 0', 'If 1 £ n £ 5, \\\\frac{1}{2}', '\\int 0 f(x) dx and \\int\\infty',
+    'Copyright 2023 x² + y² = 1', 'Let $ x $ and $ y $ be reals, with α ≤ β',
+]
+
+
+def run_every_rule(rule_set, text):
+    """Reference: every rewrite of the set, one after another, with no guards or gate"""
+    for rule in rule_set.rules:
+        for step in rule.steps:
+            text = step(text)
+    return text
+
+
+def segments():
+    with open(MATH_PROBLEMS, encoding='utf-8') as f:
+        problems = [problem['problem'] for problem in json.load(f)]
+    # Exported problems as they are, and with line breaks and trailing spaces as in raw PDF text
+    return EDGE_CASES + problems + [text.replace(' ', '\n', 3) + '  ' for text in problems]
+
+
+@pytest.fixture(scope='module')
+def extractor():
+    return PDFMathProblemExtractor()
+
+
+@pytest.mark.parametrize('stage', ['format_rules', 'final_rules'])
+def test_guarded_rules_match_running_every_rule(extractor, stage):
+    rule_set = getattr(extractor, stage)
+    for text in segments():
+        assert rule_set.apply(text) == run_every_rule(rule_set, text), text
+
+
+def test_both_stages_match_running_every_rule(extractor):
+    for text in segments():
+        formatted = extractor.apply_formatting_fixes(text)
+        assert formatted == run_every_rule(extractor.format_rules, text)
+        assert extractor.apply_final_validation_fixes(formatted) == run_every_rule(extractor.final_rules, formatted)
+
+
+def test_the_gate_returns_fixpoints_after_one_check(extractor):
+    final_rules = extractor.final_rules
+    assert final_rules.gate is not None
+    for text in ['Already normal text.', 'Let $x$ denote a root', '']:
+        final_rules.reset_counts()
+        assert final_rules.apply(text) == text
+        assert (final_rules.checks, final_rules.rewrites) == (1, 0)
+    # Whitespace alone opens the gate, through the guard of NORMALIZE_WHITESPACE
+    for text in [' x', 'x ', 'a  b', 'a\tb', 'a b']:
+        assert final_rules.gate.search(text)
+        assert final_rules.apply(text) == re.sub(r'\s+', ' ', text).strip()
+
+
+def test_normalize_whitespace_runs_on_whitespace_added_by_earlier_rules():
+    # The input is normalized, so only the rewrite before it makes the last rule apply
+    rule_set = RuleSet([Rule('pad', [('x', '  x\t')], guard='x'), NORMALIZE_WHITESPACE])
+    assert rule_set.gate is not None
+    for text in ['axb', 'x', 'a b', 'axb ', '']:
+        assert rule_set.apply(text) == run_every_rule(rule_set, text)
+    assert rule_set.apply('axb') == 'a x b'
+
+    # A rule without a pattern guard leaves the set ungated, with the same results
+    ungated = RuleSet([Rule('pad', lambda text: text.replace('x', '  x\t')), NORMALIZE_WHITESPACE])
+    assert ungated.gate is None
+    assert [ungated.apply(text) for text in ['axb', 'x', 'a b']] == ['a x b', 'x', 'a b']
+
+
+def test_scoped_flags_in_the_gate():
+    # An IGNORECASE guard must not make the other guards of the gate ignore case
+    rule_set = RuleSet([
+        Rule('page', [('(?i)page', '')], guard=re.compile('page', re.IGNORECASE)),
+        Rule('choices', [('Choices:', 'Options:')], guard='Choices:'),
+    ])
+    assert rule_set.apply('PAGE 2') == ' 2'
+    assert rule_set.apply('CHOICES:') == 'CHOICES:'
+    rule_set.reset_counts()
+    rule_set.apply('CHOICES:')
+    assert (rule_set.checks, rule_set.rewrites) == (1, 0)
@@ -0,0 +1,37 @@
+from pipeline_config import SEARCH_SETTINGS
+from pipeline_search import SearchIndex
+
+PROBLEMS = [
+    {'id': 1, 'problem': 'Evaluate $\\int_0^1 x^2 dx$.', 'category': 'Calculus'},
+    {'id': 2, 'problem': 'Find the eigenvalues of $A$.', 'category': 'Linear Algebra'},
+    {'id': 'x-1', 'problem': 'Is the integral of $e^x$ finite?', 'category': 'Calculus'},
+]
+
+
+def build():
+    return SearchIndex.build(PROBLEMS, SEARCH_SETTINGS)
+
+
+def test_words_match_as_prefixes_in_file_order():
+    index = build()
+    assert index.search('int') == [1, 'x-1']
+    assert index.search('\\int calculus') == [1, 'x-1']
+    assert index.search('integ') == ['x-1']
+    assert index.search('eigen algebra') == [2]
+    assert index.search('eigen calculus') == []
+    assert index.search('calc', limit=1) == [1]
+
+
+def test_stopwords_are_skipped_except_the_last_word():
+    index = build()
+    assert index.search('the eigenvalues') == [2]
+    # "in" may be the start of "integral"
+    assert index.search('in') == [1, 'x-1']
+
+
+def test_a_query_without_words_matches_every_problem():
+    # The same meaning as the app's search box (src/services/searchIndex.js)
+    index = build()
+    for query in ('', '   ', '?!', '\\'):
+        assert index.search(query) == [1, 2, 'x-1']
+    assert index.search('', limit=2) == [1, 2]
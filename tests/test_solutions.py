@@ -0,0 +1,124 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from pipeline_config import SOLUTION_SETTINGS
+from pipeline_solutions import CompletionClient, SolutionCache, precompute
+
+SETTINGS = dict(SOLUTION_SETTINGS, retries=3, backoff_seconds=0.01, max_backoff_seconds=0.02, timeout_seconds=5)
+
+
+class StubServer:
+    """Chat completions stub on localhost that answers with the user prompt
+
+    `failures` is a list of (status, Retry-After or None) answered, in
+    order, before any successful response.
+    """
+
+    def __init__(self, failures=()):
+        self.failures = list(failures)
+        self.prompts = []
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                with stub.lock:
+                    stub.prompts.append(payload['messages'][1]['content'])
+                    failure = stub.failures.pop(0) if stub.failures else None
+                if failure is not None:
+                    status, retry_after = failure
+                    self.send_response(status)
+                    if retry_after is not None:
+                        self.send_header('Retry-After', retry_after)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                body = json.dumps({'choices': [{'message': {'content': stub.prompts[-1]}}]}).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.endpoint = f"http://127.0.0.1:{self.server.server_address[1]}/chat/completions"
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def run(problems, cache, server, settings=SETTINGS, concurrency=2):
+    """precompute against the stub; returns (stats, client)"""
+    client = CompletionClient(server.endpoint, None, settings, concurrency)
+    try:
+        return asyncio.run(precompute(problems, cache, client, settings=settings)), client
+    finally:
+        client.close()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = SolutionCache(tmp_path)
+    yield cache
+    cache.close()
+
+
+def problem_set():
+    return [{'id': 1, 'problem': 'Find $x$.'}, {'id': 2, 'problem': 'Find $y$.'}, {'id': 3, 'problem': 'Find $x$.'}]
+
+
+def test_retries_share_duplicates_and_reuse_the_cache(cache):
+    problems = problem_set()
+    with StubServer([(429, '0'), (503, None)]) as server:
+        stats, client = run(problems, cache, server)
+        # Two distinct texts, a hint and a solution each, plus the two failed attempts
+        assert len(server.prompts) == 6
+        assert (client.requests, client.retries) == (6, 2)
+        assert stats == {'cached': 0, 'requested': 4, 'failed': 0}
+        assert problems[0]['hint'] == problems[2]['hint'] != problems[1]['hint']
+        assert all(problem['solution'] for problem in problems)
+
+        rerun = problem_set()
+        stats, client = run(rerun, cache, server)
+        assert len(server.prompts) == 6
+        assert client.requests == 0
+        assert stats == {'cached': 6, 'requested': 0, 'failed': 0}
+        assert rerun == problems
+
+
+def test_retry_after_is_honored(cache):
+    with StubServer([(429, '1')]) as server:
+        started = time.perf_counter()
+        stats, client = run([{'id': 1, 'problem': 'Find $x$.'}], cache, server, dict(SETTINGS, backoff_seconds=0))
+        assert time.perf_counter() - started >= 1.0
+        assert client.retries == 1
+        assert stats['failed'] == 0
+
+
+def test_failures_are_not_cached(cache):
+    problems = [{'id': 1, 'problem': 'Find $x$.', 'hint': 'stale'}]
+    with StubServer([(400, None)]) as server:
+        # One request at a time, so the hint (requested first) gets the 400
+        stats, client = run(problems, cache, server, concurrency=1)
+        # 400 is not retried; the stale hint is dropped and the solution still generated
+        assert (stats['failed'], client.retries) == (1, 0)
+        assert 'hint' not in problems[0] and problems[0]['solution']
+
+        stats, client = run(problems, cache, server)
+        assert stats == {'cached': 1, 'requested': 1, 'failed': 0}
+        assert len(server.prompts) == 3
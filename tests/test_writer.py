@@ -0,0 +1,154 @@
+import gzip
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+from pipeline_config import EXPORT_SETTINGS
+from pipeline_writer import MANIFEST_NAME, AtomicFile, bundle_stem, detect_format, iter_problems, write_problems
+
+PROBLEMS = [
+    {'id': i, 'problem': f"Find $x_{i}$ such that $x^{i} = {i}$.", 'category': category, 'difficulty': difficulty}
+    for i, (category, difficulty) in enumerate(
+        [('Calculus', 'Easy'), ('Linear Algebra', 'Hard'), ('Calculus', 'Hard'), ('Calculus', 'Easy')] * 6, 1)
+]
+
+
+def leftovers(directory):
+    return [name for name in os.listdir(directory) if name.endswith('.tmp')]
+
+
+def failing(problems, after):
+    for i, problem in enumerate(problems):
+        if i == after:
+            raise RuntimeError('extraction failed')
+        yield problem
+
+
+@pytest.mark.parametrize('output_format, name', [('json', 'out.json'), ('ndjson', 'out.ndjson')])
+def test_a_failed_write_leaves_the_previous_output(tmp_path, output_format, name):
+    path = tmp_path / name
+    write_problems(PROBLEMS, path, EXPORT_SETTINGS, output_format)
+    before = path.read_bytes()
+
+    with pytest.raises(RuntimeError):
+        write_problems(failing(PROBLEMS[::-1], 5), path, EXPORT_SETTINGS, output_format)
+    assert path.read_bytes() == before
+    assert leftovers(tmp_path) == []
+
+
+def test_a_failed_bundle_write_keeps_the_previous_manifest_and_shards(tmp_path):
+    write_problems(PROBLEMS, tmp_path, EXPORT_SETTINGS, 'bundle', 1024)
+    before = {path.name: path.read_bytes() for path in tmp_path.iterdir()}
+
+    edited = [dict(problem, problem=problem['problem'] + ' (edited)') for problem in PROBLEMS]
+    with pytest.raises(RuntimeError):
+        write_problems(failing(edited, 20), tmp_path, EXPORT_SETTINGS, 'bundle', 1024)
+    # Shards finished before the failure may be added, but nothing the manifest lists is touched
+    after = {path.name: path.read_bytes() for path in tmp_path.iterdir()}
+    assert {name: after[name] for name in before} == before
+    assert leftovers(tmp_path) == []
+
+
+def test_commit_keeps_unchanged_files(tmp_path):
+    path = tmp_path / 'out.json'
+    with AtomicFile(path) as out:
+        out.write('[1, 2]')
+        assert out.commit() is True
+    os.chmod(path, 0o640)
+    os.utime(path, (1_000_000, 1_000_000))
+
+    with AtomicFile(path) as out:
+        out.write('[1, ')
+        out.write('2]')
+        assert out.commit() is False
+    assert path.stat().st_mtime == 1_000_000
+    assert leftovers(tmp_path) == []
+
+    # Same size, different content
+    with AtomicFile(path) as out:
+        out.write('[1, 3]')
+        assert out.commit() is True
+    assert path.read_text() == '[1, 3]'
+    assert path.stat().st_mode & 0o777 == 0o640
+
+
+def test_rewrite_reports_unchanged_files(tmp_path):
+    for output_format, target in (('json', tmp_path / 'out.json'), ('shards', tmp_path / 'shards')):
+        first = write_problems(PROBLEMS, target, EXPORT_SETTINGS, output_format, 1024)
+        second = write_problems(PROBLEMS, target, EXPORT_SETTINGS, output_format, 1024)
+        assert first.written and not first.unchanged
+        assert second.unchanged == first.written and not second.written
+
+
+def test_json_output_matches_json_dump(tmp_path):
+    path = tmp_path / 'out.json'
+    write_problems(iter(PROBLEMS), path, EXPORT_SETTINGS)
+    assert path.read_text(encoding='utf-8') == json.dumps(PROBLEMS, **EXPORT_SETTINGS)
+    write_problems([], path, EXPORT_SETTINGS)
+    assert path.read_text(encoding='utf-8') == json.dumps([], **EXPORT_SETTINGS)
+
+
+@pytest.mark.parametrize('output_format, target', [
+    ('json', 'out.json'), ('ndjson', 'out.ndjson'), ('shards', 'shards'), ('bundle', 'bundle'),
+])
+def test_round_trip(tmp_path, output_format, target):
+    path = tmp_path / target
+    write_problems(PROBLEMS, path, EXPORT_SETTINGS, output_format, 1024)
+    assert detect_format(path) == output_format
+    assert list(iter_problems(path)) == PROBLEMS
+
+
+def test_shards_are_size_capped_and_stale_ones_removed(tmp_path):
+    result = write_problems(PROBLEMS, tmp_path, EXPORT_SETTINGS, 'shards', 1024)
+    shards = sorted(tmp_path.glob('problems-*.json'))
+    assert len(shards) == len(result.written) > 2
+    assert all(shard.stat().st_size <= 1024 for shard in shards)
+
+    result = write_problems(PROBLEMS[:3], tmp_path, EXPORT_SETTINGS, 'shards', 1024)
+    assert sorted(tmp_path.glob('problems-*.json')) == shards[:1]
+    assert result.removed == [str(shard) for shard in shards[1:]]
+    assert list(iter_problems(tmp_path)) == PROBLEMS[:3]
+
+
+def test_bundle_manifest_and_gzip_copies(tmp_path):
+    write_problems(PROBLEMS, tmp_path, EXPORT_SETTINGS, 'bundle', 1024)
+    manifest = json.loads((tmp_path / MANIFEST_NAME).read_text(encoding='utf-8'))
+    assert manifest['total'] == len(PROBLEMS)
+    assert manifest['categories'] == {'Calculus': 18, 'Linear Algebra': 6}
+    assert manifest['difficulties'] == {'Easy': 12, 'Hard': 12}
+
+    listed = []
+    for shard in manifest['shards']:
+        data = (tmp_path / shard['file']).read_bytes()
+        problems = json.loads(data)
+        assert [problem['id'] for problem in problems] == shard['ids'] and len(problems) == shard['count']
+        assert {(problem['category'], problem['difficulty']) for problem in problems} == {
+            (shard['category'], shard['difficulty'])}
+        assert shard['file'].startswith(bundle_stem(shard['category'], shard['difficulty']))
+        assert shard['bytes'] == len(data) <= 1024
+        gz = tmp_path / shard['gzip']
+        assert gzip.decompress(gz.read_bytes()) == data and shard['gzip_bytes'] == gz.stat().st_size
+        listed += [shard['file'], shard['gzip']]
+    # Calculus/Easy (12 problems) is over the cap and split into parts
+    assert [shard['part'] for shard in manifest['shards'] if shard['difficulty'] == 'Easy'] == [0, 1]
+    assert sorted(listed + [MANIFEST_NAME]) == sorted(path.name for path in tmp_path.iterdir())
+
+
+def test_bundle_rewrites_only_changed_shards(tmp_path):
+    write_problems(PROBLEMS, tmp_path, EXPORT_SETTINGS, 'bundle', 1024)
+    before = {path.name: path.read_bytes() for path in tmp_path.iterdir()}
+
+    # The same content gives the same names and the same gzip bytes
+    result = write_problems(PROBLEMS, tmp_path, EXPORT_SETTINGS, 'bundle', 1024)
+    assert not result.written and not result.removed
+    assert {path.name: path.read_bytes() for path in tmp_path.iterdir()} == before
+
+    edited = [dict(problem, problem='Edited.') if problem['category'] == 'Linear Algebra' else problem
+              for problem in PROBLEMS]
+    result = write_problems(edited, tmp_path, EXPORT_SETTINGS, 'bundle', 1024)
+    stale = sorted(name for name in before if name.startswith('linear-algebra--'))
+    assert sorted(Path(path).name for path in result.removed) == stale
+    assert len(result.written) == 3  # the new shard, its gzip copy and the manifest
+    assert list(iter_problems(tmp_path)) == edited